@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Time and memory benchmarks for the log-reading hot paths.
+
+Runs calculate_stats, get_plot_data, get_latest_speedtest,
+generate_plot_image (when matplotlib is installed), render_svg and a full
+dashboard page render against synthetic logs (see synthetic_log.py) of
+each size in --sizes. "cold" runs start without sidecars or an in-memory
+model, "warm" runs reuse them. Each
+benchmark reports the best of --repeat timed runs and the peak memory
+(tracemalloc) of one extra run.
+
+Results can be saved as a baseline and later runs compared against it;
+the comparison fails when a benchmark gets more than --max-slowdown times
+slower or hungrier than its baseline. Baselines are machine specific.
+
+    python benchmarks/bench_hot_paths.py --save            # record baselines.json
+    python benchmarks/bench_hot_paths.py --compare         # check for regressions
+    python benchmarks/bench_hot_paths.py --sizes 10000000 --log-dir /tmp/logs
+"""
+import argparse
+import datetime
+import http.client
+import importlib.util
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+import speed_http_server
+import speed_svg
+import speed_utils
+from synthetic_log import default_end, generate_log
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+DEFAULT_SIZES = (10000, 100000, 1000000)
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS_DELTA = 0.005
+MIN_PEAK_MB_DELTA = 1.0
+
+
+def clear_sidecars(log_file):
+    for suffix in (speed_utils.STATS_SIDECAR_SUFFIX, speed_utils.INDEX_SIDECAR_SUFFIX):
+        try:
+            os.remove(log_file + suffix)
+        except FileNotFoundError:
+            pass
+
+
+class Dashboard:
+    """A dashboard server on a free local port, serving one log over plain HTTP."""
+
+    def __init__(self, log_file):
+        self.log_file = log_file
+        self.httpd = speed_http_server.PooledHTTPServer(
+            ('127.0.0.1', 0), speed_http_server.SpeedHTTPRequestHandler, workers=1, queue_limit=1)
+        self.httpd.RequestHandlerClass.log_message = lambda *args: None
+        self.reset()
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def reset(self):
+        speed_http_server.MODEL = speed_http_server.LogModel(self.log_file)
+        speed_http_server.PLOT_CACHE = speed_http_server.PlotCache(speed_http_server.MODEL)
+
+    def get(self, path='/'):
+        conn = http.client.HTTPConnection('127.0.0.1', self.httpd.server_address[1])
+        conn.request('GET', path)
+        response = conn.getresponse()
+        body = response.read()
+        conn.close()
+        if response.status != 200:
+            raise RuntimeError(f"GET {path} returned {response.status}")
+        return body
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def benchmarks(log_file, dashboard):
+    """Returns (name, prepare, run) for each benchmark; `prepare` runs untimed before each run."""
+    def nothing():
+        pass
+
+    def cold():
+        clear_sidecars(log_file)
+
+    suite = [
+        ('calculate_stats (cold)', cold, lambda: speed_utils.calculate_stats(log_file)),
+        ('calculate_stats (warm)', nothing, lambda: speed_utils.calculate_stats(log_file)),
+        ('get_plot_data (cold)', cold, lambda: speed_utils.get_plot_data(log_file)),
+        ('get_plot_data (warm)', nothing, lambda: speed_utils.get_plot_data(log_file)),
+        ('get_latest_speedtest', nothing, lambda: speed_utils.get_latest_speedtest(log_file)),
+        ('generate_plot_image', nothing, lambda: speed_utils.generate_plot_image(log_file, io.BytesIO())),
+        ('render_svg', nothing, lambda: speed_svg.render_svg(speed_utils.get_plot_data(log_file))),
+        ('dashboard page (cold)', dashboard.reset, dashboard.get),
+        ('dashboard page (warm)', nothing, dashboard.get),
+    ]
+    # matplotlib is only needed for the CLI's PNG plots
+    if not importlib.util.find_spec('matplotlib'):
+        suite = [benchmark for benchmark in suite if benchmark[0] != 'generate_plot_image']
+    return suite
+
+
+def measure(prepare, run, repeat):
+    # One untimed run warms imports, sidecars and caches for the "warm" variants
+    prepare()
+    run()
+
+    best = float('inf')
+    for _ in range(repeat):
+        prepare()
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+
+    prepare()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': round(best, 6), 'peak_mb': round(peak / (1024 * 1024), 3)}
+
+
+def run_benchmarks(sizes, repeat, log_dir, seed=0):
+    results = {}
+    end = default_end()
+    for size in sizes:
+        log_file = os.path.join(log_dir, f"synthetic-{size}-{seed}-{end:%Y%m%d}.txt")
+        if not os.path.exists(log_file):
+            print(f"Generating {size} records...", flush=True)
+            generate_log(log_file, size, seed, end)
+
+        dashboard = Dashboard(log_file)
+        try:
+            results[str(size)] = {}
+            for name, prepare, run in benchmarks(log_file, dashboard):
+                result = measure(prepare, run, repeat)
+                results[str(size)][name] = result
+                print(f"{size:>10}  {name:<26} {result['seconds'] * 1000:10.2f} ms {result['peak_mb']:10.2f} MB",
+                      flush=True)
+        finally:
+            dashboard.close()
+    return results
+
+
+def compare(results, baseline, max_slowdown):
+    """Returns a list of regression descriptions (empty when everything is within limits)."""
+    regressions = []
+    for size, named in results.items():
+        for name, result in named.items():
+            base = baseline.get('results', {}).get(size, {}).get(name)
+            if not base:
+                continue
+            if (result['seconds'] > base['seconds'] * max_slowdown
+                    and result['seconds'] - base['seconds'] > MIN_SECONDS_DELTA):
+                regressions.append(f"{size} {name}: {result['seconds'] * 1000:.2f} ms "
+                                   f"(baseline {base['seconds'] * 1000:.2f} ms)")
+            if (result['peak_mb'] > base['peak_mb'] * max_slowdown
+                    and result['peak_mb'] - base['peak_mb'] > MIN_PEAK_MB_DELTA):
+                regressions.append(f"{size} {name}: {result['peak_mb']:.2f} MB "
+                                   f"(baseline {base['peak_mb']:.2f} MB)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the log-reading hot paths')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Log sizes in records (default: 10k 100k 1M)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per benchmark; the best is reported (default: 3)')
+    parser.add_argument('--log-dir', help='Keep generated logs here and reuse them on later runs (default: a temporary directory)')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Baseline file (default: benchmarks/baselines.json)')
+    parser.add_argument('--save', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--compare', action='store_true', help='Fail if a result regressed against the baseline')
+    parser.add_argument('--max-slowdown', type=float, default=1.5, help='Allowed ratio to the baseline for --compare (default: 1.5)')
+    args = parser.parse_args()
+
+    if args.log_dir:
+        os.makedirs(args.log_dir, exist_ok=True)
+        results = run_benchmarks(args.sizes, args.repeat, args.log_dir)
+    else:
+        with tempfile.TemporaryDirectory() as log_dir:
+            results = run_benchmarks(args.sizes, args.repeat, log_dir)
+
+    status = 0
+    if args.compare:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not read baseline {args.baseline}: {e}")
+            return 1
+        regressions = compare(results, baseline, args.max_slowdown)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            status = 1
+        else:
+            print(f"No regressions against {args.baseline}.")
+
+    if args.save:
+        baseline = {
+            'recorded': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+            'repeat': args.repeat,
+            'results': results,
+        }
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}.")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Startup-time benchmark for `check_speed.py --stats`.
+
+Compares the real command against the same command with matplotlib.pyplot
+imported up front, which is what every invocation paid before plotting
+imports were made lazy. Exits non-zero if --stats takes more than
+--max-ratio of the eager-import time.
+
+    python benchmarks/bench_startup.py [--runs 10] [--max-ratio 0.5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHECK_SPEED = os.path.join(REPO_DIR, 'check_speed.py')
+
+# Runs check_speed the way `python check_speed.py` does, after an eager pyplot import
+EAGER_IMPORT = (
+    "import sys, runpy; import matplotlib.pyplot; "
+    "sys.argv = [sys.argv[1]] + sys.argv[2:]; "
+    "runpy.run_path(sys.argv[0], run_name='__main__')"
+)
+
+
+def time_command(cmd, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, cwd=REPO_DIR)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark check_speed.py --stats startup time')
+    parser.add_argument('--runs', type=int, default=10, help='Runs per variant (median is reported)')
+    parser.add_argument('--max-ratio', type=float, default=0.5, help='Fail if lazy/eager time exceeds this ratio')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_file = os.path.join(tmpdir, 'speed_log.txt')
+        with open(log_file, 'w') as f:
+            for i in range(100):
+                f.write(f"2025-01-01T{i % 24:02d}:00:00,{100 + i}.0,50.0,10.0,1,Bench Server\n")
+
+        stats_args = [CHECK_SPEED, '--stats', '--logfile', log_file]
+        # Warm the stats sidecar and the OS page cache
+        subprocess.run([sys.executable] + stats_args, check=True, stdout=subprocess.DEVNULL)
+
+        lazy = time_command([sys.executable] + stats_args, args.runs)
+        eager = time_command([sys.executable, '-c', EAGER_IMPORT] + stats_args, args.runs)
+
+    ratio = lazy / eager
+    print(f"check_speed.py --stats:                   {lazy * 1000:8.1f} ms")
+    print(f"check_speed.py --stats (eager matplotlib): {eager * 1000:8.1f} ms")
+    print(f"ratio: {ratio:.2f} (limit {args.max_ratio:.2f})")
+    return 0 if ratio <= args.max_ratio else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
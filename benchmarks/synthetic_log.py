@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Deterministic synthetic speed logs for benchmarks.
+
+The same record count, seed and end time always produce the same bytes.
+Records are spaced `--step` seconds apart and end at `--end` (default:
+today at midnight, so the last 30 days are populated for plotting). About
+`--malformed` of the lines are broken in the ways real logs break: blank
+lines, truncated writes, text in numeric fields, missing columns.
+
+    python benchmarks/synthetic_log.py speed_log.txt --records 1000000
+"""
+import argparse
+import datetime
+import random
+import sys
+
+SERVERS = [
+    (1001, 'Bezeq (Tel Aviv)'),
+    (1002, 'Partner (Haifa)'),
+    (1003, 'HOT (Jerusalem)'),
+    (1004, 'Cellcom (Petah Tikva)'),
+    (1005, 'Vodafone (Frankfurt)'),
+]
+MALFORMED_RATIO = 0.001
+STEP_SECONDS = 60
+WRITE_CHUNK = 10000
+
+
+def default_end():
+    return datetime.datetime.combine(datetime.date.today(), datetime.time())
+
+
+def iter_log_lines(records, seed=0, end=None, step=STEP_SECONDS, malformed=MALFORMED_RATIO):
+    """Yields the lines of a synthetic log, oldest first, each ending with a newline."""
+    rng = random.Random(seed)
+    end = end or default_end()
+    start = end - datetime.timedelta(seconds=step * (records - 1))
+    for i in range(records):
+        ts = (start + datetime.timedelta(seconds=step * i)).isoformat()
+        server_id, server_name = SERVERS[rng.randrange(len(SERVERS))]
+        download = round(rng.lognormvariate(5.5, 0.3), 2)
+        upload = round(rng.lognormvariate(4.0, 0.3), 2)
+        ping = round(rng.uniform(2.0, 40.0), 2)
+        line = f"{ts},{download},{upload},{ping},{server_id},{server_name}\n"
+
+        if rng.random() < malformed:
+            kind = rng.randrange(4)
+            if kind == 0:
+                line = "\n"
+            elif kind == 1:
+                line = line[:rng.randrange(1, len(line) - 1)] + "\n"
+            elif kind == 2:
+                line = f"{ts},fast,{upload},{ping},{server_id},{server_name}\n"
+            else:
+                line = f"{ts},{download},{upload}\n"
+        yield line
+
+
+def generate_log(path, records, seed=0, end=None, step=STEP_SECONDS, malformed=MALFORMED_RATIO):
+    """Writes a synthetic log of `records` lines to `path`."""
+    with open(path, 'w') as f:
+        chunk = []
+        for line in iter_log_lines(records, seed, end, step, malformed):
+            chunk.append(line)
+            if len(chunk) >= WRITE_CHUNK:
+                f.write(''.join(chunk))
+                chunk = []
+        f.write(''.join(chunk))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a deterministic synthetic speed log')
+    parser.add_argument('path', help='Log file to write')
+    parser.add_argument('--records', type=int, default=10000, help='Number of lines (default: 10000)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--end', type=datetime.datetime.fromisoformat, help='Timestamp of the last record (default: today at midnight)')
+    parser.add_argument('--step', type=int, default=STEP_SECONDS, help=f'Seconds between records (default: {STEP_SECONDS})')
+    parser.add_argument('--malformed', type=float, default=MALFORMED_RATIO, help=f'Fraction of malformed lines (default: {MALFORMED_RATIO})')
+    args = parser.parse_args()
+    generate_log(args.path, args.records, args.seed, args.end, args.step, args.malformed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
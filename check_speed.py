@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import argparse
+import cProfile
 import datetime
 import os
 import subprocess
@@ -8,7 +9,29 @@ import json
 import sys
 import shutil
 import tempfile
-from speed_utils import calculate_stats, get_plot_data, generate_plot_image
+import random
+import signal
+import socket
+import threading
+import time
+from speed_servers import (DEFAULT_SERVER_CACHE, DEFAULT_SERVER_CACHE_TTL, load_server_index, rank_servers,
+                           read_cache_file, write_cache_file)
+from speed_storage import DEFAULT_DB_FILE, SQLiteBackend, TextLogBackend, import_text_log, open_storage
+from speed_utils import (PERCENTILES, ROLLUP_SUFFIX, LogRecord, append_test_samples,
+                         compact_log_segments, downsample_plot_data, format_log_line,
+                         generate_plot_image, get_plot_data, rotate_log)
+
+# Remembers where the official CLI was found (see get_official_speedtest_command)
+CLI_CACHE = os.path.join(os.path.dirname(DEFAULT_SERVER_CACHE), 'cli.json')
+CLI_CACHE_VERSION = 1
+# Results waiting to be pushed to --push-url are spooled to <logfile> + SPOOL_SUFFIX
+SPOOL_SUFFIX = '.spool.jsonl'
+PUSH_BATCH = 500
+PUSH_TIMEOUT = 10
+# Batches the dashboard refuses (4xx) are moved to <spool> + REJECTED_SUFFIX instead of being retried
+REJECTED_SUFFIX = '.rejected'
+# 4xx responses that are worth retrying later (timeout, rate limit)
+RETRY_STATUSES = (408, 429)
 
 
 def get_args():
@@ -16,23 +39,121 @@ def get_args():
     parser.add_argument('--serverid', type=int, help='Preferred server ID')
     parser.add_argument('--servername', type=str, help='Preferred server name (partial match)')
     parser.add_argument('--checkserver', type=str, help='Check server availability by name and return details')
+    parser.add_argument('--server-cache', type=str, default=DEFAULT_SERVER_CACHE, help=f'Server list cache file (default: {DEFAULT_SERVER_CACHE})')
+    parser.add_argument('--server-cache-ttl', type=float, default=DEFAULT_SERVER_CACHE_TTL, help=f'Seconds before the cached server list is refreshed (default: {DEFAULT_SERVER_CACHE_TTL})')
+    parser.add_argument('--refresh-servers', action='store_true', help='Refresh the cached server list now (alone: refresh and exit).')
+    parser.add_argument('--preprobe', action='store_true', help='Measure TCP connect latency to the listed servers and test against the fastest (also breaks ties between --servername matches).')
     parser.add_argument('--plot', nargs='?', const='gui', help='Plot internet speed history (last 30 days). Use "text" for terminal plot.')
     parser.add_argument('--stats', action='store_true', help='Show historical statistics (averages and count) without running a test.')
+    parser.add_argument('--by-server', action='store_true', help='With --stats, break the statistics down per server.')
+    parser.add_argument('--tail', type=int, metavar='N', help='Show the last N results without running a test.')
+    parser.add_argument('--progress', action='store_true', help='Show live progress and store the intra-test bandwidth samples next to the log.')
+    parser.add_argument('--daemon', action='store_true', help='Keep running and test on a schedule (see --interval) instead of testing once.')
+    parser.add_argument('--interval', type=float, default=3600, help='Seconds between scheduled tests in --daemon mode (default: 3600)')
+    parser.add_argument('--jitter', type=float, help='Maximum random delay in seconds added to each scheduled test (default: 10%% of --interval)')
+    parser.add_argument('--rotate-size', type=int, help='After a test, rotate the log once it exceeds this many bytes and compact it into hourly/daily rollups.')
+    parser.add_argument('--compact', action='store_true', help='Fold rotated log segments into hourly/daily rollups and exit.')
+    parser.add_argument('--storage', choices=['text', 'sqlite'], default='text', help='Where results are stored and read from (default: text log)')
+    parser.add_argument('--db', type=str, default=DEFAULT_DB_FILE, help=f'SQLite database for --storage sqlite (default: {DEFAULT_DB_FILE})')
+    parser.add_argument('--import-log', action='store_true', help='Import the --logfile text log into the --db SQLite database and exit.')
+    parser.add_argument('--push-url', type=str, help='Also send each result to a central dashboard, e.g. https://host:8000/ingest')
+    parser.add_argument('--push-token', type=str, default=os.environ.get('SPEED_INGEST_TOKEN'), help='Bearer token for --push-url (default: $SPEED_INGEST_TOKEN)')
+    parser.add_argument('--probe-id', type=str, default=socket.gethostname(), help='Name this probe reports under with --push-url (default: hostname)')
+    parser.add_argument('--push-cafile', type=str, help='CA bundle or certificate used to verify the --push-url server')
+    parser.add_argument('--logs', nargs='+', metavar='LOG', help='With --stats or --plot, combine several logs or glob patterns (e.g. "probes/*.txt") instead of --logfile.')
+    parser.add_argument('--profile', type=str, metavar='FILE', help='Write a cProfile dump of this run to FILE (view with `python -m pstats FILE`).')
     parser.add_argument('--logfile', type=str, default='speed_log.txt', help='Path to log file (default: speed_log.txt)')
     return parser.parse_args()
 
 
-def log_results(download, upload, ping, server_id, server_name, log_file):
-    timestamp = datetime.datetime.now().isoformat()
-    # Sanitize server name to remove commas if any, to avoid CSV issues
-    server_name = str(server_name).replace(',', ' ')
-    with open(log_file, 'a') as f:
-        f.write(f"{timestamp},{download},{upload},{ping},{server_id},{server_name}\n")
+def log_results(download, upload, ping, server_id, server_name, log_file, storage=None):
+    """Appends a result to the log (or `storage` backend) and returns its timestamp.
 
-def plot_results(log_file):
+    The timestamp is the key for related side data such as progress samples.
+    """
+    timestamp = datetime.datetime.now()
+    record = LogRecord(timestamp, download, upload, ping, server_id, server_name)
+    if storage is not None:
+        storage.append(record)
+    else:
+        with open(log_file, 'a') as f:
+            f.write(format_log_line(record))
+    return timestamp.isoformat()
+
+def spool_result(spool_file, result):
+    spool_results(spool_file, [result])
+
+def spool_results(spool_file, results):
+    with open(spool_file, 'a') as f:
+        f.writelines(json.dumps(result) + "\n" for result in results)
+
+def push_spooled_results(spool_file, url, token, probe_id, cafile=None, batch_size=PUSH_BATCH):
+    """POSTs spooled results to a dashboard's /ingest endpoint in batches.
+
+    Results that were accepted are removed from the spool. A batch the
+    server rejects (4xx) is moved to the spool + REJECTED_SUFFIX so it
+    doesn't block later ones; on connection errors and 5xx responses the
+    rest stay spooled for the next attempt. Returns the number pushed.
+    """
+    try:
+        with open(spool_file) as f:
+            results = [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return 0
+    except (OSError, ValueError) as e:
+        print(f"Error reading push spool {spool_file}: {e}")
+        return 0
+
+    # Imported here so that runs without --push-url never pay their import time
+    import ssl
+    import urllib.error
+    import urllib.request
+
+    context = ssl.create_default_context(cafile=cafile) if url.startswith('https') else None
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f"Bearer {token}"
+
+    pushed = done = 0
+    while done < len(results):
+        batch = results[done:done + batch_size]
+        body = json.dumps({'probe_id': probe_id, 'results': batch}).encode('utf-8')
+        request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=PUSH_TIMEOUT, context=context) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            if e.code >= 500 or e.code in RETRY_STATUSES:
+                print(f"Could not push results to {url}: {e}. {len(results) - done} result(s) kept for later.")
+                break
+            try:
+                # The dashboard explains a rejection in the JSON body
+                reason = json.loads(e.read())['error']
+            except (OSError, ValueError, KeyError, TypeError):
+                reason = e.reason
+            rejected_file = spool_file + REJECTED_SUFFIX
+            print(f"{url} rejected {len(batch)} result(s) ({e.code}: {reason}). Moved them to {rejected_file}.")
+            spool_results(rejected_file, batch)
+        except (urllib.error.URLError, OSError) as e:
+            print(f"Could not push results to {url}: {e}. {len(results) - done} result(s) kept for later.")
+            break
+        else:
+            pushed += len(batch)
+        done += len(batch)
+
+    if done:
+        remaining = results[done:]
+        with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(os.path.abspath(spool_file)), delete=False) as tmp:
+            tmp.writelines(json.dumps(result) + "\n" for result in remaining)
+        os.replace(tmp.name, spool_file)
+        if not remaining:
+            os.remove(spool_file)
+    return pushed
+
+def plot_results(log_file, data=None):
     try:
         with tempfile.NamedTemporaryFile(suffix=".png") as tmpfile:
-            if generate_plot_image(log_file, tmpfile.name):
+            if generate_plot_image(log_file, tmpfile.name, data=data):
                 # Display the generated image
                 import matplotlib.pyplot as plt
                 img = plt.imread(tmpfile.name)
@@ -48,13 +169,17 @@ def plot_results(log_file):
     except Exception as e:
         print(f"An error occurred during plotting: {e}")
 
-def plot_results_text(log_file):
+def plot_results_text(log_file, data=None):
     import plotext as plt_text # Import plotext here as it's only used for text plots
-    data = get_plot_data(log_file)
+    if data is None:
+        data = get_plot_data(log_file)
     if not data:
         print("No log file found or no data from the last 30 days.")
         return
 
+    # The terminal can't show more points than it has columns
+    data = downsample_plot_data(data, shutil.get_terminal_size().columns)
+
     dates = data['dates']
     # Convert datetimes to string for plotext
     date_strs = [dt.strftime('%Y-%m-%d %H:%M') for dt in dates]
@@ -79,100 +204,230 @@ def plot_results_text(log_file):
     plt_text.ylabel("Speed (Mbps)")
     plt_text.show()
 
-def get_official_speedtest_command():
-    """Checks for official Ookla speedtest CLI in common paths and returns the executable path."""
+def print_server_stats(server_stats):
+    print("\nPer-Server Statistics:")
+    print(f"{'ID':>8}  {'Server':<32} {'Tests':>6} {'Avg DL':>9} {'Min DL':>9} {'Max DL':>9} {'Avg UL':>9} {'Avg Ping':>9}  Last Seen")
+    for s in server_stats:
+        name = (s['server_name'] or 'Unknown')[:32]
+        last_seen = (s['last_seen'] or '')[:19]
+        print(f"{s['server_id']:>8}  {name:<32} {s['count']:>6} {s['avg_dl']:>9.2f} {s['min_dl']:>9.2f} "
+              f"{s['max_dl']:>9.2f} {s['avg_ul']:>9.2f} {s['avg_ping']:>9.2f}  {last_seen}")
+
+def print_recent_tests(results):
+    """Prints results (newest first, as returned by the storage backends) oldest first, like tail."""
+    print(f"\nLast {len(results)} Test(s):")
+    print(f"{'Timestamp':<19}  {'Download':>9} {'Upload':>9} {'Ping':>9}  {'ID':>8}  Server")
+    for r in reversed(results):
+        server_id = r['server_id'] if r['server_id'] is not None else ''
+        print(f"{r['timestamp'][:19]:<19}  {r['download']:>9.2f} {r['upload']:>9.2f} {r['ping']:>9.2f}  "
+              f"{server_id:>8}  {r['server_name'] or 'Unknown'}")
+
+def _cached_speedtest_command(cache_file):
+    """Returns the cached CLI path if the binary it points to is unchanged since detection."""
+    cache = read_cache_file(cache_file, CLI_CACHE_VERSION)
+    if not cache:
+        return None
+    cmd = cache['cmd']
+    resolved = shutil.which(cmd) or cmd
+    try:
+        real_path = os.path.realpath(resolved)
+        mtime_ns = os.stat(real_path).st_mtime_ns
+    except OSError:
+        return None
+    if real_path != cache['real_path'] or mtime_ns != cache['mtime_ns']:
+        return None
+    return cmd
+
+def get_official_speedtest_command(cache_file=None):
+    """Checks for official Ookla speedtest CLI in common paths and returns the executable path.
+
+    With a `cache_file`, the detected path and version are remembered and
+    reused until the binary's mtime changes, so no `--version` is spawned.
+    """
+    if cache_file:
+        cmd = _cached_speedtest_command(cache_file)
+        if cmd:
+            return cmd
+
     # Candidates to check: generic command, and explicit paths
     candidates = ['speedtest', '/usr/bin/speedtest', '/usr/local/bin/speedtest']
+    checked = set()
     
     for cmd in candidates:
         # Check if executable exists (shutil.which for commands, os.path.exists for paths)
-        if not shutil.which(cmd) and not (os.path.isabs(cmd) and os.path.exists(cmd) and os.access(cmd, os.X_OK)):
+        resolved = shutil.which(cmd)
+        if not resolved and not (os.path.isabs(cmd) and os.path.exists(cmd) and os.access(cmd, os.X_OK)):
+            continue
+
+        # 'speedtest' on PATH is usually one of the explicit paths; only ask each binary once
+        real_path = os.path.realpath(resolved or cmd)
+        if real_path in checked:
             continue
+        checked.add(real_path)
             
         try:
             # Check version output for "Ookla"
             result = subprocess.run([cmd, '--version'], capture_output=True, text=True)
             if 'Ookla' in result.stdout:
+                if cache_file:
+                    write_cache_file(cache_file, {
+                        'version': CLI_CACHE_VERSION,
+                        'cmd': cmd,
+                        'real_path': real_path,
+                        'mtime_ns': os.stat(real_path).st_mtime_ns,
+                        'cli_version': result.stdout.strip().splitlines()[0],
+                    })
                 return cmd
         except Exception:
             continue
             
     return None
 
-def get_server_id_by_name(cmd_exec, search_term):
-    """Finds server ID by partial name match."""
+def latency_cache_file(server_cache):
+    """The latency ranking cache lives next to the server list cache."""
+    return os.path.join(os.path.dirname(server_cache), 'latency.json') if server_cache else None
+
+def fastest_server(servers, cache_file=None, refresh=False):
+    """Returns the server with the lowest TCP connect latency, or None if none responded."""
+    ranked = rank_servers(servers, latency_cache_file(cache_file), refresh=refresh)
+    if not ranked:
+        return None
+    latency, server = ranked[0]
+    print(f"Fastest server: {server.get('name')} ({server.get('location')}), connect {latency:.1f} ms "
+          f"({len(ranked)} of {len(servers)} responded)")
+    return server
+
+def get_server_id_by_name(cmd_exec, search_term, cache_file=None, ttl=DEFAULT_SERVER_CACHE_TTL, refresh=False,
+                          preprobe=False):
+    """Finds the best-ranked server ID for a partial name (see speed_servers.ServerIndex).
+
+    With `preprobe`, servers that match equally well are pre-probed and the
+    fastest responsive one wins, so a slow or unreachable server isn't
+    picked just because the CLI listed it first.
+    """
     try:
-        # Add license flags to prevent hanging on fresh installs
-        result = subprocess.run([cmd_exec, '--accept-license', '--accept-gdpr', '-L', '-f', 'json'], capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"Error listing servers: {result.stderr}")
+        index = load_server_index(cmd_exec, cache_file, ttl, refresh)
+        if index is None:
             return None
 
-        data = json.loads(result.stdout)
-        servers = data.get('servers', [])
-
-        for server in servers:
-            if search_term.lower() in server['name'].lower() or \
-               search_term.lower() in server['location'].lower() or \
-               search_term.lower() in server['host'].lower():
+        if preprobe:
+            best = index.best_matches(search_term)
+            server = fastest_server(best, cache_file, refresh) if len(best) > 1 else None
+            if server:
                 return server['id']
+
+        matches = index.search(search_term)
+        if matches:
+            return matches[0]['id']
     except Exception as e:
         print(f"Error finding server by name: {e}")
     return None
 
-def run_official_check_server(cmd_exec, search_term):
+def get_fastest_server_id(cmd_exec, cache_file=None, ttl=DEFAULT_SERVER_CACHE_TTL, refresh=False):
+    """Pre-probes every server from `speedtest -L` and returns the fastest responsive one's ID."""
+    try:
+        index = load_server_index(cmd_exec, cache_file, ttl, refresh)
+        if index is None:
+            return None
+        server = fastest_server(index.servers, cache_file, refresh)
+        if server:
+            return server['id']
+    except Exception as e:
+        print(f"Error probing servers: {e}")
+    return None
+
+def run_official_check_server(cmd_exec, search_term, cache_file=None, ttl=DEFAULT_SERVER_CACHE_TTL, refresh=False):
     """Uses official CLI to check for server availability."""
     print(f"[Official CLI] Searching for server containing '{search_term}'...")
     try:
         # Official CLI doesn't have a simple search-by-name flag easily accessible without running
         # But we can list servers (usually lists closest) and filter.
-        # speedtest -L -f json
-        # Add license flags to prevent hanging on fresh installs
-        result = subprocess.run([cmd_exec, '--accept-license', '--accept-gdpr', '-L', '-f', 'json'], capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"Error listing servers: {result.stderr}")
+        index = load_server_index(cmd_exec, cache_file, ttl, refresh)
+        if index is None:
             return
 
-        try:
-            # Output might be multiple JSON objects or a list depending on version
-            # Usually 'servers' key contains list in JSON output
-            data = json.loads(result.stdout)
-            servers = data.get('servers', [])
-            
-            found = False
-            for server in servers:
-                if search_term.lower() in server['name'].lower() or \
-                   search_term.lower() in server['location'].lower() or \
-                   search_term.lower() in server['host'].lower():
-                     print(f"Server Name: {server['name']} ({server['location']})")
-                     print(f"Server URL:  {server['host']}")
-                     print(f"Server ID:   {server['id']}")
-                     found = True
-            
-            if not found:
-                 print(f"Server '{search_term}' not found in official CLI local server list.")
-                 print("Note: Official CLI also mainly lists geographically close servers.")
+        matches = index.search(search_term)
+        for server in matches:
+            print(f"Server Name: {server['name']} ({server['location']})")
+            print(f"Server URL:  {server['host']}")
+            print(f"Server ID:   {server['id']}")
 
-        except json.JSONDecodeError:
-            print("Error parsing JSON output from speedtest CLI.")
+        if not matches:
+            print(f"Server '{search_term}' not found in official CLI local server list.")
+            print("Note: Official CLI also mainly lists geographically close servers.")
 
+    except json.JSONDecodeError:
+        print("Error parsing JSON output from speedtest CLI.")
     except Exception as e:
         print(f"An error occurred with official CLI: {e}")
 
-def run_official_speedtest(cmd_exec, args):
-    """Runs speedtest using official Ookla CLI."""
+def run_speedtest_with_progress(cmd):
+    """Runs the CLI with line-delimited (JSONL) progress events, parsing them as they arrive.
+
+    Prints live progress and returns (returncode, stderr, result, samples):
+    the final result object (None if it never arrived) and the per-phase
+    samples, `ping` as [progress, latency_ms] and `download`/`upload` as
+    [elapsed_ms, mbps].
+    """
+    process = subprocess.Popen(cmd + ['-f', 'jsonl', '-p', 'yes'], stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, text=True, bufsize=1)
+    samples = {'ping': [], 'download': [], 'upload': []}
+    result = None
+    phase = None
+
+    for line in process.stdout:
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+
+        event_type = event.get('type')
+        if event_type == 'result':
+            result = event
+            continue
+        if event_type not in samples:
+            continue
+
+        if phase and phase != event_type:
+            print()
+        phase = event_type
+        values = event.get(event_type, {})
+        progress = values.get('progress', 0) * 100
+        if event_type == 'ping':
+            latency = values.get('latency', 0.0)
+            samples['ping'].append([round(values.get('progress', 0), 3), latency])
+            print(f"\rPing:     {latency:8.2f} ms   ({progress:3.0f}%)", end='', flush=True)
+        else:
+            mbps = values.get('bandwidth', 0) * 8 / 1000000
+            samples[event_type].append([values.get('elapsed', 0), round(mbps, 3)])
+            print(f"\r{event_type.capitalize() + ':':<9} {mbps:8.2f} Mbps ({progress:3.0f}%)", end='', flush=True)
+
+    if phase:
+        print()
+    stderr = process.stderr.read()
+    process.wait()
+    return process.returncode, stderr, result, samples
+
+def run_official_speedtest(cmd_exec, args, storage=None):
+    """Runs speedtest using official Ookla CLI and records the result in `storage` (default: the log file)."""
     print(f"Using Official Ookla speedtest CLI at: {cmd_exec}")
     # Add license acceptance flags to avoid interactive prompts
-    cmd = [cmd_exec, '--accept-license', '--accept-gdpr', '-f', 'json']
+    cmd = [cmd_exec, '--accept-license', '--accept-gdpr']
     
     server_id = args.serverid
     if args.servername and not server_id:
         print(f"Resolving server ID for name '{args.servername}'...")
-        server_id = get_server_id_by_name(cmd_exec, args.servername)
+        server_id = get_server_id_by_name(cmd_exec, args.servername, args.server_cache,
+                                          args.server_cache_ttl, args.refresh_servers, args.preprobe)
         if not server_id:
             print(f"Could not find server matching '{args.servername}'. Proceeding with auto-selection.")
         else:
             print(f"Found Server ID: {server_id}")
+    elif not server_id and args.preprobe:
+        print("Measuring latency to nearby servers...")
+        server_id = get_fastest_server_id(cmd_exec, args.server_cache, args.server_cache_ttl, args.refresh_servers)
+        if not server_id:
+            print("No server responded. Leaving server selection to the CLI.")
 
     if server_id:
         cmd.extend(['-s', str(server_id)])
@@ -180,20 +435,30 @@ def run_official_speedtest(cmd_exec, args):
 
     print("Running speedtest...")
     try:
-        # This can take a while
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        stdout, stderr = process.communicate()
-        
-        if process.returncode != 0:
-            print(f"Speedtest failed: {stderr}")
-            return False
-
-        try:
-            data = json.loads(stdout)
-        except json.JSONDecodeError:
-            print("Error: Invalid JSON output from speedtest CLI.")
-            print(f"Output: {stdout}")
-            return False
+        samples = None
+        if getattr(args, 'progress', False):
+            returncode, stderr, data, samples = run_speedtest_with_progress(cmd)
+            if returncode != 0:
+                print(f"Speedtest failed: {stderr}")
+                return False
+            if data is None:
+                print("Error: No result in JSONL output from speedtest CLI.")
+                return False
+        else:
+            # This can take a while
+            process = subprocess.Popen(cmd + ['-f', 'json'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            stdout, stderr = process.communicate()
+
+            if process.returncode != 0:
+                print(f"Speedtest failed: {stderr}")
+                return False
+
+            try:
+                data = json.loads(stdout)
+            except json.JSONDecodeError:
+                print("Error: Invalid JSON output from speedtest CLI.")
+                print(f"Output: {stdout}")
+                return False
         
         # Extract data
         # Note: Official CLI JSON keys might differ slightly, usually:
@@ -214,7 +479,16 @@ def run_official_speedtest(cmd_exec, args):
         print(f"Server: {s_name} (ID: {s_id})")
         print(f"Result URL: {data.get('result', {}).get('url', 'N/A')}")
 
-        log_results(download_mbps, upload_mbps, ping, s_id, s_name, args.logfile)
+        timestamp = log_results(download_mbps, upload_mbps, ping, s_id, s_name, args.logfile, storage)
+        if samples:
+            # Samples live next to whichever file holds the results
+            append_test_samples(storage.db_file if isinstance(storage, SQLiteBackend) else args.logfile,
+                                timestamp, samples)
+        if args.push_url:
+            spool_file = args.logfile + SPOOL_SUFFIX
+            spool_result(spool_file, {'timestamp': timestamp, 'download': download_mbps, 'upload': upload_mbps,
+                                      'ping': ping, 'server_id': s_id, 'server_name': s_name})
+            push_spooled_results(spool_file, args.push_url, args.push_token, args.probe_id, args.push_cafile)
         return True
 
     except Exception as e:
@@ -223,14 +497,105 @@ def run_official_speedtest(cmd_exec, args):
 
 
 
+def rotate_and_compact(log_file, max_bytes):
+    """Rotates the log once it reaches `max_bytes` and folds the closed segment into the rollup."""
+    if not max_bytes or not os.path.exists(log_file) or os.path.getsize(log_file) < max_bytes:
+        return
+    segment = rotate_log(log_file)
+    if segment:
+        print(f"Rotated log to {segment}.")
+        try:
+            compact_log_segments(log_file)
+        except OSError as e:
+            print(f"Error compacting log segments: {e}")
+
+def print_historical_averages(storage):
+    stats = storage.aggregate()
+    if stats:
+        print("\nHistorical Averages (All Servers, {} tests):".format(stats['count']))
+        print(f"Avg Download: {stats['avg_dl']:.2f} Mbps")
+        print(f"Avg Upload: {stats['avg_ul']:.2f} Mbps")
+        print(f"Avg Ping: {stats['avg_ping']:.2f} ms")
+
+def run_daemon(cmd_exec, args, stop_event=None, storage=None):
+    """Runs speed tests every `args.interval` seconds until stopped.
+
+    The CLI binary and the --servername lookup are resolved once up front,
+    and --refresh-servers only applies to that first lookup.
+    Runs happen one after another in this process, so they never overlap;
+    if a run takes longer than the interval, the missed slots are skipped.
+    Each slot is delayed by a random jitter so many probes don't test at
+    the same moment.
+    """
+    if stop_event is None:
+        stop_event = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda signum, frame: stop_event.set())
+
+    if args.servername and not args.serverid:
+        print(f"Resolving server ID for name '{args.servername}'...")
+        args.serverid = get_server_id_by_name(cmd_exec, args.servername, args.server_cache,
+                                              args.server_cache_ttl, args.refresh_servers, args.preprobe)
+        if not args.serverid:
+            print(f"Could not find server matching '{args.servername}'. Proceeding with auto-selection.")
+            args.servername = None
+    elif args.refresh_servers and not args.serverid and args.preprobe:
+        # Refresh the server list and latency ranking now; later runs reuse the caches
+        get_fastest_server_id(cmd_exec, args.server_cache, args.server_cache_ttl, refresh=True)
+    args.refresh_servers = False
+
+    interval = args.interval
+    jitter = args.jitter if args.jitter is not None else interval * 0.1
+    print(f"Daemon mode: testing every {interval:g}s (jitter up to {jitter:g}s). Press Ctrl+C to stop.")
+
+    next_run = time.monotonic()
+    while not stop_event.is_set():
+        if run_official_speedtest(cmd_exec, args, storage):
+            if not isinstance(storage, SQLiteBackend):
+                rotate_and_compact(args.logfile, args.rotate_size)
+            print_historical_averages(storage or TextLogBackend(args.logfile))
+
+        next_run += interval
+        now = time.monotonic()
+        if next_run < now:
+            skipped = int((now - next_run) // interval) + 1
+            print(f"Test overran the interval; skipping {skipped} scheduled run(s).")
+            next_run += skipped * interval
+        delay = next_run - now + random.uniform(0, jitter)
+        print(f"Next test in {delay:.0f}s.")
+        stop_event.wait(delay)
+
+    print("Daemon stopped.")
+
 def check_speed():
     args = get_args()
 
-    # Try to find official CLI
-    official_cmd = get_official_speedtest_command()
+    if args.compact:
+        try:
+            count = compact_log_segments(args.logfile)
+        except OSError as e:
+            print(f"Error compacting log segments: {e}")
+            sys.exit(1)
+        print(f"Compacted {count} log segment(s) into {args.logfile}{ROLLUP_SUFFIX}.")
+        sys.exit(0)
+
+    if args.import_log:
+        with SQLiteBackend(args.db) as db:
+            count = import_text_log(args.logfile, db)
+        print(f"Imported {count} new result(s) from {args.logfile} into {args.db}.")
+        sys.exit(0)
+
+    if args.logs:
+        if not (args.stats or args.plot):
+            print("Error: --logs only applies to --stats and --plot.")
+            sys.exit(1)
+        # Read-only view over many logs, parsed in parallel
+        storage = TextLogBackend(args.logs)
+    else:
+        storage = open_storage(args.storage, args.logfile, args.db)
 
     if args.stats:
-        stats = calculate_stats(args.logfile)
+        stats = storage.aggregate()
         if stats:
              print("\nHistorical Statistics:")
              print("=========================================")
@@ -243,37 +608,84 @@ def check_speed():
              print(f"Lowest Download: {stats['min_dl']:.2f} Mbps")
              print(f"Highest Upload:  {stats['max_ul']:.2f} Mbps")
              print(f"Lowest Upload:   {stats['min_ul']:.2f} Mbps")
+             print("=========================================")
+             print("Percentiles:       p50       p95       p99")
+             print("Download (Mbps): {:>8.2f}  {:>8.2f}  {:>8.2f}".format(*(stats[f'p{p}_dl'] for p in PERCENTILES)))
+             print("Upload (Mbps):   {:>8.2f}  {:>8.2f}  {:>8.2f}".format(*(stats[f'p{p}_ul'] for p in PERCENTILES)))
+             print("Ping (ms):       {:>8.2f}  {:>8.2f}  {:>8.2f}".format(*(stats[f'p{p}_ping'] for p in PERCENTILES)))
+             print(f"Ping Jitter:     {stats['ping_stddev']:.2f} ms (std dev)")
+             if args.by_server:
+                 print_server_stats(storage.aggregate_by_server())
         else:
              print("No logs found or empty log file.")
         sys.exit(0)
 
+    if args.tail is not None:
+        results = storage.recent(args.tail)
+        if results:
+            print_recent_tests(results)
+        else:
+            print("No logs found or empty log file.")
+        sys.exit(0)
+
+    # Try to find official CLI (not needed for --stats or --tail)
+    official_cmd = get_official_speedtest_command(CLI_CACHE)
+
     if not official_cmd:
         print("Error: Official Ookla Speedtest CLI not found.")
         print("Please install it from: https://www.speedtest.net/apps/cli")
         sys.exit(1)
 
     if args.plot:
+         data = storage.plot_data()
          if args.plot == 'text':
-             plot_results_text(args.logfile)
+             plot_results_text(args.logfile, data)
          else:
-             plot_results(args.logfile)
+             plot_results(args.logfile, data)
          sys.exit(0)
 
     if args.checkserver:
         search_term = args.checkserver.strip("'").strip('"')
-        run_official_check_server(official_cmd, search_term)
+        run_official_check_server(official_cmd, search_term, args.server_cache,
+                                  args.server_cache_ttl, args.refresh_servers)
+        sys.exit(0)
+
+    if args.refresh_servers and not args.servername and not args.daemon:
+        index = load_server_index(official_cmd, args.server_cache, refresh=True)
+        if index is None:
+            sys.exit(1)
+        print(f"Cached {len(index.servers)} servers in {args.server_cache}.")
+        sys.exit(0)
+
+    if args.daemon:
+        if args.interval <= 0:
+            print("Error: --interval must be positive.")
+            sys.exit(1)
+        run_daemon(official_cmd, args, storage=storage)
         sys.exit(0)
 
     # Default action: run speedtest
-    if run_official_speedtest(official_cmd, args):
+    if run_official_speedtest(official_cmd, args, storage):
+        if args.storage == 'text':
+            rotate_and_compact(args.logfile, args.rotate_size)
         # On success, print historical averages
-        stats = calculate_stats(args.logfile)
-        if stats:
-            print("\nHistorical Averages (All Servers, {} tests):".format(stats['count']))
-            print(f"Avg Download: {stats['avg_dl']:.2f} Mbps")
-            print(f"Avg Upload: {stats['avg_ul']:.2f} Mbps")
-            print(f"Avg Ping: {stats['avg_ping']:.2f} ms")
+        print_historical_averages(storage)
+
+
+def main():
+    args = get_args()
+    if not args.profile:
+        check_speed()
+        return
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(check_speed)
+    finally:
+        # check_speed exits via sys.exit; the profile is written either way
+        profiler.dump_stats(args.profile)
+        print(f"Profile written to {args.profile}.")
 
 
 if __name__ == "__main__":
-    check_speed()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,444 @@
+"""Vectorized log parsing with NumPy.
+
+Large reads (a cold sidecar, a long plot window) are parsed block by block
+straight from the raw bytes into typed arrays instead of one Python object
+per field: line and comma offsets come from byte comparisons, timestamps
+are assembled into datetime64[us] and speeds into float64 with array
+arithmetic. Aggregates, window filters and cumulative averages then run as
+array operations.
+
+Lines that don't have the exact shape log_results writes (blank or
+truncated lines, odd spacing, exponents, other timestamp formats) are
+handed to the line-by-line parsers of speed_utils, so both paths accept
+exactly the same lines. speed_utils only uses this module for reads of at
+least VECTOR_MIN_BYTES, and not at all when NumPy is not installed.
+"""
+import collections
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from speed_utils import SKETCH_MIN_VALUE, StatsAccumulator, parse_plot_line, parse_stats_line
+
+# Bytes read per block; bounds the per-line arrays held at once
+BLOCK_SIZE = 1024 * 1024
+# Numbers longer than this, or with more significant digits, are left to float()
+NUMBER_WIDTH = 20
+NUMBER_DIGITS = 15
+# Longest fast-path timestamp: YYYY-MM-DDTHH:MM:SS.ffffff
+TIMESTAMP_WIDTH = 26
+# Server ids longer than this are grouped by the fallback parser instead
+SERVER_ID_WIDTH = 32
+
+# Parsed lines of one or more blocks, as plots and the timestamp index see
+# them: the record time (NaT when it can't be plotted), download and upload,
+# whether parse_plot_line accepts the line, and where the line starts.
+LogArrays = collections.namedtuple('LogArrays', [
+    'timestamp', 'download', 'upload', 'plot_valid', 'line_start'])
+
+_DAYS_IN_MONTH = (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def available():
+    return np is not None
+
+
+def iter_blocks(f, offset, block_size=BLOCK_SIZE):
+    """Yields (data, start_offset, end_offset) for runs of complete lines after `offset`.
+
+    Each block ends at a newline; the newline itself is dropped from `data`.
+    A trailing partial line is yielded last with `end_offset` None, so
+    callers can decide whether to consume it.
+    """
+    f.seek(offset)
+    pending = b''
+    while True:
+        chunk = f.read(block_size)
+        if not chunk:
+            break
+        data = pending + chunk
+        cut = data.rfind(b'\n')
+        if cut < 0:
+            pending = data
+            continue
+        start = offset
+        offset += cut + 1
+        pending = data[cut + 1:]
+        yield data[:cut], start, offset
+    if pending:
+        yield pending, offset, None
+
+
+class _Block:
+    """Field boundaries and fast-path values for the lines of one block.
+
+    `fast` marks lines parsed entirely here; `fallback` lines have at least
+    four fields but need the speed_utils parsers. Every other line is
+    malformed for both statistics and plots.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        buf = self.buf = np.frombuffer(data, dtype=np.uint8)
+        newlines = np.flatnonzero(buf == ord('\n'))
+        starts = self.starts = np.concatenate(([0], newlines + 1))
+        ends = self.ends = np.concatenate((newlines, [len(buf)]))
+
+        # Offsets of the first five commas of each line; absent ones sit at the line end
+        commas = np.flatnonzero(buf == ord(','))
+        first = np.searchsorted(commas, starts)
+        self.comma = []
+        self.has_comma = []
+        for k in range(5):
+            idx = first + k
+            present = idx < len(commas)
+            pos = ends.copy()
+            pos[present] = commas[idx[present]]
+            present &= pos < ends
+            pos[~present] = ends[~present]
+            self.comma.append(pos)
+            self.has_comma.append(present)
+
+        self.download, dl_ok = self._numbers(1)
+        self.upload, ul_ok = self._numbers(2)
+        self.ping, ping_ok = self._numbers(3)
+        self.timestamp, ts_shape, ts_ok = self._timestamps()
+
+        # str.strip() would change the first or last field, so such lines take the fallback
+        non_empty = ends > starts
+        first_byte = buf[np.minimum(starts, len(buf) - 1)]
+        last_byte = buf[np.maximum(ends - 1, 0)]
+        plain_ends = non_empty & ~_is_space(first_byte) & ~_is_space(last_byte)
+
+        self.four_fields = self.has_comma[2]
+        self.fast = self.four_fields & plain_ends & dl_ok & ul_ok & ping_ok & ts_shape
+        self.fallback = self.four_fields & ~self.fast
+        self.plot_valid = self.fast & ts_ok
+
+    def field(self, k):
+        """Returns (start, end, present) byte offsets of field `k` (0 = timestamp)."""
+        if k == 0:
+            return self.starts, self.comma[0], np.ones(len(self.starts), dtype=bool)
+        end = self.comma[k] if k < len(self.comma) else self.ends
+        return self.comma[k - 1] + 1, end, self.has_comma[k - 1]
+
+    def gather(self, start, length, width):
+        """Returns the first `width` bytes of each field as an (n, width) matrix, zero padded."""
+        columns = np.arange(width)
+        inside = columns < length[:, None]
+        chars = np.take(self.buf, start[:, None] + columns, mode='clip')
+        chars[~inside] = 0
+        return chars, inside
+
+    def _numbers(self, k):
+        """Parses field `k` as a plain decimal (sign, digits, one optional point) into float64.
+
+        The value is an exact integer mantissa divided by an exact power of
+        ten, so it rounds the same way float() does.
+        """
+        start, end, present = self.field(k)
+        length = end - start
+        width = int(min(NUMBER_WIDTH, max(1, length.max())))
+        chars, inside = self.gather(start, np.minimum(length, width), width)
+        negative = chars[:, 0] == ord('-')
+        sign = negative | (chars[:, 0] == ord('+'))
+
+        ok = present & (length <= width)
+        mantissa = np.zeros(len(start), dtype=np.int64)
+        digits = np.zeros(len(start), dtype=np.int64)
+        decimals = np.zeros(len(start), dtype=np.int64)
+        seen_point = np.zeros(len(start), dtype=bool)
+        for col in range(width):
+            c = chars[:, col]
+            active = inside[:, col] & ~sign if col == 0 else inside[:, col]
+            digit = active & (c >= ord('0')) & (c <= ord('9'))
+            point = active & (c == ord('.'))
+            ok &= ~active | digit | (point & ~seen_point)
+            mantissa = np.where(digit, mantissa * 10 + (c.astype(np.int64) - ord('0')), mantissa)
+            digits += digit
+            decimals += digit & seen_point
+            seen_point |= point
+        ok &= (digits >= 1) & (digits <= NUMBER_DIGITS)
+
+        values = mantissa / 10.0 ** decimals
+        return np.where(negative, -values, values), ok
+
+    def _timestamps(self):
+        """Parses `YYYY-MM-DDTHH:MM:SS[.f{1,6}]` timestamps into datetime64[us].
+
+        Returns (timestamps, shape_ok, valid): lines of another shape take
+        the fallback, impossible dates (Feb 30) are NaT and not plottable.
+        """
+        start, end, _ = self.field(0)
+        length = end - start
+        chars, _ = self.gather(start, np.minimum(length, TIMESTAMP_WIDTH), TIMESTAMP_WIDTH)
+        digits = chars.astype(np.int64) - ord('0')
+        is_digit = (digits >= 0) & (digits <= 9)
+
+        shape = (length == 19) | ((length >= 21) & (length <= TIMESTAMP_WIDTH))
+        for pos, char in ((4, '-'), (7, '-'), (10, 'T'), (13, ':'), (16, ':')):
+            shape &= chars[:, pos] == ord(char)
+        shape &= is_digit[:, [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18]].all(axis=1)
+        shape &= (length == 19) | (chars[:, 19] == ord('.'))
+
+        def number(*positions):
+            value = 0
+            for pos in positions:
+                value = value * 10 + digits[:, pos]
+            return value
+
+        year, month, day = number(0, 1, 2, 3), number(5, 6), number(8, 9)
+        hour, minute, second = number(11, 12), number(14, 15), number(17, 18)
+        # 1 to 6 fractional digits, scaled to microseconds as fromisoformat does
+        micros = np.zeros(len(start), dtype=np.int64)
+        for pos in range(20, TIMESTAMP_WIDTH):
+            fraction = pos < length
+            shape &= ~fraction | is_digit[:, pos]
+            micros += np.where(fraction, digits[:, pos], 0) * 10 ** (TIMESTAMP_WIDTH - 1 - pos)
+
+        month_index = np.clip(month, 0, 12)
+        leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+        days_in_month = np.array(_DAYS_IN_MONTH)[month_index] + ((month_index == 2) & leap)
+        valid = (shape & (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= days_in_month)
+                 & (hour <= 23) & (minute <= 59) & (second <= 59))
+
+        seconds = ((_days_from_civil(year, month_index, day) * 24 + hour) * 60 + minute) * 60 + second
+        timestamps = np.where(valid, seconds * 1000000 + micros, np.iinfo(np.int64).min)
+        return timestamps.view('datetime64[us]'), shape, valid
+
+    def line(self, i):
+        return self.data[self.starts[i]:self.ends[i]].decode('utf-8', errors='replace')
+
+    def text(self, k, i):
+        start, end, present = self.field(k)
+        if not present[i]:
+            return None
+        return self.data[start[i]:end[i]].decode('utf-8', errors='replace')
+
+
+def _is_space(byte):
+    # Bytes str.strip() may remove: ASCII whitespace, the separators 0x1c-0x1f,
+    # and any non-ASCII byte (it may start a Unicode space)
+    return ((byte >= 0x09) & (byte <= 0x0d)) | ((byte >= 0x1c) & (byte <= 0x20)) | (byte >= 0x80)
+
+
+def _days_from_civil(year, month, day):
+    """Days since 1970-01-01 of proleptic Gregorian dates (H. Hinnant's algorithm)."""
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def parse_block(data, start_offset=0):
+    """Parses newline-separated log lines (bytes) into LogArrays."""
+    if not data:
+        return empty_arrays()
+    block = _Block(data)
+    timestamp, download, upload, plot_valid = block.timestamp, block.download, block.upload, block.plot_valid
+    for i in np.flatnonzero(block.fallback).tolist():
+        values = parse_plot_line(block.line(i))
+        if values and values[0].tzinfo is None:
+            timestamp[i] = np.datetime64(values[0], 'us')
+            download[i], upload[i] = values[1:]
+            plot_valid[i] = True
+    return LogArrays(timestamp, download, upload, plot_valid, start_offset + block.starts)
+
+
+def empty_arrays():
+    floats = np.empty(0, dtype=np.float64)
+    return LogArrays(np.empty(0, dtype='datetime64[us]'), floats, floats,
+                     np.empty(0, dtype=bool), np.empty(0, dtype=np.int64))
+
+
+def concat_arrays(parts):
+    if not parts:
+        return empty_arrays()
+    if len(parts) == 1:
+        return parts[0]
+    return LogArrays(*(np.concatenate(columns) for columns in zip(*parts)))
+
+
+def count_lines(data):
+    return data.count(b'\n') + 1 if data else 0
+
+
+def read_arrays(f, offset, include_partial=False):
+    """Returns (LogArrays, end_offset, lines) for the lines after `offset`.
+
+    `end_offset` is where the complete lines end. A trailing partial line is
+    only parsed with `include_partial` (plots show it, the index doesn't).
+    """
+    parts = []
+    end = offset
+    lines = 0
+    for data, start, block_end in iter_blocks(f, offset):
+        if block_end is None and not include_partial:
+            break
+        parts.append(parse_block(data, start))
+        lines += count_lines(data)
+        end = block_end or end
+    return concat_arrays(parts), end, lines
+
+
+def block_stats(data):
+    """Returns a StatsAccumulator over the complete log lines in `data`."""
+    acc = StatsAccumulator()
+    if not data:
+        return acc
+    block = _Block(data)
+    # Lines the fast path can't group by server are added line by line as well
+    fast = block.fast & ~_long_server_ids(block)
+    download = block.download[fast]
+    upload = block.upload[fast]
+    ping = block.ping[fast]
+
+    if len(download):
+        acc.count = len(download)
+        acc.total_dl = float(download.sum())
+        acc.total_ul = float(upload.sum())
+        acc.total_ping = float(ping.sum())
+        acc.total_ping_sq = float(np.dot(ping, ping))
+        acc.min_dl = float(download.min())
+        acc.max_dl = max(0.0, float(download.max()))
+        acc.min_ul = float(upload.min())
+        acc.max_ul = max(0.0, float(upload.max()))
+        _add_to_sketch(acc.dl_sketch, download)
+        _add_to_sketch(acc.ul_sketch, upload)
+        _add_to_sketch(acc.ping_sketch, ping)
+        _add_servers(acc, block, fast)
+
+    # Irregular lines go through the same parser and accumulator as the line-by-line path
+    for i in np.flatnonzero(block.four_fields & ~fast).tolist():
+        values = parse_stats_line(block.line(i))
+        if values:
+            acc.add(*values)
+    return acc
+
+
+def _long_server_ids(block):
+    start, end, present = block.field(4)
+    return present & (end - start > SERVER_ID_WIDTH)
+
+
+def _add_to_sketch(sketch, values):
+    positive = values[values > SKETCH_MIN_VALUE]
+    keys, counts = np.unique(np.ceil(np.log(positive) / math.log(sketch.gamma)), return_counts=True)
+    for key, count in zip(keys.astype(np.int64).tolist(), counts.tolist()):
+        sketch.bins[key] = sketch.bins.get(key, 0) + count
+    sketch.zero_count += len(values) - len(positive)
+    sketch.count += len(values)
+
+
+def _add_servers(acc, block, fast):
+    """Adds per-server aggregates of the `fast` lines to `acc`, grouped by the raw server id bytes."""
+    start, end, present = block.field(4)
+    index = np.flatnonzero(fast & present)
+    if not len(index):
+        return
+    length = end[index] - start[index]
+    width = max(1, int(length.max()))
+    ids, _ = block.gather(start[index], length, width)
+    keys, group = np.unique(ids.view(f'S{width}').ravel(), return_inverse=True)
+    group = group.ravel()
+    groups = len(keys)
+    download, upload, ping = block.download[index], block.upload[index], block.ping[index]
+
+    counts = np.bincount(group, minlength=groups)
+    sums = [np.bincount(group, weights=values, minlength=groups) for values in (download, upload, ping)]
+    extremes = []
+    for values in (download, upload):
+        low = np.full(groups, np.inf)
+        high = np.full(groups, -np.inf)
+        np.minimum.at(low, group, values)
+        np.maximum.at(high, group, values)
+        extremes.append((low, high))
+
+    # Sorted by server, then timestamp text (stably), the last row of each server is its latest test
+    ts_start, ts_end, _ = block.field(0)
+    stamps, _ = block.gather(ts_start[index], ts_end[index] - ts_start[index], TIMESTAMP_WIDTH)
+    order = np.lexsort((stamps.view(f'S{TIMESTAMP_WIDTH}').ravel(), group))
+    last = order[np.searchsorted(group[order], np.arange(groups), side='right') - 1]
+
+    for g, key in enumerate(keys.tolist()):
+        latest = int(index[last[g]])
+        acc.servers[key.decode('utf-8', errors='replace')] = {
+            'server_name': block.text(5, latest),
+            'count': int(counts[g]),
+            'total_dl': float(sums[0][g]),
+            'total_ul': float(sums[1][g]),
+            'total_ping': float(sums[2][g]),
+            'min_dl': float(extremes[0][0][g]),
+            'max_dl': float(extremes[0][1][g]),
+            'min_ul': float(extremes[1][0][g]),
+            'max_ul': float(extremes[1][1][g]),
+            'last_seen': block.text(0, latest),
+        }
+
+
+def index_entries(arrays, count, cum_dl, cum_ul, stride):
+    """Returns the timestamp index entries (see load_log_index) for the plottable lines of `arrays`.
+
+    `count`, `cum_dl` and `cum_ul` are the index totals before these lines;
+    the new totals are returned after the entries.
+    """
+    valid = np.flatnonzero(arrays.plot_valid)
+    download = arrays.download[valid]
+    upload = arrays.upload[valid]
+    ordinals = count + np.arange(len(valid))
+    # Totals of everything before each record
+    before_dl = cum_dl + np.cumsum(download) - download
+    before_ul = cum_ul + np.cumsum(upload) - upload
+
+    entries = []
+    for i in np.flatnonzero(ordinals % stride == 0).tolist():
+        line = valid[i]
+        entries.append([arrays.timestamp[line].item().timestamp(), int(arrays.line_start[line]),
+                        int(ordinals[i]), float(before_dl[i]), float(before_ul[i])])
+    return (entries, count + len(valid), cum_dl + float(download.sum()),
+            cum_ul + float(upload.sum()))
+
+
+def plot_data(arrays, cutoff_date, points=(), base=(0, 0.0, 0.0)):
+    """Returns the get_plot_data dict for the plottable lines of `arrays`, or None if the window is empty.
+
+    `points` are earlier `(datetime, count, total_dl, total_ul)` rollup
+    buckets and `base` the `(count, total_dl, total_ul)` of the log
+    records before the first line; both seed the cumulative averages.
+    """
+    valid = arrays.plot_valid
+    points = list(points)
+    timestamp = np.concatenate((
+        np.array([dt for dt, _, _, _ in points], dtype='datetime64[us]'),
+        np.array(['NaT'], dtype='datetime64[us]'),
+        arrays.timestamp[valid]))
+    counts = np.concatenate((
+        np.array([n for _, n, _, _ in points], dtype=np.float64),
+        [base[0]],
+        np.ones(int(valid.sum()))))
+    total_dl = np.concatenate(([p[2] for p in points], [base[1]], arrays.download[valid]))
+    total_ul = np.concatenate(([p[3] for p in points], [base[2]], arrays.upload[valid]))
+
+    # Cumulative averages cover the whole history, so they are computed before filtering
+    cum_counts = np.cumsum(counts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_dl = np.cumsum(total_dl) / cum_counts
+        avg_ul = np.cumsum(total_ul) / cum_counts
+        downloads = total_dl / counts
+        uploads = total_ul / counts
+
+    window = timestamp >= np.datetime64(cutoff_date, 'us')
+    if not window.any():
+        return None
+    return {
+        'dates': timestamp[window].tolist(),
+        'downloads': downloads[window].tolist(),
+        'uploads': uploads[window].tolist(),
+        'avg_downloads': avg_dl[window].tolist(),
+        'avg_uploads': avg_ul[window].tolist(),
+    }
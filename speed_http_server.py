@@ -1,49 +1,991 @@
 #!/usr/bin/env python3
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import collections
+import email.utils
+import gzip
+from html import escape
 import json
+import math
 import os
-import tempfile
-import base64
+import hashlib
+import re
 import ssl
-from speed_utils import calculate_stats, generate_plot_image, get_latest_speedtest
+import threading
+import time
+import hmac
+from bisect import bisect_left
+from urllib.parse import urlsplit, parse_qs
+import datetime
+from itertools import islice
+from speed_metrics import (BYTES_READ, CACHE_REQUESTS, CONTENT_TYPE as METRICS_CONTENT_TYPE, FUNCTION_SECONDS,
+                           LINES_PARSED, Counter, Gauge, Histogram, render as render_metrics)
+from speed_utils import (PERCENTILES, ROLLUP_SUFFIX, LogRecord, StatsAccumulator, bucket_records,
+                         find_index_entry, format_log_line, get_test_samples, iter_lines_from,
+                         iter_lines_reverse, iter_log_records, iter_rollup_buckets, load_log_index,
+                         load_rollup, log_fingerprint, parse_log_record, parse_stats_line,
+                         read_plot_window, record_to_dict, scan_log_stats)
+from speed_svg import render_svg
 
 # Configuration
 HOST = '0.0.0.0'
 PORT = 8000
+WORKERS = 8 # Threads serving requests (TLS handshake included)
+QUEUE_LIMIT = 32 # Accepted connections allowed to wait for a worker before new ones are refused
+REQUEST_TIMEOUT = 30 # Seconds a client may stall a worker
+KEEPALIVE_TIMEOUT = 5 # Seconds an idle keep-alive connection may hold a worker before it is closed
 LOG_FILE = 'speed_log.txt' # Make sure this matches the log file used by check_speed.py
-TEMP_PLOT_FILE = os.path.join(tempfile.gettempdir(), 'speed_plot.png')
+INGEST_DIR = 'probes' # Results POSTed to /ingest are stored here, one log file per probe
+INGEST_TOKEN = os.environ.get('SPEED_INGEST_TOKEN') # /ingest is disabled unless a token is set
+INGEST_FLUSH_INTERVAL = 0.5 # Seconds between group commits of ingested results
+INGEST_FLUSH_RECORDS = 1000 # Buffered results that trigger an early commit
+MAX_INGEST_BYTES = 1024 * 1024
+PROBE_ID_PATTERN = re.compile(r'[A-Za-z0-9_.-]{1,64}')
+# Paths reported under their own label in the HTTP metrics; anything else is "other"
+METRIC_ROUTES = ('/', '/plot.svg', '/plot.png', '/api/stats', '/api/latest', '/api/history', '/api/samples', '/events', '/ingest', '/metrics')
+
+HTTP_SECONDS = Histogram('speed_http_request_duration_seconds', 'Time to handle a request, by route.', ['route'])
+HTTP_RESPONSES = Counter('speed_http_responses_total', 'Responses sent, by route and status code.', ['route', 'code'])
+HTTP_REJECTED = Counter('speed_http_rejected_total', 'Connections refused because the worker pool was full.')
+LOG_SIZE = Gauge('speed_log_size_bytes', 'Size of each log the dashboard serves.', ['log'])
+EVENT_SUBSCRIBERS = Gauge('speed_event_subscribers', 'Clients connected to /events, by log.', ['log'])
+LATEST_DOWNLOAD = Gauge('speed_latest_download_mbps', 'Download speed of the latest test.', ['probe'])
+LATEST_UPLOAD = Gauge('speed_latest_upload_mbps', 'Upload speed of the latest test.', ['probe'])
+LATEST_PING = Gauge('speed_latest_ping_ms', 'Ping of the latest test.', ['probe'])
+LATEST_TIMESTAMP = Gauge('speed_latest_timestamp_seconds', 'Unix time of the latest test.', ['probe'])
+DEFAULT_PLOT_DAYS = 30
+MAX_PLOT_DAYS = 3650
+HISTORY_CHUNK_RECORDS = 500 # Records serialized per write when streaming /api/history
+RESPONSE_CACHE_ENTRIES = 128 # Rendered responses kept by RESPONSE_CACHE
+GZIP_MIN_BYTES = 1024 # Smaller bodies are sent uncompressed
+RECENT_TESTS = 10 # Rows in the dashboard's "Recent Tests" table
+EVENT_POLL_INTERVAL = 1.0 # Seconds between checks of a watched log for new results
+EVENT_KEEPALIVE = 15.0 # Seconds of silence after which /events clients get a comment line
+EVENT_SEND_TIMEOUT = 5.0 # Seconds an /events client may stall a write before it is dropped
+MAX_EVENT_SUBSCRIBERS = 256 # Open /events connections allowed per log
+
+class LogModel:
+    """Parsed in-memory view of a log file shared by all request handlers.
+
+    `refresh()` polls the file's size/mtime and only ingests lines appended
+    since the last call, so serving a page does not rescan the log. A
+    rotated or rewritten log is detected and reloaded from scratch: the
+    first load (see `_seed`) starts from the log's sidecars, and plot
+    points are only kept for the largest window a page can ask for.
+    """
+
+    def __init__(self, log_file):
+        self.log_file = log_file
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.inode = None
+        self.size = None
+        self.mtime_ns = None
+        self.offset = 0
+        self.fingerprint = None
+        self.seeded = False
+        # Older points only count towards the cumulative averages
+        self.window_start = datetime.datetime.now() - datetime.timedelta(days=MAX_PLOT_DAYS)
+        # The newest results as LogRecords, oldest first; converted to dicts on read
+        self.recent = collections.deque(maxlen=RECENT_TESTS)
+        # Column store of plottable records, in log order
+        self.dates = []
+        self.downloads = []
+        self.uploads = []
+        self.avg_downloads = []
+        self.avg_uploads = []
+        self._cum_count = 0
+        self._cum_dl = 0.0
+        self._cum_ul = 0.0
+
+        # Compacted history (see speed_utils.compact_log_segments) precedes the live log
+        self.rollup_mtime_ns = self._rollup_mtime_ns()
+        rollup = load_rollup(self.log_file)
+        self.stats = StatsAccumulator.from_dict(rollup['total'])
+        for dt, n, total_dl, total_ul in iter_rollup_buckets(rollup):
+            self._append_point(dt, total_dl / n, total_ul / n, n, total_dl, total_ul)
+
+    def _rollup_mtime_ns(self):
+        try:
+            return os.stat(self.log_file + ROLLUP_SUFFIX).st_mtime_ns
+        except OSError:
+            return None
+
+    @FUNCTION_SECONDS.time(function='LogModel.refresh')
+    def refresh(self):
+        with self._lock:
+            if self._rollup_mtime_ns() != self.rollup_mtime_ns:
+                self._reset()
+            try:
+                st = os.stat(self.log_file)
+            except OSError:
+                if self.inode is not None:
+                    self._reset()
+                return
+            if (st.st_ino, st.st_size, st.st_mtime_ns) == (self.inode, self.size, self.mtime_ns):
+                return
+
+            try:
+                with open(self.log_file, 'rb') as f:
+                    st = os.fstat(f.fileno())
+                    if (st.st_ino != self.inode or st.st_size < self.offset
+                            or log_fingerprint(f, self.offset) != self.fingerprint):
+                        self._reset()
+                    if not self.seeded:
+                        self._seed(f)
+                    start_offset = self.offset
+                    lines = 0
+                    for line, offset, complete in iter_lines_from(f, self.offset):
+                        if not complete:
+                            break
+                        self._ingest(line)
+                        self.offset = offset
+                        lines += 1
+                    self.fingerprint = log_fingerprint(f, self.offset)
+                    LINES_PARSED.inc(lines, reader='model')
+                    BYTES_READ.inc(self.offset - start_offset, reader='model')
+            except OSError as e:
+                print(f"Error reading log file {self.log_file}: {e}")
+                return
+
+            self.inode, self.size, self.mtime_ns = st.st_ino, st.st_size, st.st_mtime_ns
+            LOG_SIZE.set(st.st_size, log=self.log_file)
+
+    def _seed(self, f):
+        """Loads the complete lines of a freshly reset model without parsing them one by one.
+
+        Statistics come from the stats sidecar (see speed_utils.scan_log_stats)
+        and the totals before the plot window from the timestamp index, so
+        only the window itself is parsed, vectorized when NumPy is installed.
+        The recent results are read backwards from where the stats end.
+        """
+        acc, offset, _ = scan_log_stats(f, self.log_file)
+
+        # The index may already cover lines appended since the stats scan; those are tailed later
+        index = load_log_index(self.log_file, f=f)
+        entries = [entry for entry in index['entries'] if entry[1] < offset]
+        start, count, cum_dl, cum_ul = find_index_entry({'entries': entries}, self.window_start)
+        base = (self._cum_count + count, self._cum_dl + cum_dl, self._cum_ul + cum_ul)
+        data, totals = read_plot_window(f, start, offset, self.window_start, base)
+
+        recent = []
+        for line in iter_lines_reverse(f, end=offset):
+            record = parse_log_record(line)
+            if record:
+                recent.append(record)
+                if len(recent) == RECENT_TESTS:
+                    break
+
+        # Nothing is applied until every read succeeded, so a failed seed can simply be retried
+        self.stats.merge(acc)
+        self._cum_count, self._cum_dl, self._cum_ul = totals
+        if data:
+            self.dates.extend(data['dates'])
+            self.downloads.extend(data['downloads'])
+            self.uploads.extend(data['uploads'])
+            self.avg_downloads.extend(data['avg_downloads'])
+            self.avg_uploads.extend(data['avg_uploads'])
+        self.recent.extend(reversed(recent))
+        self.offset = offset
+        self.seeded = True
+
+    def _ingest(self, line):
+        values = parse_stats_line(line)
+        if values:
+            self.stats.add(*values)
+
+        record = parse_log_record(line)
+        if not record:
+            return
+
+        # Times with an offset can't be placed in the local plot window (the NumPy engine skips them too)
+        if record.timestamp.tzinfo is None:
+            self._append_point(record.timestamp, record.download, record.upload,
+                               1, record.download, record.upload)
+
+        self.recent.append(record)
+
+    def state(self):
+        """Identifies the log contents the model currently reflects."""
+        with self._lock:
+            return (self.inode, self.size, self.mtime_ns)
+
+    def _append_point(self, dt, download, upload, count, total_dl, total_ul):
+        """Adds one plot point standing for `count` results summing to total_dl/total_ul."""
+        self._cum_count += count
+        self._cum_dl += total_dl
+        self._cum_ul += total_ul
+        if dt < self.window_start:
+            return
+        self.dates.append(dt)
+        self.downloads.append(download)
+        self.uploads.append(upload)
+        self.avg_downloads.append(self._cum_dl / self._cum_count)
+        self.avg_uploads.append(self._cum_ul / self._cum_count)
+
+    def get_stats(self):
+        self.refresh()
+        with self._lock:
+            return self.stats.result()
+
+    def get_server_stats(self):
+        self.refresh()
+        with self._lock:
+            return self.stats.server_results()
+
+    def get_latest(self):
+        self.refresh()
+        with self._lock:
+            return record_to_dict(self.recent[-1]) if self.recent else None
+
+    def get_recent(self):
+        """The last RECENT_TESTS results, newest first (like speed_utils.get_recent_speedtests)."""
+        self.refresh()
+        with self._lock:
+            return [record_to_dict(r) for r in reversed(self.recent)]
+
+    def get_plot_data(self, days=30):
+        """Same shape as speed_utils.get_plot_data, sliced from the model."""
+        self.refresh()
+        with self._lock:
+            cutoff_date = datetime.datetime.now() - datetime.timedelta(days=days)
+            start = bisect_left(self.dates, cutoff_date)
+            if start >= len(self.dates):
+                return None
+            return {
+                'dates': self.dates[start:],
+                'downloads': self.downloads[start:],
+                'uploads': self.uploads[start:],
+                'avg_downloads': self.avg_downloads[start:],
+                'avg_uploads': self.avg_uploads[start:],
+            }
+
+
+class PlotCache:
+    """SVG renders (see speed_svg) keyed on the model state and the `days` window.
+
+    While the log is unchanged a cached image is returned without rendering
+    again. Rendering is serialized so concurrent viewers share one render.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._renders = {}
+        self._lock = threading.Lock()
+
+    def get(self, days=DEFAULT_PLOT_DAYS):
+        """Returns the SVG as bytes, or None when there is nothing to plot."""
+        self.model.refresh()
+        key = (self.model.state(), days)
+        with self._lock:
+            cached = self._renders.get(days)
+            if cached and cached[0] == key:
+                CACHE_REQUESTS.inc(cache='plot_svg', result='hit')
+                return cached[1]
+            CACHE_REQUESTS.inc(cache='plot_svg', result='miss')
+
+            data = self.model.get_plot_data(days)
+            if not data:
+                self._renders.pop(days, None)
+                return None
+
+            with FUNCTION_SECONDS.time(function='render_svg'):
+                svg = render_svg(data, days=days).encode('utf-8')
+            self._renders[days] = (key, svg)
+            return svg
+
+
+class CachedResponse:
+    """A rendered response body with its ETag and a lazily built gzip encoding."""
+
+    def __init__(self, version, status, content_type, body):
+        self.version = version
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+        self.etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        self._gzipped = None
+
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, mtime=0)
+        return self._gzipped
+
+
+class ResponseCache:
+    """Rendered responses keyed on the request and the log state they were built from.
+
+    While the log is unchanged, repeated polls of a page are served from
+    here without rendering or compressing again, and clients holding the
+    ETag get a 304. The least recently used entries beyond
+    RESPONSE_CACHE_ENTRIES are dropped.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version, render):
+        """Returns the CachedResponse for `key`, calling `render()` unless one exists for `version`.
+
+        `render` returns (status, content_type, body).
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.version == version:
+                self._entries.move_to_end(key)
+                CACHE_REQUESTS.inc(cache='response', result='hit')
+                return entry
+        CACHE_REQUESTS.inc(cache='response', result='miss')
+
+        entry = CachedResponse(version, *render())
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+
+class IngestBuffer:
+    """Group-commits results POSTed by remote probes to per-probe log files.
+
+    Submitted lines are buffered and written by one flusher thread every
+    INGEST_FLUSH_INTERVAL seconds (sooner once INGEST_FLUSH_RECORDS are
+    waiting), with a single append and fsync per probe file. `submit`
+    returns once the commit holding its lines is on disk, so an
+    acknowledged batch is never lost, yet concurrent probes share writes.
+    """
+
+    def __init__(self, directory, flush_interval=INGEST_FLUSH_INTERVAL, max_records=INGEST_FLUSH_RECORDS):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.max_records = max_records
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._pending_count = 0
+        self._generation = 0
+        self._flushed = -1
+        self._errors = {}
+        self._thread = None
+
+    def probe_log_file(self, probe_id):
+        return os.path.join(self.directory, f"{probe_id}.txt")
+
+    def submit(self, probe_id, lines):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='speed-ingest', daemon=True)
+                self._thread.start()
+            self._pending.setdefault(probe_id, []).extend(lines)
+            self._pending_count += len(lines)
+            generation = self._generation
+            if self._pending_count >= self.max_records:
+                self._cond.notify_all()
+            self._cond.wait_for(lambda: self._flushed >= generation)
+            error = self._errors.get(generation)
+        if error:
+            raise error
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending_count >= self.max_records,
+                                    timeout=self.flush_interval)
+                if not self._pending:
+                    continue
+                batch = self._pending
+                generation = self._generation
+                self._pending = {}
+                self._pending_count = 0
+                self._generation += 1
+
+            error = None
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                for probe_id, lines in batch.items():
+                    with open(self.probe_log_file(probe_id), 'a') as f:
+                        f.write(''.join(lines))
+                        f.flush()
+                        os.fsync(f.fileno())
+            except OSError as e:
+                print(f"Error writing ingested results: {e}")
+                error = e
+
+            with self._cond:
+                self._flushed = generation
+                # Only the latest few failures can still have waiters
+                self._errors = {g: e for g, e in self._errors.items() if g > generation - 8}
+                if error:
+                    self._errors[generation] = error
+                self._cond.notify_all()
+
+
+class EventHub:
+    """Pushes each new result in a LogModel to every connected /events client.
+
+    A single watcher thread refreshes the model every EVENT_POLL_INTERVAL
+    seconds (a stat() while the log is unchanged) and writes each new result
+    to all subscribed sockets. Subscribers don't hold a worker thread, so
+    many open dashboards cost about as much as one. The thread exits when
+    the last subscriber disconnects.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._thread = None
+        self._last_timestamp = None
+
+    def is_full(self):
+        with self._lock:
+            return len(self._subscribers) >= MAX_EVENT_SUBSCRIBERS
+
+    def subscribe(self, sock):
+        """Takes over a connection whose event-stream response headers were sent."""
+        sock.settimeout(EVENT_SEND_TIMEOUT)
+        with self._lock:
+            self._subscribers.append(sock)
+            EVENT_SUBSCRIBERS.set(len(self._subscribers), log=self.model.log_file)
+            if self._thread is None:
+                latest = self.model.get_latest()
+                self._last_timestamp = latest['timestamp'] if latest else None
+                self._thread = threading.Thread(target=self._run, name='speed-events', daemon=True)
+                self._thread.start()
+
+    @staticmethod
+    def format_event(name, payload):
+        return f"event: {name}\ndata: {json.dumps(payload)}\n\n".encode('utf-8')
+
+    def _poll(self):
+        """Returns the encoded events for results logged since the previous poll."""
+        # Only the last RECENT_TESTS results are kept; dashboards only show those anyway
+        new = [r for r in reversed(self.model.get_recent())
+               if self._last_timestamp is None or r['timestamp'] > self._last_timestamp]
+        if not new:
+            return b''
+        self._last_timestamp = new[-1]['timestamp']
+        stats = self.model.get_stats()
+        return b''.join(self.format_event('result', {'result': r, 'stats': stats}) for r in new)
+
+    def _run(self):
+        idle = 0.0
+        while True:
+            time.sleep(EVENT_POLL_INTERVAL)
+            data = self._poll()
+            idle = 0.0 if data else idle + EVENT_POLL_INTERVAL
+            if idle >= EVENT_KEEPALIVE:
+                # Also how disconnected clients are noticed while the log is quiet
+                data = b': keepalive\n\n'
+                idle = 0.0
+
+            dead = []
+            if data:
+                with self._lock:
+                    subscribers = list(self._subscribers)
+                for sock in subscribers:
+                    try:
+                        sock.sendall(data)
+                    except OSError:
+                        dead.append(sock)
+
+            with self._lock:
+                for sock in dead:
+                    self._subscribers.remove(sock)
+                    try:
+                        sock.close()
+                    except OSError:
+                        pass
+                EVENT_SUBSCRIBERS.set(len(self._subscribers), log=self.model.log_file)
+                if not self._subscribers:
+                    self._thread = None
+                    return
+
+
+MODEL = LogModel(LOG_FILE)
+PLOT_CACHE = PlotCache(MODEL)
+RESPONSE_CACHE = ResponseCache()
+INGEST_BUFFER = IngestBuffer(INGEST_DIR)
+# probe_id -> (LogModel, PlotCache) for logs received through /ingest
+PROBES = {}
+PROBES_LOCK = threading.Lock()
+# LogModel -> EventHub for models with /events subscribers
+EVENT_HUBS = {}
+
+def get_probe(probe_id=None):
+    """Returns (model, plot_cache) for a probe, or for the local log when probe_id is None.
+
+    Returns None for an unknown or invalid probe ID.
+    """
+    if probe_id is None:
+        return MODEL, PLOT_CACHE
+    if not PROBE_ID_PATTERN.fullmatch(probe_id):
+        return None
+    log_file = INGEST_BUFFER.probe_log_file(probe_id)
+    with PROBES_LOCK:
+        if probe_id not in PROBES:
+            if not os.path.exists(log_file):
+                return None
+            model = LogModel(log_file)
+            PROBES[probe_id] = (model, PlotCache(model))
+        return PROBES[probe_id]
+
+def get_event_hub(model):
+    with PROBES_LOCK:
+        if model not in EVENT_HUBS:
+            EVENT_HUBS[model] = EventHub(model)
+        return EVENT_HUBS[model]
+
+def list_probes():
+    try:
+        names = os.listdir(INGEST_DIR)
+    except OSError:
+        return []
+    return sorted(name[:-4] for name in names
+                  if name.endswith('.txt') and PROBE_ID_PATTERN.fullmatch(name[:-4]))
 
 class ReuseAddrHTTPServer(HTTPServer):
     allow_reuse_address = True
 
+class PooledHTTPServer(ReuseAddrHTTPServer):
+    """Hands each accepted connection to a bounded pool of worker threads.
+
+    The accept loop only accepts; the TLS handshake, request parsing and any
+    rendering happen in a worker. When `workers + queue_limit` connections
+    are already in flight, new ones are refused immediately instead of
+    piling up behind a slow client.
+    """
+
+    def __init__(self, server_address, handler_class, workers=WORKERS,
+                 queue_limit=QUEUE_LIMIT, ssl_context=None):
+        super().__init__(server_address, handler_class)
+        self.ssl_context = ssl_context
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='speed-http')
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            self._reject(request)
+            return
+        self._executor.submit(self._process_request_worker, request, client_address)
+
+    def finish_request(self, request, client_address):
+        """Returns True when the handler handed the connection off (see EventHub)."""
+        handler = self.RequestHandlerClass(request, client_address, self)
+        return getattr(handler, 'detached', False)
+
+    def _process_request_worker(self, request, client_address):
+        detached = False
+        try:
+            request.settimeout(REQUEST_TIMEOUT)
+            if self.ssl_context:
+                with FUNCTION_SECONDS.time(function='tls_handshake'):
+                    request = self.ssl_context.wrap_socket(request, server_side=True)
+            detached = self.finish_request(request, client_address)
+        except (ssl.SSLError, OSError):
+            # Failed handshakes and dropped clients are routine; don't log tracebacks
+            pass
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if not detached:
+                self.shutdown_request(request)
+            self._slots.release()
+
+    def _reject(self, request):
+        HTTP_REJECTED.inc()
+        try:
+            # A plain-text response is meaningless before a TLS handshake, so just close
+            if not self.ssl_context:
+                request.sendall(b"HTTP/1.0 503 Service Unavailable\r\n"
+                                b"Retry-After: 1\r\nContent-Length: 0\r\n\r\n")
+        except OSError:
+            pass
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False)
+
 class SpeedHTTPRequestHandler(BaseHTTPRequestHandler):
-    def _set_headers(self, content_type='text/html', status=200):
+    # Persistent connections spare pollers a TLS handshake per request
+    protocol_version = 'HTTP/1.1'
+
+    def handle(self):
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            # An idle connection holds a worker, so it gets less time than a request in progress
+            self.connection.settimeout(KEEPALIVE_TIMEOUT)
+            try:
+                if not self.rfile.peek(1):
+                    break
+            except OSError:
+                break
+            self.connection.settimeout(REQUEST_TIMEOUT)
+            self.handle_one_request()
+
+    def _send_body(self, body, content_type='text/html', status=200):
         self.send_response(status)
         self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _accepts_gzip(self):
+        for coding in self.headers.get('Accept-Encoding', '').split(','):
+            name, _, params = coding.partition(';')
+            if name.strip().lower() == 'gzip':
+                return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+        return False
+
+    def _not_modified(self, etags, mtime):
+        """Evaluates If-None-Match (preferred) or If-Modified-Since against the response validators."""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = {tag.strip()[2:] if tag.strip().startswith('W/') else tag.strip()
+                    for tag in if_none_match.split(',')}
+            return '*' in tags or not tags.isdisjoint(etags)
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since and mtime is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return since.tzinfo is not None and int(mtime) <= since.timestamp()
+        return False
+
+    def _send_cached(self, render, *extra):
+        """Serves a response that only depends on the request and the model's log state.
+
+        The body comes from RESPONSE_CACHE, gzipped when the client accepts
+        it, with an ETag and a Last-Modified time of the log; a matching
+        conditional request gets a 304 without a body.
+        """
+        self.model.refresh()
+        state = self.model.state()
+        key = (self.model, self.url.path, self.url.query)
+        entry = RESPONSE_CACHE.get(key, (state,) + extra, render)
+        if entry.status != 200:
+            self._send_body(entry.body, entry.content_type, entry.status)
+            return
+
+        mtime = state[2] / 1e9 if state[2] is not None else None
+        # Each encoding is a different representation and needs its own ETag
+        gzip_etag = entry.etag[:-1] + '-gzip"'
+        use_gzip = len(entry.body) >= GZIP_MIN_BYTES and self._accepts_gzip()
+        not_modified = self._not_modified((entry.etag, gzip_etag), mtime)
+        body = b'' if not_modified else entry.gzipped() if use_gzip else entry.body
+
+        self.send_response(304 if not_modified else 200)
+        if not not_modified:
+            self.send_header('Content-type', entry.content_type)
+            self.send_header('Content-Length', str(len(body)))
+            if use_gzip:
+                self.send_header('Content-Encoding', 'gzip')
+        self.send_header('ETag', gzip_etag if use_gzip else entry.etag)
+        if mtime is not None:
+            self.send_header('Last-Modified', email.utils.formatdate(mtime, usegmt=True))
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Vary', 'Accept-Encoding')
         self.end_headers()
+        self.wfile.write(body)
+
+    def send_response(self, code, message=None):
+        self.status_code = code
+        super().send_response(code, message)
+
+    def _observe(self, path, handler, *args):
+        """Runs a route handler, recording its latency and response code."""
+        route = path if path in METRIC_ROUTES else 'other'
+        self.status_code = None
+        start = time.perf_counter()
+        try:
+            handler(*args)
+        finally:
+            HTTP_SECONDS.observe(time.perf_counter() - start, route=route)
+            HTTP_RESPONSES.inc(route=route, code=self.status_code or 0)
 
     def do_GET(self):
-        if self.path == '/':
+        url = urlsplit(self.path)
+        self._observe(url.path, self._handle_get, url)
+
+    def _handle_get(self, url):
+        if url.path == '/metrics':
+            self.handle_metrics_request()
+            return
+
+        self.url = url
+        self.query = parse_qs(url.query)
+        self.probe_id = self.query.get('probe', [None])[0]
+        probe = get_probe(self.probe_id)
+        if probe is None:
+            self._send_body(b"Unknown probe", status=404)
+            return
+        self.model, self.plot_cache = probe
+
+        if url.path == '/':
             self.handle_main_page_request()
+        elif url.path == '/plot.svg':
+            self.handle_plot_request()
+        elif url.path == '/plot.png':
+            # The plot used to be a PNG; keep old embeds and bookmarks working
+            self.send_response(301)
+            self.send_header('Location', '/plot.svg' + (f'?{url.query}' if url.query else ''))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif url.path == '/api/stats':
+            self._send_cached(lambda: self._render_json(self.model.get_stats()))
+        elif url.path == '/api/latest':
+            self._send_cached(lambda: self._render_json(self.model.get_latest()))
+        elif url.path == '/api/history':
+            self.handle_history_request()
+        elif url.path == '/events':
+            self.handle_events_request()
+        elif url.path == '/api/samples':
+            samples = get_test_samples(self.model.log_file, self.query.get('timestamp', [None])[0])
+            self._send_json(samples, status=200 if samples else 404)
         else:
-            self._set_headers(status=404)
-            self.wfile.write(b"404 Not Found")
+            self._send_body(b"404 Not Found", status=404)
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        if path == '/ingest':
+            self._observe(path, self.handle_ingest_request)
+        else:
+            # The request body is left unread
+            self.close_connection = True
+            self._observe(path, self._send_json, {'error': 'Not found'}, 404)
+
+    def handle_metrics_request(self):
+        """Serves the counters and histograms of speed_metrics, plus the latest result of each log."""
+        probes = [('local', MODEL)]
+        with PROBES_LOCK:
+            probes += [(probe_id, model) for probe_id, (model, _) in PROBES.items()]
+        for probe, model in probes:
+            latest = model.get_latest()
+            if not latest:
+                continue
+            LATEST_DOWNLOAD.set(latest['download'], probe=probe)
+            LATEST_UPLOAD.set(latest['upload'], probe=probe)
+            LATEST_PING.set(latest['ping'], probe=probe)
+            LATEST_TIMESTAMP.set(datetime.datetime.fromisoformat(latest['timestamp']).timestamp(), probe=probe)
+
+        body = render_metrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-type', METRICS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle_ingest_request(self):
+        """Accepts a batch of results from a remote probe.
+
+        Expects `Authorization: Bearer <INGEST_TOKEN>` and a JSON body
+        `{"probe_id": "...", "results": [{"timestamp", "download", "upload",
+        "ping", "server_id", "server_name"}, ...]}`. Responds once the batch
+        is committed to the probe's log file.
+        """
+        # Rejections before the body is read leave it unread, so the connection can't be reused
+        if not INGEST_TOKEN:
+            self.close_connection = True
+            self._send_json({'error': 'Ingest is disabled'}, status=403)
+            return
+        auth = self.headers.get('Authorization', '')
+        if not hmac.compare_digest(auth.encode('utf-8'), f"Bearer {INGEST_TOKEN}".encode('utf-8')):
+            self.close_connection = True
+            self._send_json({'error': 'Unauthorized'}, status=401)
+            return
+
+        length = self.headers.get('Content-Length')
+        if length is None:
+            self.close_connection = True
+            self._send_json({'error': 'Content-Length required'}, status=411)
+            return
+        try:
+            length = int(length)
+        except ValueError:
+            length = 0
+        if length <= 0:
+            self.close_connection = True
+            self._send_json({'error': 'Invalid or empty body'}, status=400)
+            return
+        if length > MAX_INGEST_BYTES:
+            self.close_connection = True
+            self._send_json({'error': f'Body must be at most {MAX_INGEST_BYTES} bytes'}, status=413)
+            return
+
+        try:
+            payload = json.loads(self.rfile.read(length))
+            probe_id = payload['probe_id']
+            if not isinstance(probe_id, str) or not PROBE_ID_PATTERN.fullmatch(probe_id):
+                raise ValueError(f"invalid probe_id {probe_id!r}")
+            lines = []
+            for result in payload['results']:
+                # Remote fields must not be able to smuggle extra columns or lines into the log
+                server_id, server_name = (' '.join(str(result.get(key, 'N/A')).replace(',', ' ').split())
+                                          for key in ('server_id', 'server_name'))
+                timestamp = datetime.datetime.fromisoformat(result['timestamp'])
+                if timestamp.tzinfo is not None:
+                    # Logs hold naive local times; an aware one couldn't be compared with them
+                    timestamp = timestamp.astimezone().replace(tzinfo=None)
+                values = [float(result[key]) for key in ('download', 'upload', 'ping')]
+                if not all(math.isfinite(value) for value in values):
+                    raise ValueError(f"non-finite value in {values}")
+                record = LogRecord(timestamp, *values, server_id, server_name)
+                lines.append(format_log_line(record))
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json({'error': f'Invalid batch: {e}'}, status=400)
+            return
+
+        try:
+            INGEST_BUFFER.submit(probe_id, lines)
+        except OSError:
+            self._send_json({'error': 'Could not store results'}, status=503)
+            return
+        self._send_json({'accepted': len(lines)})
+
+    def _get_days(self):
+        try:
+            days = int(self.query.get('days', [DEFAULT_PLOT_DAYS])[0])
+        except ValueError:
+            return DEFAULT_PLOT_DAYS
+        return max(1, min(days, MAX_PLOT_DAYS))
 
     def handle_main_page_request(self):
-        stats = calculate_stats(LOG_FILE)
-        latest_test = get_latest_speedtest(LOG_FILE)
-        
-        plot_base64 = None
-        if generate_plot_image(LOG_FILE, TEMP_PLOT_FILE):
-            if os.path.exists(TEMP_PLOT_FILE):
-                with open(TEMP_PLOT_FILE, 'rb') as f:
-                    plot_base64 = base64.b64encode(f.read()).decode('utf-8')
+        # The probe links are part of the page, so a new probe invalidates it too
+        self._send_cached(self._render_main_page, tuple(list_probes()))
+
+    def _render_main_page(self):
+        stats = self.model.get_stats()
+        latest_test = self.model.get_latest()
+        server_stats = self.model.get_server_stats()
+        recent_tests = self.model.get_recent()
+        days = self._get_days()
+
+        plot_url = f"/plot.svg?days={days}"
+        if self.probe_id:
+            plot_url += f"&probe={self.probe_id}"
+        plot = self.plot_cache.get(days)
+        plot_svg = plot.decode('utf-8') if plot else None
+
+        html = self._generate_html(stats, latest_test, plot_url, server_stats, recent_tests, plot_svg)
+        return 200, 'text/html', html.encode('utf-8')
+
+    def handle_plot_request(self):
+        self._send_cached(self._render_plot)
+
+    def _render_plot(self):
+        plot = self.plot_cache.get(self._get_days())
+        if not plot:
+            return 404, 'text/html', b"No data to plot"
+        return 200, 'image/svg+xml', plot
+
+    @staticmethod
+    def _render_json(payload, status=200):
+        return status, 'application/json', json.dumps(payload).encode('utf-8')
 
-        html = self._generate_html(stats, latest_test, plot_base64)
-        self._set_headers('text/html')
-        self.wfile.write(html.encode('utf-8'))
+    def _send_json(self, payload, status=200):
+        status, content_type, body = self._render_json(payload, status)
+        self._send_body(body, content_type, status)
+
+    def _query_time(self, name):
+        """Parses an ISO-8601 or epoch-seconds query parameter; None when absent."""
+        value = self.query.get(name, [None])[0]
+        if value is None:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            moment = datetime.datetime.fromisoformat(value)
+            if moment.tzinfo is not None:
+                # Log timestamps are naive local times
+                moment = moment.astimezone().replace(tzinfo=None)
+            return moment
+        try:
+            return datetime.datetime.fromtimestamp(seconds)
+        except (ValueError, OverflowError, OSError):
+            raise ValueError(f"'{name}' is out of range") from None
+
+    def _query_int(self, name):
+        value = self.query.get(name, [None])[0]
+        if value is None:
+            return None
+        value = int(value)
+        if value <= 0:
+            raise ValueError(f"'{name}' must be positive")
+        return value
+
+    def handle_history_request(self):
+        """Streams results in [from, to) as JSON, optionally averaged into `step`-second buckets.
+
+        The body is written in chunks while the log is read, so a large range
+        never has to be held in memory.
+        """
+        try:
+            start = self._query_time('from')
+            end = self._query_time('to')
+            limit = self._query_int('limit')
+            step = self._query_int('step')
+        except ValueError as e:
+            self._send_json({'error': f"Invalid query parameter: {e}"}, status=400)
+            return
+
+        items = iter_log_records(self.model.log_file, start, end)
+        if step:
+            items = bucket_records(items, step)
+        else:
+            items = map(record_to_dict, items)
+        if limit:
+            items = islice(items, limit)
+
+        # The length isn't known up front, so the body is sent with chunked transfer encoding
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self._write_chunk(b'{"results": [')
+        first = True
+        while True:
+            chunk = list(islice(items, HISTORY_CHUNK_RECORDS))
+            if not chunk:
+                break
+            encoded = ', '.join(json.dumps(item) for item in chunk)
+            self._write_chunk(((', ' if not first else '') + encoded).encode('utf-8'))
+            first = False
+        self._write_chunk(b']}')
+        self._write_chunk(b'')
 
-    def _generate_html(self, stats, latest_test, plot_base64):
+    def _write_chunk(self, data):
+        """Writes one chunk of a chunked response; an empty one ends the body."""
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    def handle_events_request(self):
+        """Streams new results as Server-Sent Events until the client disconnects."""
+        hub = get_event_hub(self.model)
+        if hub.is_full():
+            self._send_body(b"Too many event subscribers", status=503)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        # The stream ends when either side closes it; this also ends the keep-alive loop
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(b'retry: 5000\n\n')
+        self.wfile.flush()
+        hub.subscribe(self.connection)
+        self.detached = True
+
+    @FUNCTION_SECONDS.time(function='render_html')
+    def _generate_html(self, stats, latest_test, plot_url, server_stats=None, recent_tests=None, plot_svg=None):
         css = """
 <style>
     body { font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, "Helvetica Neue", Arial, sans-serif; margin: 0; background-color: #f0f2f5; color: #1c1e21; }
@@ -59,69 +1001,161 @@ class SpeedHTTPRequestHandler(BaseHTTPRequestHandler):
     .plot-container { background-color: #fff; padding: 20px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); text-align: center; }
     .plot-container h2 { color: #0056b3; margin-top: 0; }
     h2 { text-align: center; color: #0056b3; margin-top: 40px; }
-    img { max-width: 100%; height: auto; }
+    svg { max-width: 100%; height: auto; }
+    .table-container { background-color: #fff; padding: 20px; border-radius: 8px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); margin-bottom: 40px; overflow-x: auto; }
+    table { width: 100%; border-collapse: collapse; }
+    th, td { padding: 8px 12px; border-bottom: 1px solid #dddfe2; text-align: right; }
+    th:nth-child(2), td:nth-child(2) { text-align: left; }
+    th { color: #606770; font-weight: 600; }
 </style>
 """
         
         html_content = f"<!DOCTYPE html><html lang='en'><head><meta charset='UTF-8'><title>Internet Speed Statistics</title>{css}</head><body>"
-        html_content += "<div class='header'><h1>Internet Speed Statistics</h1></div>"
+        probe_id = getattr(self, 'probe_id', None)
+        title = f"Internet Speed Statistics &ndash; {escape(probe_id)}" if probe_id else "Internet Speed Statistics"
+        html_content += f"<div class='header'><h1>{title}</h1></div>"
         html_content += "<div class='container'>"
 
+        probes = list_probes()
+        if probes:
+            links = ["<a href='/'>local</a>"] + [f"<a href='/?probe={escape(p)}'>{escape(p)}</a>" for p in probes]
+            html_content += f"<p>Probes: {' | '.join(links)}</p>"
+
         if stats:
             html_content += "<h2>Historical Averages</h2>"
             html_content += "<div class='stats-container'>"
             
-            def tile(title, value, unit):
+            def tile(title, value, unit, field=''):
                 return f'''
                 <div class='stat-tile'>
                     <h3>{title}</h3>
-                    <p class='value'>{value}</p>
+                    <p class='value' {field}>{value}</p>
                     <span class='unit'>{unit}</span>
                 </div>
                 '''
             
-            html_content += tile("Avg Download", f"{stats.get('avg_dl', 0):.2f}", "Mbps")
-            html_content += tile("Avg Upload", f"{stats.get('avg_ul', 0):.2f}", "Mbps")
-            html_content += tile("Avg Ping", f"{stats.get('avg_ping', 0):.2f}", "ms")
-            html_content += tile("Total Tests", stats.get('count', 0), "")
-            html_content += tile("Highest Download", f"{stats.get('max_dl', 0):.2f}", "Mbps")
-            html_content += tile("Highest Upload", f"{stats.get('max_ul', 0):.2f}", "Mbps")
+            html_content += tile("Avg Download", f"{stats.get('avg_dl', 0):.2f}", "Mbps", "data-stat='avg_dl'")
+            html_content += tile("Avg Upload", f"{stats.get('avg_ul', 0):.2f}", "Mbps", "data-stat='avg_ul'")
+            html_content += tile("Avg Ping", f"{stats.get('avg_ping', 0):.2f}", "ms", "data-stat='avg_ping'")
+            html_content += tile("Total Tests", stats.get('count', 0), "", "data-stat='count'")
+            html_content += tile("Highest Download", f"{stats.get('max_dl', 0):.2f}", "Mbps", "data-stat='max_dl'")
+            html_content += tile("Highest Upload", f"{stats.get('max_ul', 0):.2f}", "Mbps", "data-stat='max_ul'")
             
             html_content += "</div>"
+
+            html_content += "<h2>Percentiles</h2>"
+            html_content += "<div class='stats-container'>"
+            for key, title, unit in (('dl', 'Download', 'Mbps'), ('ul', 'Upload', 'Mbps'), ('ping', 'Ping', 'ms')):
+                for p in PERCENTILES:
+                    html_content += tile(f"{title} p{p}", f"{stats.get(f'p{p}_{key}', 0):.2f}", unit, f"data-stat='p{p}_{key}'")
+            html_content += tile("Ping Jitter (std dev)", f"{stats.get('ping_stddev', 0):.2f}", "ms", "data-stat='ping_stddev'")
+            html_content += "</div>"
         else:
             html_content += "<p>No statistics available yet.</p>"
         
         if latest_test:
             html_content += "<h2>Latest Speed Test</h2>"
             html_content += "<div class='stats-container'>"
-            html_content += tile("Download", f"{latest_test.get('download', 0):.2f}", "Mbps")
-            html_content += tile("Upload", f"{latest_test.get('upload', 0):.2f}", "Mbps")
-            html_content += tile("Ping", f"{latest_test.get('ping', 0):.2f}", "ms")
-            html_content += f"<div class='stat-tile'><h3>Server</h3><p class='value' style='font-size: 1rem; white-space: normal; word-break: break-all;'>{latest_test.get('server_name', 'N/A')}</p></div>"
+            html_content += tile("Download", f"{latest_test.get('download', 0):.2f}", "Mbps", "data-latest='download'")
+            html_content += tile("Upload", f"{latest_test.get('upload', 0):.2f}", "Mbps", "data-latest='upload'")
+            html_content += tile("Ping", f"{latest_test.get('ping', 0):.2f}", "ms", "data-latest='ping'")
+            html_content += f"<div class='stat-tile'><h3>Server</h3><p class='value' data-latest='server_name' style='font-size: 1rem; white-space: normal; word-break: break-all;'>{escape(latest_test.get('server_name') or 'N/A')}</p></div>"
             html_content += "</div>"
 
-        if plot_base64:
-            html_content += "<div class='plot-container'>"
-            html_content += "<h2>Speed History Plot</h2>"
-            html_content += f"<img src='data:image/png;base64,{plot_base64}' alt='Internet speed history plot'>"
-            html_content += "</div>"
-        else:
-            html_content += "<div class='plot-container'><p>Could not generate plot. Run a speed test to generate data.</p></div>"
+        if server_stats:
+            html_content += "<h2>Per-Server Statistics</h2>"
+            html_content += "<div class='table-container'><table>"
+            html_content += "<tr><th>ID</th><th>Server</th><th>Tests</th><th>Avg Download</th><th>Min Download</th><th>Max Download</th><th>Avg Upload</th><th>Avg Ping</th><th>Last Seen</th></tr>"
+            for s in server_stats:
+                html_content += (f"<tr><td>{escape(str(s['server_id']))}</td><td>{escape(s['server_name'] or 'Unknown')}</td>"
+                                 f"<td>{s['count']}</td><td>{s['avg_dl']:.2f}</td><td>{s['min_dl']:.2f}</td><td>{s['max_dl']:.2f}</td>"
+                                 f"<td>{s['avg_ul']:.2f}</td><td>{s['avg_ping']:.2f}</td><td>{escape((s['last_seen'] or '')[:19])}</td></tr>")
+            html_content += "</table></div>"
+
+        if recent_tests:
+            html_content += "<h2>Recent Tests</h2>"
+            html_content += "<div class='table-container'><table id='recent-tests'>"
+            html_content += "<tr><th>Time</th><th>Server</th><th>Download</th><th>Upload</th><th>Ping</th></tr>"
+            for t in recent_tests:
+                html_content += (f"<tr><td>{escape(t['timestamp'][:19])}</td><td>{escape(t['server_name'] or 'Unknown')}</td>"
+                                 f"<td>{t['download']:.2f}</td><td>{t['upload']:.2f}</td><td>{t['ping']:.2f}</td></tr>")
+            html_content += "</table></div>"
+
+        html_content += "<div class='plot-container'>"
+        html_content += "<h2>Speed History Plot</h2>"
+        html_content += f"<div id='plot' data-src='{escape(plot_url)}'>"
+        # The SVG is inlined so the page needs no second request to show the plot
+        html_content += plot_svg or "<p>Could not generate plot. Run a speed test to generate data.</p>"
+        html_content += "</div></div>"
         
-        html_content += "</div></body></html>"
+        html_content += "</div>"
+        html_content += self._live_update_script()
+        html_content += "</body></html>"
         return html_content
 
+    def _live_update_script(self):
+        """Subscribes the page to /events and updates the tiles in place."""
+        probe_id = getattr(self, 'probe_id', None)
+        events_url = '/events' + (f"?probe={probe_id}" if probe_id else '')
+        return '''
+<script>
+(function () {
+    if (!window.EventSource) return;
+    var source = new EventSource(%s);
+    source.addEventListener('result', function (event) {
+        var data = JSON.parse(event.data), result = data.result, stats = data.stats || {};
+        if (!document.querySelector('[data-latest]')) {
+            // The page was rendered before the first result; it has no tiles to update
+            location.reload();
+            return;
+        }
+        document.querySelectorAll('[data-stat]').forEach(function (el) {
+            var value = stats[el.dataset.stat];
+            if (value != null) el.textContent = el.dataset.stat === 'count' ? value : value.toFixed(2);
+        });
+        document.querySelectorAll('[data-latest]').forEach(function (el) {
+            var value = result[el.dataset.latest];
+            el.textContent = el.dataset.latest === 'server_name' ? (value || 'N/A') : (value || 0).toFixed(2);
+        });
+        var table = document.getElementById('recent-tests');
+        if (table) {
+            var row = table.insertRow(1);
+            [result.timestamp.slice(0, 19), result.server_name || 'Unknown', result.download.toFixed(2),
+             result.upload.toFixed(2), result.ping.toFixed(2)].forEach(function (text) {
+                row.insertCell().textContent = text;
+            });
+            while (table.rows.length > %d) table.deleteRow(-1);
+        }
+        var plot = document.getElementById('plot');
+        fetch(plot.dataset.src).then(function (response) {
+            if (response.ok) return response.text().then(function (svg) { plot.innerHTML = svg; });
+        });
+    });
+})();
+</script>
+''' % (json.dumps(events_url), RECENT_TESTS + 1)
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Serve internet speed statistics')
+    parser.add_argument('--ingest-token', help='Bearer token remote probes must send to POST /ingest (default: $SPEED_INGEST_TOKEN; ingest is disabled when unset)')
+    parser.add_argument('--workers', type=int, default=WORKERS, help=f'Worker threads handling requests (default: {WORKERS})')
+    parser.add_argument('--queue-limit', type=int, default=QUEUE_LIMIT, help=f'Connections that may wait for a free worker before new ones are refused (default: {QUEUE_LIMIT})')
+    return parser.parse_args()
+
 def run_server():
+    global INGEST_TOKEN
+    args = get_args()
+    if args.ingest_token:
+        INGEST_TOKEN = args.ingest_token
     server_address = (HOST, PORT)
-    httpd = ReuseAddrHTTPServer(server_address, SpeedHTTPRequestHandler)
-    print(f"Starting https server on {HOST}:{PORT}")
-    
-    # Create an SSL context
+
+    # Create an SSL context; each worker performs the handshake for its own connection
     context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
     context.load_cert_chain(certfile="cert.pem", keyfile="key.pem")
-    
-    # Wrap the socket
-    httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+
+    httpd = PooledHTTPServer(server_address, SpeedHTTPRequestHandler, workers=max(1, args.workers),
+                             queue_limit=max(0, args.queue_limit), ssl_context=context)
+    print(f"Starting https server on {HOST}:{PORT} with {args.workers} workers")
 
     try:
         httpd.serve_forever()
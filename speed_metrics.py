@@ -0,0 +1,160 @@
+import bisect
+import threading
+import time
+from contextlib import ContextDecorator
+
+# Latency buckets in seconds, from sub-millisecond page hits to full log scans
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Metric:
+    """A named family of samples, one per combination of label values.
+
+    Metrics register themselves in REGISTRY when created; `render` writes
+    all of them in the Prometheus text exposition format.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+    def samples(self):
+        """Yields (suffix, label_string, value) for every sample of this metric."""
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield '', self._format_labels(key), value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def remove(self, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values.pop(key, None)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (not cumulative) counts, then sum and count
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        """Context manager / decorator observing the duration of a block or call."""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield '_bucket', self._format_labels(key, [('le', repr(float(bound)))]), cumulative
+            yield '_bucket', self._format_labels(key, [('le', '+Inf')]), count
+            yield '_sum', self._format_labels(key), total
+            yield '_count', self._format_labels(key), count
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        # Starts are kept per thread so one timer can decorate a function called concurrently
+        self._local = threading.local()
+
+    def __enter__(self):
+        starts = self._local.__dict__.setdefault('starts', [])
+        starts.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self._local.starts.pop()
+        self.histogram.observe(elapsed, **self.labels)
+        return False
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if value == float('-inf'):
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def render(registry=None):
+    """Returns all metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in (REGISTRY if registry is None else registry):
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for suffix, labels, value in metric.samples():
+            lines.append(f"{metric.name}{suffix}{labels} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = []
+
+FUNCTION_SECONDS = Histogram('speed_function_duration_seconds',
+                             'Time spent in log reading, plotting and rendering functions.', ['function'])
+LINES_PARSED = Counter('speed_log_lines_parsed_total',
+                       'Log lines parsed, by the reader that parsed them.', ['reader'])
+BYTES_READ = Counter('speed_log_bytes_read_total',
+                     'Log bytes read, by the reader that read them.', ['reader'])
+CACHE_REQUESTS = Counter('speed_cache_requests_total',
+                         'Cache lookups by cache and result (hit or miss).', ['cache', 'result'])
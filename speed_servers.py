@@ -0,0 +1,262 @@
+import bisect
+import difflib
+import json
+import os
+import re
+import socket
+import subprocess
+import tempfile
+import time
+
+# On-disk cache of the `speedtest -L` server list
+DEFAULT_SERVER_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'check_speed', 'servers.json')
+DEFAULT_SERVER_CACHE_TTL = 24 * 3600
+SERVER_CACHE_VERSION = 1
+# Fields of a server entry that are searched by name
+SEARCH_FIELDS = ('name', 'location', 'host')
+# Minimum difflib similarity for a fuzzy token match
+FUZZY_CUTOFF = 0.8
+# Latency pre-probe (see rank_servers): rankings are cached for a shorter time than the list
+DEFAULT_LATENCY_CACHE_TTL = 3600
+LATENCY_CACHE_VERSION = 1
+LATENCY_CACHE_ENTRIES = 16 # Candidate sets whose ranking is kept
+PROBE_TIMEOUT = 1.0 # Seconds allowed for each DNS lookup and TCP connect
+PROBE_ATTEMPTS = 3 # Connects per server; the fastest counts
+DEFAULT_SERVER_PORT = 8080
+
+
+def fetch_server_list(cmd_exec):
+    """Runs `speedtest -L` and returns the list of server dicts, or None on failure."""
+    # Add license flags to prevent hanging on fresh installs
+    result = subprocess.run([cmd_exec, '--accept-license', '--accept-gdpr', '-L', '-f', 'json'], capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Error listing servers: {result.stderr}")
+        return None
+
+    # Usually 'servers' key contains list in JSON output
+    data = json.loads(result.stdout)
+    return data.get('servers', [])
+
+
+def read_cache_file(cache_file, version):
+    """Returns the JSON cache in `cache_file`, or None if it is missing, corrupt or of another version."""
+    try:
+        with open(cache_file, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cache, dict) or cache.get('version') != version:
+        return None
+    return cache
+
+
+def write_cache_file(cache_file, cache):
+    """Atomically replaces the cache file. Failures are reported but not fatal."""
+    try:
+        cache_dir = os.path.dirname(os.path.abspath(cache_file))
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix='.' + os.path.basename(cache_file) + '.')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, cache_file)
+    except OSError as e:
+        print(f"Warning: could not write cache file {cache_file}: {e}")
+
+
+def load_server_index(cmd_exec, cache_file=None, ttl=DEFAULT_SERVER_CACHE_TTL, refresh=False):
+    """Returns a ServerIndex over the speedtest server list, or None on failure.
+
+    With a `cache_file`, the list and its prebuilt index are reused for `ttl`
+    seconds, so a warm lookup spawns no process and touches no network.
+    `refresh` forces a new listing.
+    """
+    if cache_file and not refresh:
+        cache = read_cache_file(cache_file, SERVER_CACHE_VERSION)
+        if cache and time.time() - cache.get('fetched_at', 0) < ttl:
+            return ServerIndex.from_dict(cache)
+
+    servers = fetch_server_list(cmd_exec)
+    if servers is None:
+        return None
+
+    index = ServerIndex(servers)
+    if cache_file:
+        cache = index.to_dict()
+        cache.update({'version': SERVER_CACHE_VERSION, 'fetched_at': time.time()})
+        write_cache_file(cache_file, cache)
+    return index
+
+
+def tokenize(text):
+    return re.findall(r'\w+', str(text).lower())
+
+
+class ServerIndex:
+    """Token and prefix index over server name, location and host.
+
+    `search` ranks servers by how well every word of the query matches
+    their tokens: exact token, then token prefix, then a fuzzy (typo
+    tolerant) token match, with a bonus for a field equal to the whole
+    query. A plain substring match of the whole query, the
+    original lookup rule, still counts so no previous match is lost.
+    """
+
+    def __init__(self, servers, tokens=None):
+        self.servers = servers
+        if tokens is None:
+            tokens = {}
+            for position, server in enumerate(servers):
+                for field in SEARCH_FIELDS:
+                    for token in tokenize(server.get(field, '')):
+                        tokens.setdefault(token, set()).add(position)
+        self.tokens = {token: set(positions) for token, positions in tokens.items()}
+        self.sorted_tokens = sorted(self.tokens)
+
+    def to_dict(self):
+        return {
+            'servers': self.servers,
+            'tokens': {token: sorted(positions) for token, positions in self.tokens.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['servers'], data.get('tokens'))
+
+    def _token_scores(self, word):
+        """Returns {server position: score} for one query word."""
+        scores = {}
+        for position in self.tokens.get(word, ()):
+            scores[position] = 3.0
+
+        start = bisect.bisect_left(self.sorted_tokens, word)
+        for token in self.sorted_tokens[start:]:
+            if not token.startswith(word):
+                break
+            for position in self.tokens[token]:
+                scores.setdefault(position, 2.0)
+
+        if not scores:
+            for token in difflib.get_close_matches(word, self.sorted_tokens, n=3, cutoff=FUZZY_CUTOFF):
+                for position in self.tokens[token]:
+                    scores.setdefault(position, 1.0)
+        return scores
+
+    def _scores(self, search_term):
+        """Returns {server position: score} for the servers matching `search_term`."""
+        words = tokenize(search_term)
+        term = search_term.lower()
+        totals = {}
+
+        if words:
+            per_word = [self._token_scores(word) for word in words]
+            for position in set.intersection(*(set(scores) for scores in per_word)):
+                totals[position] = sum(scores[position] for scores in per_word)
+
+        for position, server in enumerate(self.servers):
+            values = [str(server.get(field, '')).lower() for field in SEARCH_FIELDS]
+            if any(term in value for value in values):
+                totals[position] = totals.get(position, 0.0) + 1.0
+            # A field that is exactly the query (e.g. the full server name) wins ties
+            if term in values:
+                totals[position] += 2.0
+
+        return totals
+
+    def search(self, search_term):
+        """Returns matching servers, best match first (ties keep the CLI's distance order)."""
+        totals = self._scores(search_term)
+        ranked = sorted(totals, key=lambda position: (-totals[position], position))
+        return [self.servers[position] for position in ranked]
+
+    def best_matches(self, search_term):
+        """Returns the servers sharing the best score for `search_term`, in the CLI's distance order."""
+        totals = self._scores(search_term)
+        if not totals:
+            return []
+        best = max(totals.values())
+        return [self.servers[position] for position in sorted(totals) if totals[position] == best]
+
+
+def split_host(host, default_port=DEFAULT_SERVER_PORT):
+    """Splits a server's `host` field ("name:port", "[v6]:port" or a bare name) into (name, port)."""
+    name, sep, port = host.rpartition(':')
+    if sep and port.isdigit() and (':' not in name or name.startswith('[')):
+        return name.strip('[]'), int(port)
+    return host.strip('[]'), default_port
+
+
+async def _connect_latency(host, timeout, attempts):
+    """Returns the fastest of `attempts` TCP connects to `host` in ms, or None if none succeeded."""
+    import asyncio
+    name, port = split_host(host)
+    loop = asyncio.get_running_loop()
+    try:
+        # Resolve once, so the name lookup isn't counted as latency
+        infos = await asyncio.wait_for(loop.getaddrinfo(name, port, type=socket.SOCK_STREAM), timeout)
+    except (OSError, asyncio.TimeoutError):
+        return None
+
+    address = infos[0][4][0]
+    best = None
+    for _ in range(attempts):
+        start = loop.time()
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), timeout)
+        except (OSError, asyncio.TimeoutError):
+            continue
+        elapsed = (loop.time() - start) * 1000
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+async def _measure_all(servers, timeout, attempts):
+    import asyncio
+    return await asyncio.gather(*(_connect_latency(str(server.get('host', '')), timeout, attempts)
+                                  for server in servers))
+
+
+def measure_latencies(servers, timeout=PROBE_TIMEOUT, attempts=PROBE_ATTEMPTS):
+    """Probes every server concurrently; returns {str(server id): connect latency in ms or None}."""
+    # Imported here so that runs without --preprobe never pay asyncio's import time
+    import asyncio
+    latencies = asyncio.run(_measure_all(servers, timeout, attempts))
+    return {str(server['id']): latency for server, latency in zip(servers, latencies)}
+
+
+def rank_servers(servers, cache_file=None, ttl=DEFAULT_LATENCY_CACHE_TTL, refresh=False,
+                 timeout=PROBE_TIMEOUT, attempts=PROBE_ATTEMPTS):
+    """Returns [(latency_ms, server)] for the servers that accepted a connection, fastest first.
+
+    All candidates are probed at once, so this takes at most about
+    (attempts + 1) * timeout seconds however many there are. With a
+    `cache_file`, the latencies measured for the same set of candidates
+    are reused for `ttl` seconds. A probe where no server responded is not
+    cached.
+    """
+    key = ','.join(sorted(str(server['id']) for server in servers))
+    cache = read_cache_file(cache_file, LATENCY_CACHE_VERSION) if cache_file else None
+    if not cache or not isinstance(cache.get('rankings'), dict):
+        cache = {'version': LATENCY_CACHE_VERSION, 'rankings': {}}
+
+    entry = cache['rankings'].get(key)
+    if not refresh and isinstance(entry, dict) and time.time() - entry.get('measured_at', 0) < ttl:
+        latencies = entry.get('latencies', {})
+    else:
+        latencies = measure_latencies(servers, timeout, attempts)
+        if cache_file and any(latency is not None for latency in latencies.values()):
+            rankings = cache['rankings']
+            rankings[key] = {'measured_at': time.time(), 'latencies': latencies}
+            for stale in sorted(rankings, key=lambda k: rankings[k].get('measured_at', 0))[:-LATENCY_CACHE_ENTRIES]:
+                del rankings[stale]
+            write_cache_file(cache_file, cache)
+
+    responsive = [(latencies[str(server['id'])], position, server) for position, server in enumerate(servers)
+                  if latencies.get(str(server['id'])) is not None]
+    # Ties keep the given order (the CLI's distance order or search relevance)
+    responsive.sort(key=lambda item: item[:2])
+    return [(latency, server) for latency, _, server in responsive]
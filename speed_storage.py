@@ -0,0 +1,278 @@
+import abc
+import datetime
+import os
+import sqlite3
+
+from speed_utils import (LogRecord, StatsAccumulator, calculate_server_stats, calculate_stats,
+                         format_log_line, get_latest_speedtest, get_plot_data, get_recent_speedtests,
+                         iter_log_records, parse_log_record, record_to_dict)
+
+DEFAULT_DB_FILE = 'speed_log.db'
+IMPORT_BATCH_SIZE = 10000
+
+
+class StorageBackend(abc.ABC):
+    """Where speed test results are kept and how they are queried.
+
+    `latest` returns a dict shaped like speed_utils.get_latest_speedtest
+    and `recent` a list of them, newest first; `range` yields LogRecords in time order, `aggregate` and
+    `aggregate_by_server` return the dicts of calculate_stats and
+    calculate_server_stats, and `plot_data` the dict of get_plot_data.
+    """
+
+    @abc.abstractmethod
+    def append(self, record):
+        pass
+
+    @abc.abstractmethod
+    def latest(self):
+        pass
+
+    @abc.abstractmethod
+    def recent(self, n):
+        pass
+
+    @abc.abstractmethod
+    def range(self, start=None, end=None):
+        pass
+
+    @abc.abstractmethod
+    def aggregate(self, start=None, end=None):
+        pass
+
+    @abc.abstractmethod
+    def aggregate_by_server(self):
+        pass
+
+    @abc.abstractmethod
+    def plot_data(self, days=30):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TextLogBackend(StorageBackend):
+    """The CSV `speed_log.txt` format, backed by the speed_utils readers and their sidecars.
+
+    `log_file` may also be a glob pattern or a list of logs; `aggregate`
+    (over all time), `aggregate_by_server` and `plot_data` then merge them.
+    """
+
+    def __init__(self, log_file):
+        self.log_file = log_file
+
+    def append(self, record):
+        with open(self.log_file, 'a') as f:
+            f.write(format_log_line(record))
+
+    def latest(self):
+        return get_latest_speedtest(self.log_file)
+
+    def recent(self, n):
+        return get_recent_speedtests(self.log_file, n)
+
+    def range(self, start=None, end=None):
+        return iter_log_records(self.log_file, start, end)
+
+    def aggregate(self, start=None, end=None):
+        if start is None and end is None:
+            return calculate_stats(self.log_file)
+        acc = StatsAccumulator()
+        for record in self.range(start, end):
+            acc.add(record.download, record.upload, record.ping, record.server_id,
+                    record.server_name, record.timestamp.isoformat())
+        return acc.result()
+
+    def aggregate_by_server(self):
+        return calculate_server_stats(self.log_file)
+
+    def plot_data(self, days=30):
+        return get_plot_data(self.log_file, days)
+
+
+class SQLiteBackend(StorageBackend):
+    """Results in an SQLite database (WAL mode) indexed on timestamp and server_id.
+
+    Timestamps are stored both as epoch seconds (indexed, for range
+    queries) and as the original ISO string (for exact round trips).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            id INTEGER PRIMARY KEY,
+            timestamp REAL NOT NULL,
+            timestamp_iso TEXT NOT NULL,
+            download REAL NOT NULL,
+            upload REAL NOT NULL,
+            ping REAL NOT NULL,
+            server_id TEXT,
+            server_name TEXT
+        );
+        -- NULLs are distinct in a unique index, so a missing server_id is keyed as ''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_results_unique ON results (timestamp, IFNULL(server_id, ''));
+        CREATE INDEX IF NOT EXISTS idx_results_server ON results (server_id, timestamp);
+    """
+
+    def __init__(self, db_file=DEFAULT_DB_FILE):
+        self.db_file = db_file
+        self.conn = sqlite3.connect(db_file)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def _row(record):
+        return (record.timestamp.timestamp(), record.timestamp.isoformat(), record.download,
+                record.upload, record.ping, record.server_id, record.server_name)
+
+    def append(self, record):
+        self.append_many([record])
+
+    def append_many(self, records):
+        """Inserts records in one transaction; duplicates (same timestamp and server) are skipped.
+
+        Returns the number of rows inserted.
+        """
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO results (timestamp, timestamp_iso, download, upload, ping, '
+                'server_id, server_name) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (self._row(record) for record in records))
+            return self.conn.total_changes - before
+
+    @staticmethod
+    def _where(start, end):
+        clauses = []
+        params = []
+        if start is not None:
+            clauses.append('timestamp >= ?')
+            params.append(start.timestamp())
+        if end is not None:
+            clauses.append('timestamp < ?')
+            params.append(end.timestamp())
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def latest(self):
+        recent = self.recent(1)
+        return recent[0] if recent else None
+
+    def recent(self, n):
+        rows = self.conn.execute(
+            'SELECT timestamp_iso, download, upload, ping, server_id, server_name '
+            'FROM results ORDER BY timestamp DESC LIMIT ?', (max(0, n),))
+        return [record_to_dict(LogRecord(datetime.datetime.fromisoformat(row[0]), *row[1:])) for row in rows]
+
+    def range(self, start=None, end=None):
+        where, params = self._where(start, end)
+        cursor = self.conn.execute(
+            'SELECT timestamp_iso, download, upload, ping, server_id, server_name '
+            'FROM results' + where + ' ORDER BY timestamp', params)
+        for row in cursor:
+            yield LogRecord(datetime.datetime.fromisoformat(row[0]), *row[1:])
+
+    def aggregate(self, start=None, end=None):
+        where, params = self._where(start, end)
+        row = self.conn.execute(
+            'SELECT COUNT(*), SUM(download), SUM(upload), SUM(ping), SUM(ping * ping), '
+            'MIN(download), MAX(download), MIN(upload), MAX(upload) FROM results' + where,
+            params).fetchone()
+        if not row[0]:
+            return None
+
+        acc = StatsAccumulator()
+        (acc.count, acc.total_dl, acc.total_ul, acc.total_ping, acc.total_ping_sq,
+         acc.min_dl, acc.max_dl, acc.min_ul, acc.max_ul) = row
+        # Percentiles need the values themselves; only the indexed range is read
+        for download, upload, ping in self.conn.execute(
+                'SELECT download, upload, ping FROM results' + where, params):
+            acc.dl_sketch.add(download)
+            acc.ul_sketch.add(upload)
+            acc.ping_sketch.add(ping)
+        return acc.result()
+
+    def aggregate_by_server(self):
+        rows = self.conn.execute(
+            'SELECT server_id, COUNT(*), AVG(download), AVG(upload), AVG(ping), MIN(download), '
+            'MAX(download), MIN(upload), MAX(upload), MAX(timestamp) FROM results '
+            'WHERE server_id IS NOT NULL GROUP BY server_id').fetchall()
+        results = []
+        for row in rows:
+            last = self.conn.execute(
+                'SELECT timestamp_iso, server_name FROM results WHERE server_id = ? AND timestamp = ?',
+                (row[0], row[9])).fetchone()
+            results.append({
+                'server_id': row[0],
+                'server_name': last[1],
+                'count': row[1],
+                'avg_dl': row[2],
+                'avg_ul': row[3],
+                'avg_ping': row[4],
+                'min_dl': row[5],
+                'max_dl': row[6],
+                'min_ul': row[7],
+                'max_ul': row[8],
+                'last_seen': last[0],
+            })
+        results.sort(key=lambda r: (-r['count'], str(r['server_id'])))
+        return results
+
+    def plot_data(self, days=30):
+        cutoff_date = datetime.datetime.now() - datetime.timedelta(days=days)
+        where, params = self._where(None, cutoff_date)
+        count, cum_dl, cum_ul = self.conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(download), 0), COALESCE(SUM(upload), 0) FROM results' + where,
+            params).fetchone()
+
+        data = {'dates': [], 'downloads': [], 'uploads': [], 'avg_downloads': [], 'avg_uploads': []}
+        for record in self.range(cutoff_date):
+            count += 1
+            cum_dl += record.download
+            cum_ul += record.upload
+            data['dates'].append(record.timestamp)
+            data['downloads'].append(record.download)
+            data['uploads'].append(record.upload)
+            data['avg_downloads'].append(cum_dl / count)
+            data['avg_uploads'].append(cum_ul / count)
+        return data if data['dates'] else None
+
+
+def open_storage(kind, log_file, db_file=DEFAULT_DB_FILE):
+    """Returns the backend named by `kind` ('text' or 'sqlite')."""
+    if kind == 'sqlite':
+        return SQLiteBackend(db_file)
+    return TextLogBackend(log_file)
+
+
+def import_text_log(log_file, backend, batch_size=IMPORT_BATCH_SIZE):
+    """Copies every parseable record of a text log into `backend`; returns the number imported.
+
+    Records already present are skipped, so an import can be repeated.
+    """
+    if not os.path.exists(log_file):
+        return 0
+
+    imported = 0
+    batch = []
+    with open(log_file, 'r') as f:
+        for line in f:
+            record = parse_log_record(line)
+            if not record:
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                imported += backend.append_many(batch)
+                batch = []
+    if batch:
+        imported += backend.append_many(batch)
+    return imported
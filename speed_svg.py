@@ -0,0 +1,127 @@
+"""Dependency-free SVG rendering of the speed history plot.
+
+`render_svg` draws the same chart as speed_utils.generate_plot_image from a
+`get_plot_data` dict: measured download and upload against the left axis
+and their cumulative averages (dashed) against the right one. It needs no
+third-party packages, so the dashboard can serve plots without matplotlib;
+the PNG renderer remains for `check_speed.py --plot`.
+"""
+import datetime
+import math
+from html import escape
+
+from speed_utils import downsample_plot_data
+
+SVG_WIDTH = 1200
+SVG_HEIGHT = 600
+# Space around the plot area for titles, tick labels and axis labels
+MARGIN_LEFT = 80
+MARGIN_RIGHT = 80
+MARGIN_TOP = 50
+MARGIN_BOTTOM = 70
+Y_TICKS = 5
+X_TICKS = 6
+COLOR_DOWNLOAD = '#1f77b4'
+COLOR_UPLOAD = '#ff7f0e'
+
+
+def nice_ticks(high, count=Y_TICKS):
+    """Returns evenly spaced round tick values from 0 covering `high`."""
+    if not high > 0:
+        high = 1.0
+    raw_step = high / count
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw_step)
+    return [round(i * step, 10) for i in range(int(math.ceil(high / step - 1e-9)) + 1)]
+
+
+def _tick_label(value):
+    return f"{value:g}" if value < 1e6 else f"{value:.3g}"
+
+
+def render_svg(data, days=30, width=SVG_WIDTH, height=SVG_HEIGHT):
+    """Returns the history plot as an SVG document string, or None when there is no data."""
+    if not data or not data['dates']:
+        return None
+
+    plot_w = width - MARGIN_LEFT - MARGIN_RIGHT
+    plot_h = height - MARGIN_TOP - MARGIN_BOTTOM
+    # More samples than horizontal pixels don't change the picture
+    data = downsample_plot_data(data, plot_w)
+    dates = data['dates']
+
+    start = dates[0]
+    span = (dates[-1] - start).total_seconds()
+    if span <= 0:
+        # A single point (or identical timestamps) sits in the middle of an hour
+        start -= datetime.timedelta(minutes=30)
+        span = 3600.0
+
+    left_ticks = nice_ticks(max(max(data['downloads']), max(data['uploads'])))
+    right_ticks = nice_ticks(max(max(data['avg_downloads']), max(data['avg_uploads'])))
+
+    def x_at(dt):
+        return MARGIN_LEFT + (dt - start).total_seconds() / span * plot_w
+
+    def y_at(value, ticks):
+        return MARGIN_TOP + plot_h - value / ticks[-1] * plot_h
+
+    def polyline(values, ticks, color, extra):
+        points = ' '.join(f"{x_at(dt):.1f},{y_at(v, ticks):.1f}" for dt, v in zip(dates, values))
+        return f'<polyline fill="none" stroke="{color}" points="{points}" {extra}/>'
+
+    bottom = MARGIN_TOP + plot_h
+    right = MARGIN_LEFT + plot_w
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" width="{width}" height="{height}" '
+        f'font-family="sans-serif" font-size="12" role="img">',
+        f'<rect width="{width}" height="{height}" fill="#fff"/>',
+        f'<text x="{width / 2:.0f}" y="{MARGIN_TOP / 2 + 6:.0f}" text-anchor="middle" font-size="16">'
+        f'Internet Speed History (Last {days} Days)</text>',
+    ]
+
+    # Grid and ticks
+    for value in left_ticks:
+        y = y_at(value, left_ticks)
+        parts.append(f'<line x1="{MARGIN_LEFT}" y1="{y:.1f}" x2="{right}" y2="{y:.1f}" stroke="#ddd"/>')
+        parts.append(f'<text x="{MARGIN_LEFT - 6}" y="{y + 4:.1f}" text-anchor="end">{_tick_label(value)}</text>')
+    for value in right_ticks:
+        y = y_at(value, right_ticks)
+        parts.append(f'<text x="{right + 6}" y="{y + 4:.1f}">{_tick_label(value)}</text>')
+    for i in range(X_TICKS + 1):
+        dt = start + datetime.timedelta(seconds=span * i / X_TICKS)
+        x = x_at(dt)
+        parts.append(f'<line x1="{x:.1f}" y1="{MARGIN_TOP}" x2="{x:.1f}" y2="{bottom}" stroke="#ddd"/>')
+        parts.append(f'<text x="{x:.1f}" y="{bottom + 18}" text-anchor="middle">{dt:%Y-%m-%d %H:%M}</text>')
+
+    # Axes and their labels
+    parts.append(f'<path d="M{MARGIN_LEFT},{MARGIN_TOP}V{bottom}H{right}V{MARGIN_TOP}" fill="none" stroke="#000"/>')
+    parts.append(f'<text x="{MARGIN_LEFT + plot_w / 2:.0f}" y="{height - 15}" text-anchor="middle">Date and Time</text>')
+    parts.append(f'<text transform="translate(20,{MARGIN_TOP + plot_h / 2:.0f}) rotate(-90)" '
+                 f'text-anchor="middle">Measured Speed (Mbps)</text>')
+    parts.append(f'<text transform="translate({width - 20},{MARGIN_TOP + plot_h / 2:.0f}) rotate(90)" '
+                 f'text-anchor="middle">Historical Average Speed (Mbps)</text>')
+
+    # Series
+    series = [
+        ('Measured Download', COLOR_DOWNLOAD, data['downloads'], left_ticks, 'stroke-opacity="0.6"'),
+        ('Measured Upload', COLOR_UPLOAD, data['uploads'], left_ticks, 'stroke-opacity="0.6"'),
+        ('Avg Download (Cumulative)', COLOR_DOWNLOAD, data['avg_downloads'], right_ticks,
+         'stroke-width="2" stroke-dasharray="6,4"'),
+        ('Avg Upload (Cumulative)', COLOR_UPLOAD, data['avg_uploads'], right_ticks,
+         'stroke-width="2" stroke-dasharray="6,4"'),
+    ]
+    for label, color, values, ticks, extra in series:
+        parts.append(polyline(values, ticks, color, extra))
+
+    # Legend in the upper left corner
+    parts.append(f'<rect x="{MARGIN_LEFT + 10}" y="{MARGIN_TOP + 10}" width="210" height="{len(series) * 20 + 10}" '
+                 f'fill="#fff" fill-opacity="0.8" stroke="#ccc"/>')
+    for i, (label, color, values, ticks, extra) in enumerate(series):
+        y = MARGIN_TOP + 28 + i * 20
+        parts.append(f'<line x1="{MARGIN_LEFT + 20}" y1="{y - 4}" x2="{MARGIN_LEFT + 50}" y2="{y - 4}" '
+                     f'stroke="{color}" {extra}/>')
+        parts.append(f'<text x="{MARGIN_LEFT + 58}" y="{y}">{escape(label)}</text>')
+
+    parts.append('</svg>')
+    return '\n'.join(parts)
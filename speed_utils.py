@@ -1,64 +1,220 @@
+import bisect
+import collections
 import datetime
+import glob
+import hashlib
+import heapq
+import json
+import math
 import os
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+import re
+import tempfile
+from operator import itemgetter
 
+from speed_metrics import BYTES_READ, CACHE_REQUESTS, FUNCTION_SECONDS, LINES_PARSED
 
-def get_plot_data(log_file, days=30):
+# Sidecar holding running aggregates for calculate_stats (see calculate_stats)
+STATS_SIDECAR_SUFFIX = '.stats.json'
+STATS_SIDECAR_VERSION = 3
+# Percentiles reported by calculate_stats, and the relative error of their estimate
+PERCENTILES = (50, 95, 99)
+SKETCH_ACCURACY = 0.01
+SKETCH_MIN_VALUE = 1e-9
+# Sparse timestamp -> byte offset index used for time-window seeks (see load_log_index)
+INDEX_SIDECAR_SUFFIX = '.idx.json'
+INDEX_SIDECAR_VERSION = 1
+INDEX_STRIDE = 1024
+# History plot size; the pixel width bounds how many samples are worth drawing
+PLOT_FIGSIZE = (12, 6)
+PLOT_DPI = 100
+# Rotated log segments (`<log>.<YYYYmmddTHHMMSS>[-n]`) are folded into this rollup
+ROLLUP_SUFFIX = '.rollup.json'
+ROLLUP_VERSION = 1
+ROLLUP_HOURLY_DAYS = 90
+SEGMENT_PATTERN = re.compile(r'\.\d{8}T\d{6}(-\d+)?')
+# Intra-test progress samples, one JSON line per test keyed by its log timestamp
+SAMPLES_SUFFIX = '.samples.jsonl'
+# Bytes hashed at the start of the log and before the consumed offset to detect rotation
+FINGERPRINT_BYTES = 256
+# Reads at least this large go through the NumPy engine (speed_arrays) when it is installed
+VECTOR_MIN_BYTES = 1024 * 1024
+# Bytes read per step when reading the log backwards (see iter_lines_reverse)
+REVERSE_BLOCK_SIZE = 64 * 1024
+
+
+# One parsed log line; `timestamp` is a datetime
+LogRecord = collections.namedtuple(
+    'LogRecord', ['timestamp', 'download', 'upload', 'ping', 'server_id', 'server_name'])
+
+
+def _check_finite(*values):
+    """Raises ValueError if any value is inf or nan."""
+    if not all(map(math.isfinite, values)):
+        raise ValueError(f"non-finite value in {values}")
+
+
+def parse_log_record(line):
+    """Parses a full log line into a LogRecord, or returns None if it is malformed."""
+    parts = line.strip().split(',')
+    if len(parts) < 4:
+        return None
+    try:
+        download, upload, ping = float(parts[1]), float(parts[2]), float(parts[3])
+        _check_finite(download, upload, ping)
+        return LogRecord(
+            datetime.datetime.fromisoformat(parts[0]),
+            download,
+            upload,
+            ping,
+            parts[4] if len(parts) > 4 else None,
+            parts[5] if len(parts) > 5 else None,
+        )
+    except ValueError:
+        return None
+
+
+def format_log_line(record):
+    """Formats a LogRecord as a log line (the inverse of parse_log_record)."""
+    # Sanitize server name to remove commas if any, to avoid CSV issues
+    server_name = str(record.server_name).replace(',', ' ')
+    return (f"{record.timestamp.isoformat()},{record.download},{record.upload},{record.ping},"
+            f"{record.server_id},{server_name}\n")
+
+
+def record_to_dict(record):
+    return {
+        'timestamp': record.timestamp.isoformat(),
+        'download': record.download,
+        'upload': record.upload,
+        'ping': record.ping,
+        'server_id': record.server_id,
+        'server_name': record.server_name,
+    }
+
+
+def iter_log_records(log_file, start=None, end=None):
+    """Yields LogRecords with start <= timestamp < end, streaming the log line by line.
+
+    When `start` is given the timestamp index is used to seek past older records.
+    """
     if not os.path.exists(log_file):
+        return
+
+    offset = 0
+    if start is not None:
+        offset = find_index_entry(load_log_index(log_file), start)[0]
+
+    with open(log_file, 'rb') as f:
+        for line, _, _ in iter_lines_from(f, offset):
+            record = parse_log_record(line)
+            if not record:
+                continue
+            if start is not None and record.timestamp < start:
+                continue
+            if end is not None and record.timestamp >= end:
+                continue
+            yield record
+
+
+def bucket_records(records, step):
+    """Averages consecutive records into `step`-second buckets.
+
+    Yields one dict per non-empty bucket with the bucket start time, mean
+    download/upload/ping and the number of records folded into it.
+    """
+    bucket = None
+    count = total_dl = total_ul = total_ping = 0
+    for record in records:
+        key = int(record.timestamp.timestamp() // step)
+        if key != bucket and count:
+            yield _bucket_dict(bucket, step, count, total_dl, total_ul, total_ping)
+            count = total_dl = total_ul = total_ping = 0
+        bucket = key
+        count += 1
+        total_dl += record.download
+        total_ul += record.upload
+        total_ping += record.ping
+    if count:
+        yield _bucket_dict(bucket, step, count, total_dl, total_ul, total_ping)
+
+
+def _bucket_dict(bucket, step, count, total_dl, total_ul, total_ping):
+    return {
+        'timestamp': datetime.datetime.fromtimestamp(bucket * step).isoformat(),
+        'download': total_dl / count,
+        'upload': total_ul / count,
+        'ping': total_ping / count,
+        'count': count,
+    }
+
+
+def parse_plot_line(line):
+    """Returns (datetime, download, upload) for a log line, or None if it is malformed."""
+    parts = line.strip().split(',')
+    if len(parts) < 4:
         return None
+    try:
+        dl = float(parts[1])
+        ul = float(parts[2])
+        # Same fields as parse_stats_line, so plots and stats agree on which lines count
+        _check_finite(dl, ul, float(parts[3]))
+        return datetime.datetime.fromisoformat(parts[0]), dl, ul
+    except ValueError:
+        return None
+
+
+@FUNCTION_SECONDS.time(function='get_plot_data')
+def get_plot_data(log_file, days=30, use_rollups=True):
+    """Returns the last `days` of results with cumulative averages over the whole history.
 
+    The timestamp index (see load_log_index) lets this seek straight to the
+    first record of the window; the cumulative totals of everything before
+    it come from the index's prefix sums rather than a rescan. History that
+    was compacted into rollups contributes one point per rollup bucket.
+
+    `log_file` may also be a glob pattern or a list of logs, in which case
+    their histories are merged by timestamp (see merge_plot_data).
+    """
+    log_files = expand_log_files(log_file)
+    if len(log_files) != 1:
+        return merge_plot_data(log_files, days, use_rollups)
+
+    cutoff_date = datetime.datetime.now() - datetime.timedelta(days=days)
     dates = []
     downloads = []
     uploads = []
     avg_downloads = []
     avg_uploads = []
-
-    # Variables for cumulative average calculation
+    count = 0
     cum_total_dl = 0.0
     cum_total_ul = 0.0
-    count = 0
-
-    now = datetime.datetime.now()
-    cutoff_date = now - datetime.timedelta(days=days)
-
     try:
-        with open(log_file, 'r') as f:
-            for line in f:
-                try:
-                    parts = line.strip().split(',')
-                    if len(parts) >= 4:
-                        ts_str = parts[0]
-                        dl = float(parts[1])
-                        ul = float(parts[2])
-                        
-                        dt = datetime.datetime.fromisoformat(ts_str)
-                        
-                        # Calculate cumulative averages (history matters for this, so calculate before filtering)
-                        cum_total_dl += dl
-                        cum_total_ul += ul
-                        count += 1
-                        
-                        current_avg_dl = cum_total_dl / count
-                        current_avg_ul = cum_total_ul / count
-
-                        # Filter for plotting
-                        if dt >= cutoff_date:
-                            dates.append(dt)
-                            downloads.append(dl)
-                            uploads.append(ul)
-                            avg_downloads.append(current_avg_dl)
-                            avg_uploads.append(current_avg_ul)
-
-                except ValueError:
-                    continue
+        engine = _vector_engine(_plot_window_bytes(log_files[0], cutoff_date))
+        if engine:
+            return _plot_data_arrays(engine, log_files[0], cutoff_date, use_rollups)
+        points = _iter_plot_points(log_files[0], cutoff_date, use_rollups)
+        if points is None:
+            return None
+        for dt, n, total_dl, total_ul in points:
+            # Calculate cumulative averages (history matters for this, so calculate before filtering)
+            count += n
+            cum_total_dl += total_dl
+            cum_total_ul += total_ul
+
+            # Filter for plotting
+            if dt is not None and dt >= cutoff_date:
+                dates.append(dt)
+                downloads.append(total_dl / n)
+                uploads.append(total_ul / n)
+                avg_downloads.append(cum_total_dl / count)
+                avg_uploads.append(cum_total_ul / count)
     except Exception as e:
         print(f"Error reading log file for plotting: {e}")
         return None
 
     if not dates:
         return None
-        
+
     return {
         'dates': dates,
         'downloads': downloads,
@@ -67,73 +223,921 @@ def get_plot_data(log_file, days=30):
         'avg_uploads': avg_uploads
     }
 
-def calculate_stats(log_file):
-    if not os.path.exists(log_file):
+
+def _iter_plot_points(log_file, cutoff_date, use_rollups=True):
+    """Yields `(datetime, count, total_dl, total_ul)` for a log's history in time order.
+
+    Rollup buckets come first, then one lump with datetime None for the
+    indexed records before `cutoff_date`, then the remaining log records.
+    Returns None when there is no history at all.
+    """
+    rollup = load_rollup(log_file) if use_rollups else None
+    if not os.path.exists(log_file) and not (rollup and rollup['segments']):
         return None
+    return _plot_points(log_file, cutoff_date, rollup)
 
-    total_download = 0.0
-    total_upload = 0.0
-    total_ping = 0.0
-    count = 0
-    
-    min_download = float('inf')
-    max_download = 0.0
-    min_upload = float('inf')
-    max_upload = 0.0
 
+def _plot_points(log_file, cutoff_date, rollup):
+    # Compacted history comes first; its totals seed the cumulative averages of the live log
+    if rollup:
+        yield from iter_rollup_buckets(rollup)
+
+    try:
+        entry = find_index_entry(load_log_index(log_file), cutoff_date)
+    except FileNotFoundError:
+        # Only compacted history so far (the log was just rotated)
+        return
+    start_offset, count, cum_total_dl, cum_total_ul = entry
+    yield None, count, cum_total_dl, cum_total_ul
+
+    lines = 0
+    offset = start_offset
+    try:
+        with open(log_file, 'rb') as f:
+            for line, offset, _ in iter_lines_from(f, start_offset):
+                lines += 1
+                values = parse_plot_line(line)
+                if values:
+                    dt, dl, ul = values
+                    yield dt, 1, dl, ul
+    finally:
+        LINES_PARSED.inc(lines, reader='plot')
+        BYTES_READ.inc(offset - start_offset, reader='plot')
+
+
+def _plot_window_bytes(log_file, cutoff_date):
+    """Returns how many bytes of the log get_plot_data reads for a window starting at `cutoff_date`."""
     try:
-        with open(log_file, 'r') as f:
-            for line in f:
-                try:
-                    parts = line.strip().split(',')
-                    # Ensure we have at least the basic speed data (timestamp, dl, ul, ping)
-                    if len(parts) >= 4:
-                        download_speed = float(parts[1])
-                        upload_speed = float(parts[2])
-                        
-                        total_download += download_speed
-                        total_upload += upload_speed
-                        total_ping += float(parts[3])
-                        count += 1
-                        
-                        min_download = min(min_download, download_speed)
-                        max_download = max(max_download, download_speed)
-                        min_upload = min(min_upload, upload_speed)
-                        max_upload = max(max_upload, upload_speed)
-                        
-                except ValueError:
-                    continue
+        size = os.path.getsize(log_file)
+    except OSError:
+        return 0
+    if size < VECTOR_MIN_BYTES:
+        return size
+    return size - find_index_entry(load_log_index(log_file), cutoff_date)[0]
+
+
+def _plot_data_arrays(engine, log_file, cutoff_date, use_rollups=True):
+    """get_plot_data for one log, parsed and accumulated as arrays by the NumPy engine."""
+    rollup = load_rollup(log_file) if use_rollups else None
+    points = list(iter_rollup_buckets(rollup)) if rollup else []
+    start_offset, count, cum_total_dl, cum_total_ul = find_index_entry(load_log_index(log_file), cutoff_date)
+
+    with open(log_file, 'rb') as f:
+        arrays, end_offset, lines = engine.read_arrays(f, start_offset, include_partial=True)
+    LINES_PARSED.inc(lines, reader='plot')
+    BYTES_READ.inc(end_offset - start_offset, reader='plot')
+    return engine.plot_data(arrays, cutoff_date, points, (count, cum_total_dl, cum_total_ul))
+
+
+def read_plot_window(f, start_offset, end_offset, cutoff_date, base=(0, 0.0, 0.0)):
+    """Plots the complete lines of an open log from `start_offset` up to `end_offset`.
+
+    `base` is the `(count, total_dl, total_ul)` of the history before
+    `start_offset`. Returns (data, totals): the get_plot_data dict of the
+    records at or after `cutoff_date` (None if there are none), and `base`
+    plus the totals of every record read.
+    """
+    count, cum_total_dl, cum_total_ul = base
+    data = {'dates': [], 'downloads': [], 'uploads': [], 'avg_downloads': [], 'avg_uploads': []}
+    lines = 0
+    engine = _vector_engine(end_offset - start_offset)
+    if engine:
+        # Block by block, so only one block's arrays exist next to the result lists
+        for block, block_start, block_end in engine.iter_blocks(f, start_offset):
+            if block_end is None or block_start >= end_offset:
+                break
+            arrays = engine.parse_block(block, block_start)
+            # Lines appended after `end_offset` are left to the caller
+            inside = arrays.line_start < end_offset
+            arrays = arrays._replace(plot_valid=arrays.plot_valid & inside)
+            lines += int(inside.sum())
+            block_data = engine.plot_data(arrays, cutoff_date, (), (count, cum_total_dl, cum_total_ul))
+            if block_data:
+                for key, values in block_data.items():
+                    data[key].extend(values)
+            valid = arrays.plot_valid
+            count += int(valid.sum())
+            cum_total_dl += float(arrays.download[valid].sum())
+            cum_total_ul += float(arrays.upload[valid].sum())
+        LINES_PARSED.inc(lines, reader='plot')
+        BYTES_READ.inc(end_offset - start_offset, reader='plot')
+        return (data if data['dates'] else None), (count, cum_total_dl, cum_total_ul)
+
+    line_start = start_offset
+    for line, offset, _ in iter_lines_from(f, start_offset):
+        if line_start >= end_offset:
+            break
+        line_start = offset
+        lines += 1
+        values = parse_plot_line(line)
+        # Like the NumPy engine, skip times with an offset; they can't be compared with local ones
+        if not values or values[0].tzinfo is not None:
+            continue
+        dt, dl, ul = values
+        count += 1
+        cum_total_dl += dl
+        cum_total_ul += ul
+        if dt >= cutoff_date:
+            data['dates'].append(dt)
+            data['downloads'].append(dl)
+            data['uploads'].append(ul)
+            data['avg_downloads'].append(cum_total_dl / count)
+            data['avg_uploads'].append(cum_total_ul / count)
+    LINES_PARSED.inc(lines, reader='plot')
+    BYTES_READ.inc(end_offset - start_offset, reader='plot')
+    return (data if data['dates'] else None), (count, cum_total_dl, cum_total_ul)
+
+
+def _vector_engine(size):
+    """Returns the speed_arrays module if reading `size` bytes is worth vectorizing and NumPy is installed."""
+    if size < VECTOR_MIN_BYTES:
+        return None
+    # Imported here so that small reads never pay NumPy's import time
+    import speed_arrays
+    return speed_arrays if speed_arrays.available() else None
+
+
+def _plot_series(log_file, cutoff_date, use_rollups=True):
+    """Splits one log's plot points into totals before `cutoff_date` and the points after it.
+
+    Runs in a merge_plot_data worker process, so it returns plain data.
+    """
+    base = [0, 0.0, 0.0]
+    series = []
+    try:
+        for dt, n, total_dl, total_ul in _iter_plot_points(log_file, cutoff_date, use_rollups) or ():
+            if dt is not None and dt >= cutoff_date:
+                series.append((dt, n, total_dl, total_ul))
+            else:
+                base[0] += n
+                base[1] += total_dl
+                base[2] += total_ul
     except Exception as e:
-        print(f"Error reading log file: {e}")
+        print(f"Error reading log file {log_file} for plotting: {e}")
+        return [0, 0.0, 0.0], []
+    return base, series
+
+
+def merge_plot_data(log_files, days=30, use_rollups=True, max_workers=None):
+    """Returns get_plot_data for several logs as if they were one history.
+
+    Each log is read in a worker process; the per-log series are then
+    combined with a streaming k-way merge by timestamp, so the cumulative
+    averages are fleet-wide at every point.
+    """
+    cutoff_date = datetime.datetime.now() - datetime.timedelta(days=days)
+    results = _map_logs(_plot_series, log_files, max_workers, cutoff_date, use_rollups)
+
+    count = sum(base[0] for base, _ in results)
+    cum_total_dl = sum(base[1] for base, _ in results)
+    cum_total_ul = sum(base[2] for base, _ in results)
+    data = {'dates': [], 'downloads': [], 'uploads': [], 'avg_downloads': [], 'avg_uploads': []}
+    for dt, n, total_dl, total_ul in heapq.merge(*(series for _, series in results), key=itemgetter(0)):
+        count += n
+        cum_total_dl += total_dl
+        cum_total_ul += total_ul
+        data['dates'].append(dt)
+        data['downloads'].append(total_dl / n)
+        data['uploads'].append(total_ul / n)
+        data['avg_downloads'].append(cum_total_dl / count)
+        data['avg_uploads'].append(cum_total_ul / count)
+    return data if data['dates'] else None
+
+
+def expand_log_files(log_files):
+    """Returns the list of logs named by a path, a glob pattern, or a list of either.
+
+    Plain paths are kept even if they don't exist (yet); patterns only
+    contribute the files they match.
+    """
+    if isinstance(log_files, (str, os.PathLike)):
+        log_files = [log_files]
+    expanded = []
+    for name in log_files:
+        matches = sorted(glob.glob(name)) if glob.has_magic(name) else [name]
+        for path in matches:
+            if path not in expanded and not _is_log_sidecar(path):
+                expanded.append(path)
+    return expanded
+
+
+def _is_log_sidecar(path):
+    # A pattern like "probes/*" must not pick up the files kept next to each log
+    return (path.endswith((STATS_SIDECAR_SUFFIX, INDEX_SIDECAR_SUFFIX, ROLLUP_SUFFIX, SAMPLES_SUFFIX))
+            or SEGMENT_PATTERN.search(path) is not None)
+
+
+def _map_logs(func, log_files, max_workers=None, *args):
+    """Runs `func(log_file, *args)` for each log, in parallel worker processes when there are several."""
+    if len(log_files) <= 1:
+        return [func(log_file, *args) for log_file in log_files]
+    # Imported here so that single-log callers never pay multiprocessing's import time
+    from concurrent.futures import ProcessPoolExecutor
+    workers = min(len(log_files), max_workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, log_files, *([arg] * len(log_files) for arg in args)))
+
+
+def downsample_plot_data(data, max_points):
+    """Reduces plot data to at most about `max_points` samples.
+
+    The series is split into equal buckets and each bucket keeps the samples
+    holding its lowest and highest download and upload, in time order, so
+    dips and spikes stay visible. The cumulative-average series are sampled
+    at the same positions.
+    """
+    if not data:
+        return data
+    total = len(data['dates'])
+    if max_points <= 0 or total <= max_points:
+        return data
+
+    downloads = data['downloads']
+    uploads = data['uploads']
+    # Up to four samples survive per bucket
+    bucket_count = max(1, max_points // 4)
+    keep = {0, total - 1}
+    for b in range(bucket_count):
+        lo = b * total // bucket_count
+        hi = (b + 1) * total // bucket_count
+        if lo >= hi:
+            continue
+        bucket = range(lo, hi)
+        keep.add(min(bucket, key=downloads.__getitem__))
+        keep.add(max(bucket, key=downloads.__getitem__))
+        keep.add(min(bucket, key=uploads.__getitem__))
+        keep.add(max(bucket, key=uploads.__getitem__))
+
+    indices = sorted(keep)
+    return {key: [series[i] for i in indices] for key, series in data.items()}
+
+
+class QuantileSketch:
+    """Mergeable streaming quantile estimate with bounded relative error.
+
+    Values are counted in logarithmically sized buckets (as in DDSketch), so
+    any quantile is within SKETCH_ACCURACY of the true value, memory grows
+    only with the dynamic range of the data, and two sketches merge by
+    adding their bucket counts.
+    """
+
+    def __init__(self, relative_accuracy=None):
+        if relative_accuracy is None:
+            relative_accuracy = SKETCH_ACCURACY
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value):
+        if value <= SKETCH_MIN_VALUE:
+            self.zero_count += 1
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + 1
+        self.count += 1
+
+    def merge(self, other):
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        # Nearest-rank definition: the smallest value with at least q of the samples at or below it
+        rank = max(0, math.ceil(q * self.count) - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if rank < seen:
+                # Midpoint (in relative terms) of the bucket (gamma^(key-1), gamma^key]
+                return 2 * self.gamma ** key / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self):
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'bins': {str(key): count for key, count in self.bins.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data['relative_accuracy'])
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        sketch.bins = {int(key): count for key, count in data['bins'].items()}
+        return sketch
+
+
+class StatsAccumulator:
+    """Running aggregates (sums, min/max, count, quantile sketches) over log records."""
+
+    SKETCHES = ('dl_sketch', 'ul_sketch', 'ping_sketch')
+
+    def __init__(self):
+        self.count = 0
+        self.total_dl = 0.0
+        self.total_ul = 0.0
+        self.total_ping = 0.0
+        self.total_ping_sq = 0.0
+        self.min_dl = float('inf')
+        self.max_dl = 0.0
+        self.min_ul = float('inf')
+        self.max_ul = 0.0
+        self.dl_sketch = QuantileSketch()
+        self.ul_sketch = QuantileSketch()
+        self.ping_sketch = QuantileSketch()
+        # server_id -> running aggregates for that server (see _add_server)
+        self.servers = {}
+
+    def add(self, download_speed, upload_speed, ping, server_id=None, server_name=None, timestamp=None):
+        self.total_dl += download_speed
+        self.total_ul += upload_speed
+        self.total_ping += ping
+        self.total_ping_sq += ping * ping
+        self.count += 1
+
+        self.min_dl = min(self.min_dl, download_speed)
+        self.max_dl = max(self.max_dl, download_speed)
+        self.min_ul = min(self.min_ul, upload_speed)
+        self.max_ul = max(self.max_ul, upload_speed)
+
+        self.dl_sketch.add(download_speed)
+        self.ul_sketch.add(upload_speed)
+        self.ping_sketch.add(ping)
+
+        if server_id is not None:
+            self._add_server(server_id, {
+                'server_name': server_name,
+                'count': 1,
+                'total_dl': download_speed,
+                'total_ul': upload_speed,
+                'total_ping': ping,
+                'min_dl': download_speed,
+                'max_dl': download_speed,
+                'min_ul': upload_speed,
+                'max_ul': upload_speed,
+                'last_seen': timestamp,
+            })
+
+    def _add_server(self, server_id, entry):
+        """Folds one server's aggregates (a single record or a merged group) into self.servers."""
+        current = self.servers.get(server_id)
+        if current is None:
+            self.servers[server_id] = dict(entry)
+            return
+        current['count'] += entry['count']
+        for key in ('total_dl', 'total_ul', 'total_ping'):
+            current[key] += entry[key]
+        for key in ('min_dl', 'min_ul'):
+            current[key] = min(current[key], entry[key])
+        for key in ('max_dl', 'max_ul'):
+            current[key] = max(current[key], entry[key])
+        if entry['last_seen'] and (not current['last_seen'] or entry['last_seen'] >= current['last_seen']):
+            current['last_seen'] = entry['last_seen']
+            current['server_name'] = entry['server_name'] or current['server_name']
+
+    def merge(self, other):
+        self.count += other.count
+        self.total_dl += other.total_dl
+        self.total_ul += other.total_ul
+        self.total_ping += other.total_ping
+        self.total_ping_sq += other.total_ping_sq
+        self.min_dl = min(self.min_dl, other.min_dl)
+        self.max_dl = max(self.max_dl, other.max_dl)
+        self.min_ul = min(self.min_ul, other.min_ul)
+        self.max_ul = max(self.max_ul, other.max_ul)
+        for name in self.SKETCHES:
+            getattr(self, name).merge(getattr(other, name))
+        for server_id, entry in other.servers.items():
+            self._add_server(server_id, entry)
+
+    def to_dict(self):
+        data = dict(vars(self))
+        for name in self.SKETCHES:
+            data[name] = data[name].to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        acc = cls()
+        for key, value in data.items():
+            if key in cls.SKETCHES:
+                value = QuantileSketch.from_dict(value)
+            if hasattr(acc, key):
+                setattr(acc, key, value)
+        return acc
+
+    def result(self):
+        if self.count == 0:
+            return None
+
+        avg_ping = self.total_ping / self.count
+        stats = {
+            'avg_dl': self.total_dl / self.count,
+            'avg_ul': self.total_ul / self.count,
+            'avg_ping': avg_ping,
+            'count': self.count,
+            'min_dl': self.min_dl,
+            'max_dl': self.max_dl,
+            'min_ul': self.min_ul,
+            'max_ul': self.max_ul,
+            # Spread of ping around its mean, i.e. jitter across tests
+            'ping_stddev': math.sqrt(max(0.0, self.total_ping_sq / self.count - avg_ping ** 2)),
+        }
+        for p in PERCENTILES:
+            stats[f'p{p}_dl'] = self.dl_sketch.quantile(p / 100)
+            stats[f'p{p}_ul'] = self.ul_sketch.quantile(p / 100)
+            stats[f'p{p}_ping'] = self.ping_sketch.quantile(p / 100)
+        return stats
+
+    def server_results(self):
+        """Per-server statistics, most tested server first."""
+        results = []
+        for server_id, entry in self.servers.items():
+            count = entry['count']
+            results.append({
+                'server_id': server_id,
+                'server_name': entry['server_name'],
+                'count': count,
+                'avg_dl': entry['total_dl'] / count,
+                'avg_ul': entry['total_ul'] / count,
+                'avg_ping': entry['total_ping'] / count,
+                'min_dl': entry['min_dl'],
+                'max_dl': entry['max_dl'],
+                'min_ul': entry['min_ul'],
+                'max_ul': entry['max_ul'],
+                'last_seen': entry['last_seen'],
+            })
+        results.sort(key=lambda r: (-r['count'], str(r['server_id'])))
+        return results
+
+
+def parse_stats_line(line):
+    """Returns (download, upload, ping, server_id, server_name, timestamp) for a log line.
+
+    Server fields and the (unparsed) timestamp are None when missing; returns
+    None if the line is malformed.
+    """
+    parts = line.strip().split(',')
+    # Ensure we have at least the basic speed data (timestamp, dl, ul, ping)
+    if len(parts) < 4:
+        return None
+    try:
+        download, upload, ping = float(parts[1]), float(parts[2]), float(parts[3])
+        _check_finite(download, upload, ping)
+        return (download, upload, ping,
+                parts[4] if len(parts) > 4 else None,
+                parts[5] if len(parts) > 5 else None,
+                parts[0] or None)
+    except ValueError:
         return None
 
-    if count == 0:
+
+def _sidecar_path(log_file, suffix):
+    return log_file + suffix
+
+
+def _read_sidecar(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
         return None
 
-    return {
-        'avg_dl': total_download / count,
-        'avg_ul': total_upload / count,
-        'avg_ping': total_ping / count,
+
+def _write_sidecar(path, data):
+    """Atomically replaces a sidecar file; returns False if it could not be written (e.g. read-only dir)."""
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                        prefix='.' + os.path.basename(path) + '.')
+    except OSError:
+        return False
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+        return True
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
+
+
+def log_fingerprint(f, offset):
+    """Digest of the bytes that identify a consumed log prefix.
+
+    Covers the start of the file and the bytes just before `offset`, so a
+    rotated or rewritten log is noticed without rescanning it.
+    """
+    digest = hashlib.sha1()
+    f.seek(0)
+    digest.update(f.read(min(offset, FINGERPRINT_BYTES)))
+    tail_start = max(0, offset - FINGERPRINT_BYTES)
+    f.seek(tail_start)
+    digest.update(f.read(offset - tail_start))
+    return digest.hexdigest()
+
+
+def _sidecar_is_valid(sidecar, f, st, version):
+    """Checks that a sidecar still describes a prefix of the open log file."""
+    if not sidecar or sidecar.get('version') != version:
+        return False
+    offset = sidecar.get('offset', 0)
+    if sidecar.get('inode') != st.st_ino or offset > st.st_size:
+        return False
+    return sidecar.get('fingerprint') == log_fingerprint(f, offset)
+
+
+def iter_lines_from(f, offset):
+    """Yields (line, end_offset, complete) for every line after `offset`.
+
+    Only newline-terminated lines are `complete`; a trailing partial line (a
+    write in progress) is yielded last so callers can decide whether to
+    consume it.
+    """
+    f.seek(offset)
+    for raw in f:
+        complete = raw.endswith(b'\n')
+        if complete:
+            offset += len(raw)
+        yield raw.decode('utf-8', errors='replace'), offset, complete
+
+
+@FUNCTION_SECONDS.time(function='load_stats')
+def load_stats(log_file, use_sidecar=True, use_rollups=True):
+    """Returns a StatsAccumulator over the whole history, or None if there is none.
+
+    Combines the rollup of compacted log segments (see compact_log_segments)
+    with the live log.
+    """
+    rollup = load_rollup(log_file) if use_rollups else None
+    acc = None
+    if rollup and rollup['total']['count']:
+        acc = StatsAccumulator.from_dict(rollup['total'])
+
+    log_acc = _load_log_stats(log_file, use_sidecar)
+    if log_acc is None:
+        return acc
+    if acc is None:
+        return log_acc
+    acc.merge(log_acc)
+    return acc
+
+
+def _load_log_stats(log_file, use_sidecar=True):
+    """Returns a StatsAccumulator over the live log, or None if it can't be read.
+
+    Aggregates are persisted in a `<log_file>.stats.json` sidecar together
+    with the byte offset consumed so far, so each call only parses lines
+    appended since the previous one. The sidecar is discarded when the log is
+    truncated, rotated or rewritten.
+    """
+    if not os.path.exists(log_file):
+        return None
+
+    try:
+        with open(log_file, 'rb') as f:
+            acc, _, partial = scan_log_stats(f, log_file, use_sidecar)
+            # An unterminated last line still counts, but is not persisted
+            if partial:
+                acc.add(*partial)
+    except Exception as e:
+        print(f"Error reading log file: {e}")
+        return None
+
+    return acc
+
+
+def scan_log_stats(f, log_file, use_sidecar=True):
+    """Aggregates the complete lines of an open log, resuming from and updating its stats sidecar.
+
+    Returns (StatsAccumulator, offset, partial): the accumulator covers the
+    lines before `offset`, and `partial` holds the parse_stats_line values
+    of a trailing unterminated line (None if there is none).
+    """
+    sidecar_file = _sidecar_path(log_file, STATS_SIDECAR_SUFFIX)
+    st = os.fstat(f.fileno())
+    sidecar = _read_sidecar(sidecar_file) if use_sidecar else None
+
+    valid = _sidecar_is_valid(sidecar, f, st, STATS_SIDECAR_VERSION)
+    if use_sidecar:
+        CACHE_REQUESTS.inc(cache='stats_sidecar', result='hit' if valid else 'miss')
+    if valid:
+        acc = StatsAccumulator.from_dict(sidecar['stats'])
+        start_offset = sidecar['offset']
+    else:
+        acc = StatsAccumulator()
+        start_offset = 0
+
+    offset = start_offset
+    partial = None
+    lines = 0
+    engine = _vector_engine(st.st_size - start_offset)
+    if engine:
+        for data, _, block_end in engine.iter_blocks(f, start_offset):
+            lines += engine.count_lines(data)
+            if block_end is None:
+                partial = parse_stats_line(data.decode('utf-8', errors='replace'))
+                break
+            acc.merge(engine.block_stats(data))
+            offset = block_end
+    else:
+        for line, offset, complete in iter_lines_from(f, start_offset):
+            lines += 1
+            values = parse_stats_line(line)
+            if not values:
+                continue
+            if complete:
+                acc.add(*values)
+            else:
+                partial = values
+    LINES_PARSED.inc(lines, reader='stats')
+    BYTES_READ.inc(offset - start_offset, reader='stats')
+
+    if use_sidecar and (not valid or offset != start_offset):
+        _write_sidecar(sidecar_file, {
+            'version': STATS_SIDECAR_VERSION,
+            'inode': st.st_ino,
+            'offset': offset,
+            'fingerprint': log_fingerprint(f, offset),
+            'stats': acc.to_dict(),
+        })
+    return acc, offset, partial
+
+
+def load_merged_stats(log_files, use_sidecar=True, max_workers=None):
+    """Returns one StatsAccumulator over several logs (or a glob), or None if none has history.
+
+    Each log is aggregated in a worker process (reusing its sidecar), and
+    the per-log accumulators are merged.
+    """
+    merged = None
+    for acc in _map_logs(load_stats, expand_log_files(log_files), max_workers, use_sidecar):
+        if acc is None:
+            continue
+        if merged is None:
+            merged = acc
+        else:
+            merged.merge(acc)
+    return merged
+
+
+def calculate_stats(log_file, use_sidecar=True):
+    """Returns historical statistics for a log file, a glob pattern or a list of logs (see load_stats)."""
+    acc = load_merged_stats(log_file, use_sidecar)
+    return acc.result() if acc else None
+
+
+def calculate_server_stats(log_file, use_sidecar=True):
+    """Returns per-server statistics for a log file, gathered in the same single pass as calculate_stats."""
+    acc = load_merged_stats(log_file, use_sidecar)
+    return acc.server_results() if acc else None
+
+
+@FUNCTION_SECONDS.time(function='load_log_index')
+def load_log_index(log_file, use_sidecar=True, f=None):
+    """Returns the sparse timestamp index of a log, extending it with appended lines.
+
+    Every INDEX_STRIDE plottable records the index stores
+    `[epoch_seconds, byte_offset, count, cum_dl, cum_ul]`: where that record
+    starts and the cumulative totals of everything before it. It is kept in a
+    `<log_file>.idx.json` sidecar and validated the same way as the stats
+    sidecar, so only the unindexed tail is parsed. `f` may be the log
+    already open in binary mode.
+    """
+    if f is None:
+        with open(log_file, 'rb') as f:
+            return _update_log_index(f, log_file, use_sidecar)
+    return _update_log_index(f, log_file, use_sidecar)
+
+
+def _update_log_index(f, log_file, use_sidecar):
+    index_file = _sidecar_path(log_file, INDEX_SIDECAR_SUFFIX)
+    st = os.fstat(f.fileno())
+    index = _read_sidecar(index_file) if use_sidecar else None
+    valid = _sidecar_is_valid(index, f, st, INDEX_SIDECAR_VERSION)
+    if use_sidecar:
+        CACHE_REQUESTS.inc(cache='index_sidecar', result='hit' if valid else 'miss')
+    if not valid:
+        index = {'offset': 0, 'count': 0, 'cum_dl': 0.0, 'cum_ul': 0.0, 'entries': []}
+
+    start_offset = offset = line_start = index['offset']
+    count, cum_dl, cum_ul = index['count'], index['cum_dl'], index['cum_ul']
+    entries = index['entries']
+    lines = 0
+    engine = _vector_engine(st.st_size - start_offset)
+    if engine:
+        arrays, line_start, lines = engine.read_arrays(f, start_offset)
+        new_entries, count, cum_dl, cum_ul = engine.index_entries(
+            arrays, count, cum_dl, cum_ul, INDEX_STRIDE)
+        entries.extend(new_entries)
+    else:
+        for line, offset, complete in iter_lines_from(f, start_offset):
+            if not complete:
+                break
+            lines += 1
+            values = parse_plot_line(line)
+            if values:
+                dt, dl, ul = values
+                if count % INDEX_STRIDE == 0:
+                    entries.append([dt.timestamp(), line_start, count, cum_dl, cum_ul])
+                count += 1
+                cum_dl += dl
+                cum_ul += ul
+            line_start = offset
+    LINES_PARSED.inc(lines, reader='index')
+    BYTES_READ.inc(line_start - start_offset, reader='index')
+
+    index.update({
+        'version': INDEX_SIDECAR_VERSION,
+        'inode': st.st_ino,
+        'offset': line_start,
         'count': count,
-        'min_dl': min_download,
-        'max_dl': max_download,
-        'min_ul': min_upload,
-        'max_ul': max_upload,
-    }
+        'cum_dl': cum_dl,
+        'cum_ul': cum_ul,
+    })
+    if use_sidecar and (not valid or line_start != start_offset):
+        index['fingerprint'] = log_fingerprint(f, line_start)
+        _write_sidecar(index_file, index)
+
+    return index
+
+
+def find_index_entry(index, cutoff_date):
+    """Returns (offset, count, cum_dl, cum_ul) to start scanning from for records >= cutoff_date."""
+    entries = index['entries']
+    pos = bisect.bisect_left([entry[0] for entry in entries], cutoff_date.timestamp())
+    # The entry before the first one at/after the cutoff may still precede in-window records
+    if pos == 0:
+        return 0, 0, 0.0, 0.0
+    _, offset, count, cum_dl, cum_ul = entries[pos - 1]
+    return offset, count, cum_dl, cum_ul
+
+def rotate_log(log_file):
+    """Closes the live log by renaming it to a timestamped segment.
+
+    Returns the segment path, or None when there is nothing to rotate.
+    The next log_results call starts a fresh log.
+    """
+    if not os.path.exists(log_file) or os.path.getsize(log_file) == 0:
+        return None
+
+    stamp = datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+    segment = f"{log_file}.{stamp}"
+    suffix = 1
+    while os.path.exists(segment):
+        segment = f"{log_file}.{stamp}-{suffix}"
+        suffix += 1
+    os.rename(log_file, segment)
+    return segment
+
+
+def list_log_segments(log_file):
+    """Returns the closed (rotated) segments of a log, oldest first."""
+    directory = os.path.dirname(os.path.abspath(log_file))
+    prefix = os.path.basename(log_file)
+    segments = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and SEGMENT_PATTERN.fullmatch(name[len(prefix):]):
+            segments.append(os.path.join(os.path.dirname(log_file), name))
+    return sorted(segments)
+
+
+def load_rollup(log_file):
+    """Returns the rollup of compacted segments for a log (empty if none were compacted)."""
+    rollup = _read_sidecar(_sidecar_path(log_file, ROLLUP_SUFFIX))
+    if not rollup or rollup.get('version') != ROLLUP_VERSION:
+        rollup = {
+            'version': ROLLUP_VERSION,
+            'segments': [],
+            'total': StatsAccumulator().to_dict(),
+            'daily': {},
+            'hourly': {},
+            'hourly_since': None,
+        }
+    return rollup
+
 
-def generate_plot_image(log_file, output_path, days=30):
-    data = get_plot_data(log_file, days)
+def iter_rollup_buckets(rollup):
+    """Yields (bucket_start, count, total_dl, total_ul) for the rollup, oldest first.
+
+    Days from `hourly_since` on are covered by hourly buckets, older days
+    by daily ones.
+    """
+    since = rollup.get('hourly_since')
+    for day in sorted(rollup['daily']):
+        if since and day >= since:
+            continue
+        bucket = rollup['daily'][day]
+        yield (datetime.datetime.strptime(day, '%Y-%m-%d'),
+               bucket['count'], bucket['total_dl'], bucket['total_ul'])
+    for hour in sorted(rollup['hourly']):
+        count, total_dl, total_ul = rollup['hourly'][hour][:3]
+        yield datetime.datetime.strptime(hour, '%Y-%m-%dT%H'), count, total_dl, total_ul
+
+
+def _add_hourly(bucket, download_speed, upload_speed, ping):
+    """Updates a compact hourly bucket: [count, sum_dl, sum_ul, sum_ping, min_dl, max_dl, min_ul, max_ul]."""
+    if not bucket:
+        bucket.extend([0, 0.0, 0.0, 0.0, download_speed, download_speed, upload_speed, upload_speed])
+    bucket[0] += 1
+    bucket[1] += download_speed
+    bucket[2] += upload_speed
+    bucket[3] += ping
+    bucket[4] = min(bucket[4], download_speed)
+    bucket[5] = max(bucket[5], download_speed)
+    bucket[6] = min(bucket[6], upload_speed)
+    bucket[7] = max(bucket[7], upload_speed)
+
+
+def compact_log_segments(log_file, hourly_days=ROLLUP_HOURLY_DAYS):
+    """Folds closed log segments into the rollup and deletes them.
+
+    The rollup keeps an overall StatsAccumulator (with per-server stats),
+    per-day accumulators (with quantile sketches) and compact per-hour
+    buckets for the last `hourly_days` days, so disk use and query time
+    stay bounded however long the probe runs. Returns the number of
+    segments folded.
+    """
+    rollup = load_rollup(log_file)
+    total = StatsAccumulator.from_dict(rollup['total'])
+    daily = {day: StatsAccumulator.from_dict(data) for day, data in rollup['daily'].items()}
+    hourly = rollup['hourly']
+
+    folded = []
+    for segment in list_log_segments(log_file):
+        name = os.path.basename(segment)
+        if name not in rollup['segments']:
+            with open(segment, 'rb') as f:
+                for line, _, _ in iter_lines_from(f, 0):
+                    values = parse_stats_line(line)
+                    if not values:
+                        continue
+                    total.add(*values)
+                    try:
+                        dt = datetime.datetime.fromisoformat(values[5] or '')
+                    except ValueError:
+                        continue
+                    daily.setdefault(dt.strftime('%Y-%m-%d'), StatsAccumulator()).add(*values[:3])
+                    _add_hourly(hourly.setdefault(dt.strftime('%Y-%m-%dT%H'), []), *values[:3])
+            rollup['segments'].append(name)
+        folded.append(segment)
+
+    # Hourly detail is only kept for recent days; daily buckets cover the rest
+    since = (datetime.datetime.now() - datetime.timedelta(days=hourly_days)).strftime('%Y-%m-%d')
+    if rollup['hourly_since'] and rollup['hourly_since'] > since:
+        since = rollup['hourly_since']
+    rollup['hourly_since'] = since
+    rollup['hourly'] = {hour: bucket for hour, bucket in hourly.items() if hour[:10] >= since}
+    rollup['total'] = total.to_dict()
+    rollup['daily'] = {day: acc.to_dict() for day, acc in daily.items()}
+
+    # Persist before deleting: a segment listed in the rollup is never folded twice
+    if not _write_sidecar(_sidecar_path(log_file, ROLLUP_SUFFIX), rollup):
+        raise OSError(f"Could not write rollup for {log_file}")
+    for segment in folded:
+        os.remove(segment)
+    return len(folded)
+
+
+@FUNCTION_SECONDS.time(function='generate_plot_image')
+def generate_plot_image(log_file, output_path, days=30, data=None):
+    """Renders the history plot to `output_path` (a path or binary file object).
+
+    `data` may be passed in when the caller already holds the plot data
+    (e.g. the dashboard's in-memory model); otherwise it is read from the log.
+    """
+    if data is None:
+        data = get_plot_data(log_file, days)
     if not data:
         print("No log file found or no data for plotting.")
         return False
 
+    # More samples than horizontal pixels only cost render time
+    data = downsample_plot_data(data, PLOT_FIGSIZE[0] * PLOT_DPI)
+
+    # Imported here so that non-plotting callers never pay matplotlib's import time
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+
     dates = data['dates']
     downloads = data['downloads']
     uploads = data['uploads']
     avg_downloads = data['avg_downloads']
     avg_uploads = data['avg_uploads']
 
-    fig, ax1 = plt.subplots(figsize=(12, 6))
+    fig, ax1 = plt.subplots(figsize=PLOT_FIGSIZE, dpi=PLOT_DPI)
 
     color_dl = 'tab:blue'
     color_ul = 'tab:orange'
@@ -173,30 +1177,81 @@ def generate_plot_image(log_file, output_path, days=30):
         print(f"Error saving plot to {output_path}: {e}")
         return False
 
-def get_latest_speedtest(log_file):
-    if not os.path.exists(log_file):
+def append_test_samples(log_file, timestamp, samples):
+    """Stores the per-phase progress samples of one test next to the log."""
+    entry = dict(samples, timestamp=timestamp)
+    with open(_sidecar_path(log_file, SAMPLES_SUFFIX), 'a') as f:
+        f.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+def get_test_samples(log_file, timestamp=None):
+    """Returns the progress samples stored for the test at `timestamp` (default: the latest one)."""
+    samples_file = _sidecar_path(log_file, SAMPLES_SUFFIX)
+    if not os.path.exists(samples_file):
         return None
 
+    found = None
+    with open(samples_file, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if timestamp is None or entry.get('timestamp') == timestamp:
+                found = entry
+    return found
+
+def iter_lines_reverse(f, block_size=REVERSE_BLOCK_SIZE, end=None):
+    """Yields the lines of a binary file from last to first, without their newlines.
+
+    The file is read backwards `block_size` bytes at a time, so stopping
+    after a few lines costs a few reads however long the lines or the file
+    are. A trailing line without a newline (a write in progress) comes first.
+    With `end`, only the bytes before that offset are read.
+    """
+    if end is None:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+    position = end
+    head = b''
+    while position > 0:
+        step = min(block_size, position)
+        position -= step
+        f.seek(position)
+        lines = (f.read(step) + head).split(b'\n')
+        # The first piece may continue in the previous block
+        head = lines[0]
+        for raw in reversed(lines[1:]):
+            yield raw.decode('utf-8', errors='replace')
+    yield head.decode('utf-8', errors='replace')
+
+@FUNCTION_SECONDS.time(function='get_recent_speedtests')
+def get_recent_speedtests(log_file, n):
+    """Returns the last `n` results of a log as dicts (see record_to_dict), newest first.
+
+    The log is read backwards and malformed lines are skipped, so the cost
+    grows with `n` rather than with the size of the log.
+    """
+    if n <= 0 or not os.path.exists(log_file):
+        return []
+
+    results = []
+    lines = 0
     try:
         with open(log_file, 'rb') as f:
-            f.seek(-2, os.SEEK_END)
-            while f.read(1) != b'\n':
-                f.seek(-2, os.SEEK_CUR)
-            last_line = f.readline().decode()
-
-            parts = last_line.strip().split(',')
-            
-            if len(parts) >= 6:
-                return {
-                    'timestamp': parts[0],
-                    'download': float(parts[1]),
-                    'upload': float(parts[2]),
-                    'ping': float(parts[3]),
-                    'server_id': parts[4],
-                    'server_name': parts[5]
-                }
-    except Exception as e:
-        print(f"Error reading latest speedtest from log file: {e}")
-        return None
-    
-    return None
\ No newline at end of file
+            for line in iter_lines_reverse(f):
+                lines += 1
+                record = parse_log_record(line)
+                if record:
+                    results.append(record_to_dict(record))
+                    if len(results) >= n:
+                        break
+    except OSError as e:
+        print(f"Error reading recent speedtests from log file: {e}")
+    LINES_PARSED.inc(lines, reader='recent')
+    return results
+
+@FUNCTION_SECONDS.time(function='get_latest_speedtest')
+def get_latest_speedtest(log_file):
+    """Returns the newest result of a log as a dict, or None if it has none."""
+    recent = get_recent_speedtests(log_file, 1)
+    return recent[0] if recent else None
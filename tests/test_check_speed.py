@@ -4,11 +4,16 @@ import sys
 import os
 import json
 import datetime
-from io import StringIO
+import subprocess
+import tempfile
+import threading
+import urllib.error
+from io import BytesIO, StringIO
 
 # Append parent directory to path to import check_speed
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import check_speed
+import speed_utils
 
 class TestCheckSpeed(unittest.TestCase):
 
@@ -17,8 +22,10 @@ class TestCheckSpeed(unittest.TestCase):
         self.test_log_file = 'test_speed_log.txt'
 
     def tearDown(self):
-        if os.path.exists(self.test_log_file):
-            os.remove(self.test_log_file)
+        # Remove the log together with the sidecars the readers leave next to it
+        for suffix in ('', speed_utils.STATS_SIDECAR_SUFFIX, speed_utils.INDEX_SIDECAR_SUFFIX):
+            if os.path.exists(self.test_log_file + suffix):
+                os.remove(self.test_log_file + suffix)
 
     def test_log_results(self):
         check_speed.log_results(100.0, 50.0, 10.0, '1234', 'Test Server', self.test_log_file)
@@ -31,36 +38,34 @@ class TestCheckSpeed(unittest.TestCase):
             self.assertIn('1234', content)
             self.assertIn('Test Server', content)
 
-    def test_calculate_averages_no_file(self):
+    def test_calculate_stats_no_file(self):
         # Ensure no file exists
         if os.path.exists(self.test_log_file):
             os.remove(self.test_log_file)
 
-        dl, ul, ping = check_speed.calculate_averages(self.test_log_file)
-        self.assertIsNone(dl)
-        self.assertIsNone(ul)
-        self.assertIsNone(ping)
+        self.assertIsNone(speed_utils.calculate_stats(self.test_log_file))
 
-    def test_calculate_averages_with_data(self):
+    def test_calculate_stats_with_data(self):
         with open(self.test_log_file, 'w') as f:
             f.write("2025-01-01T12:00:00,100.0,50.0,10.0,1,S1\n")
             f.write("2025-01-01T13:00:00,200.0,100.0,20.0,2,S2\n")
 
-        dl, ul, ping = check_speed.calculate_averages(self.test_log_file)
-        self.assertEqual(dl, 150.0)
-        self.assertEqual(ul, 75.0)
-        self.assertEqual(ping, 15.0)
+        stats = speed_utils.calculate_stats(self.test_log_file)
+        self.assertEqual(stats['avg_dl'], 150.0)
+        self.assertEqual(stats['avg_ul'], 75.0)
+        self.assertEqual(stats['avg_ping'], 15.0)
 
-    def test_calculate_averages_corrupt_data(self):
+    def test_calculate_stats_corrupt_data(self):
          with open(self.test_log_file, 'w') as f:
             f.write("2025-01-01T12:00:00,100.0,50.0,10.0,1,S1\n")
             f.write("garbage line\n")
             f.write("2025-01-01T13:00:00,200.0,100.0,20.0,2,S2\n")
 
-         dl, ul, ping = check_speed.calculate_averages(self.test_log_file)
-         self.assertEqual(dl, 150.0)
-         self.assertEqual(ul, 75.0)
-         self.assertEqual(ping, 15.0)
+         stats = speed_utils.calculate_stats(self.test_log_file)
+         self.assertEqual(stats['count'], 2)
+         self.assertEqual(stats['avg_dl'], 150.0)
+         self.assertEqual(stats['avg_ul'], 75.0)
+         self.assertEqual(stats['avg_ping'], 15.0)
 
     @patch('shutil.which')
     @patch('subprocess.run')
@@ -98,11 +103,194 @@ class TestCheckSpeed(unittest.TestCase):
         server_id = check_speed.get_server_id_by_name('speedtest', 'Nonexistent')
         self.assertIsNone(server_id)
 
+    @patch('check_speed.rank_servers')
+    @patch('subprocess.run')
+    def test_get_server_id_by_name_preprobe(self, mock_run, mock_rank):
+        servers = [{'name': 'Tel Aviv A', 'location': 'Tel Aviv', 'host': 'a.host:8080', 'id': 1},
+                   {'name': 'Tel Aviv B', 'location': 'Tel Aviv', 'host': 'b.host:8080', 'id': 2},
+                   {'name': 'Haifa', 'location': 'Haifa', 'host': 'c.host:8080', 'id': 3}]
+        mock_run.return_value.returncode = 0
+        mock_run.return_value.stdout = json.dumps({'servers': servers})
+        mock_rank.return_value = [(3.0, servers[1])]
+
+        with patch('sys.stdout', new=StringIO()):
+            self.assertEqual(check_speed.get_server_id_by_name('speedtest', 'Tel Aviv', preprobe=True), 2)
+            self.assertEqual(mock_rank.call_args[0][0], servers[:2])
+            self.assertEqual(check_speed.get_server_id_by_name('speedtest', 'Tel Aviv'), 1)
+            # A single best match isn't probed; if no candidate responds the best match is used
+            self.assertEqual(check_speed.get_server_id_by_name('speedtest', 'Haifa', preprobe=True), 3)
+            mock_rank.return_value = []
+            self.assertEqual(check_speed.get_server_id_by_name('speedtest', 'Tel Aviv', preprobe=True), 1)
+            self.assertEqual(mock_rank.call_count, 2)
+
+            mock_rank.return_value = [(1.0, servers[2]), (4.0, servers[0])]
+            self.assertEqual(check_speed.get_fastest_server_id('speedtest'), 3)
+            self.assertEqual(mock_rank.call_args[0][0], servers)
+
     @patch('subprocess.run')
     def test_get_server_id_by_name_error(self, mock_run):
         mock_run.return_value.returncode = 1
         server_id = check_speed.get_server_id_by_name('speedtest', 'Test')
         self.assertIsNone(server_id)
 
+    @patch('check_speed.print_historical_averages')
+    @patch('check_speed.get_server_id_by_name')
+    @patch('check_speed.run_official_speedtest')
+    def test_run_daemon_resolves_once_and_repeats(self, mock_test, mock_lookup, mock_averages):
+        stop_event = threading.Event()
+        mock_lookup.return_value = '1234'
+        runs = []
+
+        def fake_test(cmd_exec, args, storage=None):
+            runs.append(args.serverid)
+            if len(runs) == 3:
+                stop_event.set()
+            return True
+        mock_test.side_effect = fake_test
+
+        args = MagicMock(serverid=None, servername='Test', interval=0.01, jitter=0, logfile=self.test_log_file)
+        with patch('sys.stdout', new=StringIO()):
+            check_speed.run_daemon('speedtest', args, stop_event)
+
+        self.assertEqual(runs, ['1234', '1234', '1234'])
+        mock_lookup.assert_called_once()
+        self.assertEqual(mock_lookup.call_args[0][:2], ('speedtest', 'Test'))
+
+    @patch('check_speed.print_historical_averages')
+    @patch('check_speed.get_fastest_server_id')
+    @patch('check_speed.run_official_speedtest')
+    def test_run_daemon_refreshes_servers_once(self, mock_test, mock_fastest, mock_averages):
+        stop_event = threading.Event()
+        refreshes = []
+
+        def fake_test(cmd_exec, args, storage=None):
+            refreshes.append(args.refresh_servers)
+            if len(refreshes) == 2:
+                stop_event.set()
+            return True
+        mock_test.side_effect = fake_test
+
+        args = MagicMock(serverid=None, servername=None, preprobe=True, refresh_servers=True,
+                         interval=0.01, jitter=0, logfile=self.test_log_file)
+        with patch('sys.stdout', new=StringIO()):
+            check_speed.run_daemon('speedtest', args, stop_event)
+
+        self.assertEqual(refreshes, [False, False])
+        mock_fastest.assert_called_once()
+        self.assertTrue(mock_fastest.call_args[1]['refresh'])
+
+    def test_import_does_not_load_plotting_libraries(self):
+        repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run(
+            [sys.executable, '-c', "import sys, check_speed, speed_http_server; "
+                                   "print('matplotlib' in sys.modules, 'plotext' in sys.modules)"],
+            capture_output=True, text=True, cwd=repo_dir)
+        self.assertEqual(result.stdout.strip(), 'False False')
+
+    @patch('subprocess.run')
+    def test_get_official_speedtest_command_cached(self, mock_run):
+        mock_run.return_value.stdout = "Speedtest by Ookla 1.2.0.84"
+        with tempfile.TemporaryDirectory() as tmpdir:
+            binary = os.path.join(tmpdir, 'speedtest')
+            with open(binary, 'w') as f:
+                f.write("#!/bin/sh\n")
+            os.chmod(binary, 0o755)
+            cache_file = os.path.join(tmpdir, 'cli.json')
+
+            with patch('shutil.which', side_effect=lambda cmd: binary if cmd == 'speedtest' else None):
+                self.assertEqual(check_speed.get_official_speedtest_command(cache_file), 'speedtest')
+                self.assertEqual(check_speed.get_official_speedtest_command(cache_file), 'speedtest')
+                self.assertEqual(mock_run.call_count, 1)
+
+                # An upgraded binary is detected again
+                st = os.stat(binary)
+                os.utime(binary, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+                check_speed.get_official_speedtest_command(cache_file)
+                self.assertEqual(mock_run.call_count, 2)
+
+    def test_run_official_speedtest_progress(self):
+        events = [
+            {'type': 'testStart'},
+            {'type': 'ping', 'ping': {'latency': 12.5, 'progress': 0.5}},
+            {'type': 'ping', 'ping': {'latency': 11.0, 'progress': 1.0}},
+            {'type': 'download', 'download': {'bandwidth': 12500000, 'elapsed': 250, 'progress': 0.1}},
+            {'type': 'download', 'download': {'bandwidth': 25000000, 'elapsed': 500, 'progress': 0.2}},
+            {'type': 'upload', 'upload': {'bandwidth': 2500000, 'elapsed': 250, 'progress': 0.1}},
+            {'type': 'result', 'ping': {'latency': 11.0}, 'download': {'bandwidth': 25000000},
+             'upload': {'bandwidth': 2500000}, 'server': {'id': 42, 'name': 'S', 'location': 'L'}},
+        ]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fake_cli = os.path.join(tmpdir, 'speedtest')
+            with open(fake_cli, 'w') as f:
+                f.write(f"#!{sys.executable}\n")
+                f.write("import sys\nassert sys.argv[-4:] == ['-f', 'jsonl', '-p', 'yes']\n")
+                for event in events:
+                    f.write(f"print({json.dumps(json.dumps(event))}, flush=True)\n")
+            os.chmod(fake_cli, 0o755)
+
+            log_file = os.path.join(tmpdir, 'speed_log.txt')
+            args = MagicMock(serverid=None, servername=None, preprobe=False, progress=True, logfile=log_file,
+                             push_url=None)
+            with patch('sys.stdout', new=StringIO()) as output:
+                self.assertTrue(check_speed.run_official_speedtest(fake_cli, args))
+            self.assertIn('Download:   200.00 Mbps ( 20%)', output.getvalue())
+
+            with open(log_file) as f:
+                timestamp = f.read().split(',')[0]
+            samples = speed_utils.get_test_samples(log_file)
+            self.assertEqual(samples['timestamp'], timestamp)
+            self.assertEqual(samples['ping'], [[0.5, 12.5], [1.0, 11.0]])
+            self.assertEqual(samples['download'], [[250, 100.0], [500, 200.0]])
+            self.assertEqual(samples['upload'], [[250, 20.0]])
+
+    @patch('urllib.request.urlopen')
+    def test_push_spooled_results(self, mock_urlopen):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            spool = os.path.join(tmpdir, 'speed_log.txt' + check_speed.SPOOL_SUFFIX)
+            for dl in (10.0, 20.0, 30.0):
+                check_speed.spool_result(spool, {'timestamp': '2023-01-01T12:00:00', 'download': dl})
+
+            # The first batch is accepted, then the server goes away
+            mock_urlopen.side_effect = [MagicMock(), OSError('connection refused')]
+            pushed = check_speed.push_spooled_results(spool, 'http://dash/ingest', 'secret', 'probe-1',
+                                                      batch_size=2)
+            self.assertEqual(pushed, 2)
+            request = mock_urlopen.call_args_list[0][0][0]
+            self.assertEqual(request.get_header('Authorization'), 'Bearer secret')
+            self.assertEqual(json.loads(request.data)['probe_id'], 'probe-1')
+            with open(spool) as f:
+                self.assertEqual([json.loads(line)['download'] for line in f], [30.0])
+
+            mock_urlopen.side_effect = None
+            self.assertEqual(check_speed.push_spooled_results(spool, 'http://dash/ingest', 'secret', 'probe-1'), 1)
+            self.assertFalse(os.path.exists(spool))
+
+    @patch('urllib.request.urlopen')
+    def test_push_moves_rejected_batches_aside(self, mock_urlopen):
+        def http_error(code, body=b''):
+            return urllib.error.HTTPError('http://dash/ingest', code, 'Error', {}, BytesIO(body))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            spool = os.path.join(tmpdir, 'speed_log.txt' + check_speed.SPOOL_SUFFIX)
+            for dl in (10.0, 20.0, 30.0):
+                check_speed.spool_result(spool, {'timestamp': '2023-01-01T12:00:00', 'download': dl})
+
+            # A server error is retried later; a rejected batch doesn't block the ones after it
+            mock_urlopen.side_effect = [http_error(503)]
+            with patch('sys.stdout', new_callable=StringIO):
+                self.assertEqual(check_speed.push_spooled_results(spool, 'http://dash/ingest', 's', 'p',
+                                                                  batch_size=2), 0)
+            with open(spool) as f:
+                self.assertEqual(len(f.readlines()), 3)
+
+            mock_urlopen.side_effect = [http_error(400, b'{"error": "Invalid batch: bad"}'), MagicMock()]
+            with patch('sys.stdout', new_callable=StringIO) as output:
+                self.assertEqual(check_speed.push_spooled_results(spool, 'http://dash/ingest', 's', 'p',
+                                                                  batch_size=2), 1)
+            self.assertIn('400: Invalid batch: bad', output.getvalue())
+            self.assertFalse(os.path.exists(spool))
+            with open(spool + check_speed.REJECTED_SUFFIX) as f:
+                self.assertEqual([json.loads(line)['download'] for line in f], [10.0, 20.0])
+
 if __name__ == '__main__':
     unittest.main()
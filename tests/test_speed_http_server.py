@@ -0,0 +1,452 @@
+import unittest
+import sys
+import os
+import datetime
+import json
+import gzip
+import tempfile
+import threading
+import http.client
+import socket
+import time
+from unittest.mock import patch
+
+# Append parent directory to path to import speed_http_server
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import speed_http_server
+import speed_utils
+
+class TestLogModel(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.test_log_file = os.path.join(self.tmpdir.name, 'speed_log.txt')
+        self.model = speed_http_server.LogModel(self.test_log_file)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_log(self, lines, mode='a'):
+        with open(self.test_log_file, mode) as f:
+            for line in lines:
+                f.write(line + "\n")
+
+    def recent(self, hours_ago):
+        return (datetime.datetime.now() - datetime.timedelta(hours=hours_ago)).isoformat()
+
+    def test_missing_log(self):
+        self.assertIsNone(self.model.get_stats())
+        self.assertIsNone(self.model.get_latest())
+        self.assertIsNone(self.model.get_plot_data())
+
+    def test_tails_appended_lines(self):
+        self.write_log([f"{self.recent(3)},100.0,50.0,10.0,1,S1", "garbage line"])
+        self.assertEqual(self.model.get_stats()['count'], 1)
+
+        self.write_log([f"{self.recent(2)},200.0,100.0,20.0,2,S2"])
+        stats = self.model.get_stats()
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['avg_dl'], 150.0)
+        self.assertEqual(self.model.get_latest()['server_name'], 'S2')
+        self.assertEqual(stats, speed_utils.calculate_stats(self.test_log_file, use_sidecar=False))
+
+    def test_non_finite_lines_are_skipped(self):
+        self.write_log([f"{self.recent(3)},100.0,50.0,inf,1,S1", f"{self.recent(2)},200.0,100.0,20.0,2,S2"])
+        self.assertEqual(self.model.get_stats()['count'], 1)
+        self.assertEqual(self.model.get_latest()['server_name'], 'S2')
+
+    def test_recent_results(self):
+        lines = [f"{self.recent(40 - i)},{i}.0,1.0,1.0,1,S{i}" for i in range(30)]
+        self.write_log(lines + [f"{self.recent(1)},99.0,1.0,1.0"])
+        recent = self.model.get_recent()
+        self.assertEqual(len(recent), speed_http_server.RECENT_TESTS)
+        self.assertEqual(recent, speed_utils.get_recent_speedtests(self.test_log_file, len(recent)))
+        self.assertEqual(self.model.get_latest()['download'], 99.0)
+
+    def test_plot_data_matches_log_scan(self):
+        self.write_log([
+            "2000-01-01T00:00:00,10.0,1.0,1.0,1,Old",
+            f"{self.recent(5)},100.0,50.0,10.0,1,S1",
+            f"{self.recent(1)},200.0,100.0,20.0,2,S2",
+        ])
+        self.assertEqual(self.model.get_plot_data(),
+                         speed_utils.get_plot_data(self.test_log_file))
+        # History older than the largest plot window only counts towards the averages
+        self.assertEqual(len(self.model.dates), 2)
+
+    def test_first_load_uses_sidecars(self):
+        lines = [f"{self.recent(60 - i)},{100 + i}.0,{i}.0,{i % 7}.0,{i % 3},S{i % 3}" for i in range(50)]
+        self.write_log(lines[:40] + ["garbage line"] + lines[40:])
+        for vectorize in (False, True):
+            with self.subTest(vectorize=vectorize), \
+                    patch.object(speed_utils, 'VECTOR_MIN_BYTES', 0 if vectorize else float('inf')):
+                model = speed_http_server.LogModel(self.test_log_file)
+                with patch.object(model, '_ingest') as ingest:
+                    self.assertEqual(model.get_stats(), speed_utils.calculate_stats(self.test_log_file))
+                ingest.assert_not_called()
+                self.assertEqual(model.get_plot_data(), speed_utils.get_plot_data(self.test_log_file))
+                self.assertEqual(model.get_recent(), speed_utils.get_recent_speedtests(
+                    self.test_log_file, speed_http_server.RECENT_TESTS))
+
+                # Later lines are tailed as before
+                self.write_log([f"{self.recent(1)},300.0,30.0,3.0,1,S1"])
+                self.assertEqual(model.get_stats(), speed_utils.calculate_stats(self.test_log_file))
+                self.assertEqual(model.get_latest()['download'], 300.0)
+                self.assertEqual(model.get_plot_data(), speed_utils.get_plot_data(self.test_log_file))
+
+    def test_detects_rotation(self):
+        self.write_log([f"{self.recent(3)},100.0,50.0,10.0,1,S1",
+                        f"{self.recent(2)},200.0,100.0,20.0,2,S2"])
+        self.assertEqual(self.model.get_stats()['count'], 2)
+
+        os.rename(self.test_log_file, self.test_log_file + '.1')
+        self.write_log([f"{self.recent(1)},30.0,10.0,5.0,3,S3"])
+        stats = self.model.get_stats()
+        self.assertEqual(stats['count'], 1)
+        self.assertEqual(stats['avg_dl'], 30.0)
+        self.assertEqual(len(self.model.get_plot_data()['dates']), 1)
+
+    def test_includes_compacted_history(self):
+        self.write_log([f"{self.recent(5)},100.0,50.0,10.0,1,S1",
+                        f"{self.recent(4)},200.0,100.0,20.0,2,S2"])
+        self.assertEqual(self.model.get_stats()['count'], 2)
+        speed_utils.rotate_log(self.test_log_file)
+        speed_utils.compact_log_segments(self.test_log_file)
+        self.write_log([f"{self.recent(1)},30.0,10.0,5.0,3,S3"])
+
+        stats = self.model.get_stats()
+        self.assertEqual(stats, speed_utils.calculate_stats(self.test_log_file))
+        self.assertEqual(stats['count'], 3)
+        data = self.model.get_plot_data()
+        self.assertEqual(len(data['dates']), 3)
+        self.assertAlmostEqual(data['avg_downloads'][-1], 110.0)
+
+
+class TestDashboardRoutes(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.test_log_file = os.path.join(self.tmpdir.name, 'speed_log.txt')
+        now = datetime.datetime.now()
+        with open(self.test_log_file, 'w') as f:
+            for hours_ago, dl in ((3, 100.0), (2, 200.0)):
+                ts = (now - datetime.timedelta(hours=hours_ago)).isoformat()
+                f.write(f"{ts},{dl},50.0,10.0,1,S1\n")
+
+        self.model = speed_http_server.LogModel(self.test_log_file)
+        self.plot_cache = speed_http_server.PlotCache(self.model)
+        patchers = [
+            patch.object(speed_http_server, 'LOG_FILE', self.test_log_file),
+            patch.object(speed_http_server, 'MODEL', self.model),
+            patch.object(speed_http_server, 'PLOT_CACHE', self.plot_cache),
+            patch.object(speed_http_server, 'INGEST_DIR', os.path.join(self.tmpdir.name, 'probes')),
+            patch.object(speed_http_server, 'INGEST_TOKEN', 'secret'),
+            patch.object(speed_http_server, 'INGEST_BUFFER', speed_http_server.IngestBuffer(
+                os.path.join(self.tmpdir.name, 'probes'), flush_interval=0.05)),
+            patch.object(speed_http_server, 'PROBES', {}),
+            patch.object(speed_http_server, 'EVENT_HUBS', {}),
+            patch.object(speed_http_server, 'RESPONSE_CACHE', speed_http_server.ResponseCache()),
+            patch.object(speed_http_server, 'EVENT_POLL_INTERVAL', 0.05),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.httpd = speed_http_server.PooledHTTPServer(
+            ('127.0.0.1', 0), speed_http_server.SpeedHTTPRequestHandler, workers=1, queue_limit=1)
+        self.httpd.RequestHandlerClass.log_message = lambda *args: None
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.tmpdir.cleanup()
+
+    def request(self, path, headers=None, method='GET', body=None):
+        conn = http.client.HTTPConnection('127.0.0.1', self.httpd.server_address[1])
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        body = response.read()
+        conn.close()
+        return response, body
+
+    def test_main_page_links_plot(self):
+        response, body = self.request('/')
+        self.assertEqual(response.status, 200)
+        self.assertIn(b"data-src='/plot.svg?days=30'", body)
+        self.assertIn(b'<svg xmlns=', body)
+        self.assertNotIn(b'base64', body)
+        self.assertIn(b'Per-Server Statistics', body)
+        self.assertIn(b'Recent Tests', body)
+
+    def test_plot_is_cached_and_revalidated(self):
+        with patch.object(speed_http_server, 'render_svg', wraps=speed_http_server.render_svg) as render:
+            response, body = self.request('/plot.svg')
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.getheader('Content-type'), 'image/svg+xml')
+            self.assertTrue(body.startswith(b'<svg '))
+            etag = response.getheader('ETag')
+
+            response, body = self.request('/plot.svg', {'If-None-Match': etag})
+            self.assertEqual(response.status, 304)
+            self.assertEqual(render.call_count, 1)
+
+            with open(self.test_log_file, 'a') as f:
+                f.write(f"{datetime.datetime.now().isoformat()},300.0,50.0,10.0,1,S1\n")
+            response, body = self.request('/plot.svg', {'If-None-Match': etag})
+            self.assertEqual(response.status, 200)
+            self.assertEqual(render.call_count, 2)
+
+    def test_png_plot_redirects_to_svg(self):
+        response, body = self.request('/plot.png?days=7')
+        self.assertEqual(response.status, 301)
+        self.assertEqual(response.getheader('Location'), '/plot.svg?days=7')
+
+    def test_api_stats_and_latest(self):
+        response, body = self.request('/api/stats')
+        self.assertEqual(response.getheader('Content-type'), 'application/json')
+        stats = json.loads(body)
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['avg_dl'], 150.0)
+
+        response, body = self.request('/api/latest')
+        self.assertEqual(json.loads(body)['download'], 200.0)
+
+    def test_conditional_requests_and_gzip(self):
+        with patch.object(speed_http_server.SpeedHTTPRequestHandler, '_generate_html',
+                          autospec=True, side_effect=speed_http_server.SpeedHTTPRequestHandler._generate_html) as render:
+            response, body = self.request('/', {'Accept-Encoding': 'gzip, deflate'})
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.getheader('Content-Encoding'), 'gzip')
+            self.assertEqual(int(response.getheader('Content-Length')), len(body))
+            html = gzip.decompress(body)
+            self.assertIn(b'Recent Tests', html)
+            etag = response.getheader('ETag')
+            last_modified = response.getheader('Last-Modified')
+
+            response, body = self.request('/')
+            self.assertIsNone(response.getheader('Content-Encoding'))
+            self.assertEqual(body, html)
+            self.assertNotEqual(response.getheader('ETag'), etag)
+
+            for headers in ({'If-None-Match': etag}, {'If-None-Match': response.getheader('ETag')},
+                            {'If-Modified-Since': last_modified}):
+                response, body = self.request('/', headers)
+                self.assertEqual(response.status, 304)
+                self.assertEqual(body, b'')
+            self.assertEqual(render.call_count, 1)
+
+            with open(self.test_log_file, 'a') as f:
+                f.write(f"{datetime.datetime.now().isoformat()},300.0,50.0,10.0,1,S1\n")
+            response, body = self.request('/', {'If-None-Match': etag, 'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.status, 200)
+            self.assertEqual(render.call_count, 2)
+
+        response, body = self.request('/api/stats', {'If-Modified-Since': 'Thu, 01 Jan 1970 00:00:00 GMT'})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(json.loads(body)['count'], 3)
+
+    def test_keep_alive(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self.httpd.server_address[1])
+        self.addCleanup(conn.close)
+        for path in ('/', '/api/history', '/api/stats', '/nonexistent', '/api/latest'):
+            conn.request('GET', path)
+            response = conn.getresponse()
+            body = response.read()
+            self.assertFalse(response.will_close, path)
+            if path == '/api/history':
+                self.assertEqual(response.getheader('Transfer-Encoding'), 'chunked')
+                self.assertEqual(len(json.loads(body)['results']), 2)
+            else:
+                self.assertEqual(int(response.getheader('Content-Length')), len(body))
+        self.assertEqual(json.loads(body)['download'], 200.0)
+
+    def test_api_history(self):
+        response, body = self.request('/api/history')
+        results = json.loads(body)['results']
+        self.assertEqual([r['download'] for r in results], [100.0, 200.0])
+
+        response, body = self.request('/api/history?limit=1')
+        self.assertEqual(len(json.loads(body)['results']), 1)
+
+        start = (datetime.datetime.now() - datetime.timedelta(hours=2, minutes=30)).isoformat()
+        response, body = self.request(f'/api/history?from={start}')
+        self.assertEqual([r['download'] for r in json.loads(body)['results']], [200.0])
+
+        response, body = self.request('/api/history?step=86400000')
+        results = json.loads(body)['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['count'], 2)
+        self.assertEqual(results[0]['download'], 150.0)
+
+        response, body = self.request('/api/history?limit=abc')
+        self.assertEqual(response.status, 400)
+        for value in ('inf', 'nan', '1e300'):
+            response, body = self.request(f'/api/history?from={value}')
+            self.assertEqual(response.status, 400)
+
+        start = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=2, minutes=30))
+        response, body = self.request(f"/api/history?from={start.strftime('%Y-%m-%dT%H:%M:%S')}Z")
+        self.assertEqual([r['download'] for r in json.loads(body)['results']], [200.0])
+
+    def read_event(self, response):
+        lines = []
+        while True:
+            line = response.fp.readline().decode('utf-8').rstrip('\n')
+            if not line:
+                return lines
+            lines.append(line)
+
+    def test_events_stream_new_results(self):
+        streams = []
+        for _ in range(3):
+            conn = http.client.HTTPConnection('127.0.0.1', self.httpd.server_address[1], timeout=5)
+            conn.request('GET', '/events')
+            response = conn.getresponse()
+            self.assertEqual(response.status, 200)
+            self.assertEqual(response.getheader('Content-type'), 'text/event-stream')
+            self.assertEqual(self.read_event(response), ['retry: 5000'])
+            streams.append((conn, response))
+        self.addCleanup(lambda: [conn.close() for conn, response in streams])
+
+        # Subscribers don't occupy the single worker thread
+        response, body = self.request('/api/stats')
+        self.assertEqual(response.status, 200)
+
+        with open(self.test_log_file, 'a') as f:
+            f.write(f"{datetime.datetime.now().isoformat()},300.0,60.0,5.0,2,S2\n")
+        for conn, response in streams:
+            event = self.read_event(response)
+            self.assertEqual(event[0], 'event: result')
+            data = json.loads(event[1][len('data: '):])
+            self.assertEqual(data['result']['download'], 300.0)
+            self.assertEqual(data['result']['server_name'], 'S2')
+            self.assertEqual(data['stats']['count'], 3)
+
+        hub = speed_http_server.get_event_hub(self.model)
+        self.assertEqual(len(hub._subscribers), 3)
+
+    def test_main_page_subscribes_to_events(self):
+        response, body = self.request('/')
+        self.assertIn(b'new EventSource("/events")', body)
+        self.assertIn(b"data-stat='avg_dl'", body)
+        self.assertIn(b"data-latest='download'", body)
+
+    def test_metrics(self):
+        self.request('/')
+        self.request('/plot.svg')
+        self.request('/plot.svg')
+        response, body = self.request('/metrics')
+        self.assertEqual(response.status, 200)
+        self.assertTrue(response.getheader('Content-type').startswith('text/plain; version=0.0.4'))
+        text = body.decode('utf-8')
+        self.assertIn('speed_http_responses_total{route="/",code="200"}', text)
+        self.assertIn('speed_http_request_duration_seconds_count{route="/plot.svg"}', text)
+        self.assertIn('speed_cache_requests_total{cache="plot_svg",result="hit"}', text)
+        self.assertIn('speed_function_duration_seconds_count{function="render_html"}', text)
+        self.assertIn('speed_log_lines_parsed_total{reader="model"}', text)
+        self.assertIn('speed_latest_download_mbps{probe="local"} 200', text)
+
+    def ingest(self, payload, token='secret'):
+        return self.request('/ingest', {'Authorization': f'Bearer {token}'}, 'POST', json.dumps(payload))
+
+    def test_ingest_requires_token(self):
+        payload = {'probe_id': 'probe-1', 'results': []}
+        response, body = self.ingest(payload, token='wrong')
+        self.assertEqual(response.status, 401)
+        with patch.object(speed_http_server, 'INGEST_TOKEN', None):
+            response, body = self.ingest(payload)
+        self.assertEqual(response.status, 403)
+
+    def test_ingest_rejects_invalid_batches(self):
+        ts = datetime.datetime.now().isoformat()
+        for payload in ({'probe_id': '../etc', 'results': []},
+                        {'probe_id': 'p1', 'results': [{'timestamp': ts, 'download': 'fast'}]},
+                        {'probe_id': 'p1', 'results': [{'timestamp': ts, 'download': 'inf',
+                                                        'upload': 1.0, 'ping': 1.0}]},
+                        {'results': []}):
+            response, body = self.ingest(payload)
+            self.assertEqual(response.status, 400)
+        self.assertEqual(speed_http_server.list_probes(), [])
+
+    def test_ingest_checks_content_length(self):
+        for length, status in ((None, 411), ('0', 400), ('abc', 400),
+                               (str(speed_http_server.MAX_INGEST_BYTES + 1), 413)):
+            conn = http.client.HTTPConnection('127.0.0.1', self.httpd.server_address[1])
+            conn.putrequest('POST', '/ingest')
+            conn.putheader('Authorization', 'Bearer secret')
+            if length is not None:
+                conn.putheader('Content-Length', length)
+            conn.endheaders()
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+            self.assertEqual(response.status, status, length)
+
+    def test_ingested_results_are_served_per_probe(self):
+        now = datetime.datetime.now()
+        results = [{'timestamp': (now - datetime.timedelta(hours=h)).isoformat(), 'download': dl,
+                    'upload': 20.0, 'ping': 5.0, 'server_id': 7, 'server_name': 'Remote,\nServer'}
+                   for h, dl in ((2, 40.0), (1, 60.0))]
+        response, body = self.ingest({'probe_id': 'probe-1', 'results': results})
+        self.assertEqual(response.status, 200)
+        self.assertEqual(json.loads(body), {'accepted': 2})
+
+        response, body = self.request('/api/stats?probe=probe-1')
+        stats = json.loads(body)
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['avg_dl'], 50.0)
+        response, body = self.request('/api/latest?probe=probe-1')
+        self.assertEqual(json.loads(body)['server_name'], 'Remote Server')
+
+        # The local log is unaffected and the page links to the probe
+        response, body = self.request('/api/stats')
+        self.assertEqual(json.loads(body)['count'], 2)
+        self.assertEqual(json.loads(body)['avg_dl'], 150.0)
+        response, body = self.request('/')
+        self.assertIn(b"href='/?probe=probe-1'", body)
+        response, body = self.request('/?probe=probe-1')
+        self.assertIn(b"data-src='/plot.svg?days=30&amp;probe=probe-1'", body)
+
+        response, body = self.request('/api/stats?probe=missing')
+        self.assertEqual(response.status, 404)
+
+    def test_ingest_converts_aware_timestamps(self):
+        aware = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=1)
+        results = [{'timestamp': aware.isoformat(), 'download': 40.0, 'upload': 20.0, 'ping': 5.0},
+                   {'timestamp': aware.strftime('%Y-%m-%dT%H:%M:%S') + 'Z', 'download': 60.0,
+                    'upload': 20.0, 'ping': 5.0}]
+        response, body = self.ingest({'probe_id': 'probe-1', 'results': results})
+        self.assertEqual(response.status, 200)
+
+        response, body = self.request('/api/latest?probe=probe-1')
+        latest = datetime.datetime.fromisoformat(json.loads(body)['timestamp'])
+        self.assertIsNone(latest.tzinfo)
+        self.assertAlmostEqual(latest.timestamp(), aware.timestamp(), delta=1)
+        response, body = self.request('/plot.svg?probe=probe-1')
+        self.assertEqual(response.status, 200)
+        response, body = self.request('/?probe=probe-1')
+        self.assertEqual(response.status, 200)
+
+    def test_refuses_connections_beyond_pool(self):
+        # Occupy the worker and the queue slot with clients that never send a request
+        idle = [socket.create_connection(('127.0.0.1', self.httpd.server_address[1]))
+                for _ in range(2)]
+        try:
+            response, body = self.request('/')
+            self.assertEqual(response.status, 503)
+        finally:
+            for sock in idle:
+                sock.close()
+
+        # Once the worker is free again, requests are served
+        for _ in range(50):
+            response, body = self.request('/')
+            if response.status == 200:
+                break
+            time.sleep(0.05)
+        self.assertEqual(response.status, 200)
+
+if __name__ == '__main__':
+    unittest.main()
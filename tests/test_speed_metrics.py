@@ -0,0 +1,64 @@
+import unittest
+import sys
+import os
+
+# Append parent directory to path to import speed_metrics
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import speed_metrics
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        # Metrics register themselves globally; keep the test ones out of REGISTRY
+        self.registry = list(speed_metrics.REGISTRY)
+        self.addCleanup(lambda: speed_metrics.REGISTRY.__setitem__(slice(None), self.registry))
+
+    def test_counter_and_gauge(self):
+        counter = speed_metrics.Counter('test_requests_total', 'Requests.', ['route'])
+        gauge = speed_metrics.Gauge('test_speed_mbps', 'Speed.')
+        counter.inc(route='/')
+        counter.inc(2, route='/')
+        counter.inc(route='/say "hi"')
+        gauge.set(12.5)
+
+        text = speed_metrics.render([counter, gauge])
+        self.assertEqual(text.splitlines(), [
+            '# HELP test_requests_total Requests.',
+            '# TYPE test_requests_total counter',
+            'test_requests_total{route="/"} 3',
+            'test_requests_total{route="/say \\"hi\\""} 1',
+            '# HELP test_speed_mbps Speed.',
+            '# TYPE test_speed_mbps gauge',
+            'test_speed_mbps 12.5',
+        ])
+        with self.assertRaises(ValueError):
+            counter.inc(path='/')
+
+    def test_histogram(self):
+        histogram = speed_metrics.Histogram('test_seconds', 'Latency.', ['function'], buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            histogram.observe(value, function='f')
+
+        text = speed_metrics.render([histogram])
+        self.assertIn('test_seconds_bucket{function="f",le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{function="f",le="1.0"} 3', text)
+        self.assertIn('test_seconds_bucket{function="f",le="+Inf"} 4', text)
+        self.assertIn('test_seconds_sum{function="f"} 6.05', text)
+        self.assertIn('test_seconds_count{function="f"} 4', text)
+
+    def test_timer_decorates_functions(self):
+        histogram = speed_metrics.Histogram('test_call_seconds', 'Calls.', ['function'])
+
+        @histogram.time(function='double')
+        def double(x):
+            return 2 * x
+
+        self.assertEqual(double(2), 4)
+        with histogram.time(function='block'):
+            double(3)
+        text = speed_metrics.render([histogram])
+        self.assertIn('test_call_seconds_count{function="double"} 2', text)
+        self.assertIn('test_call_seconds_count{function="block"} 1', text)
+
+if __name__ == '__main__':
+    unittest.main()
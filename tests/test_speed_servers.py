@@ -0,0 +1,147 @@
+import unittest
+from unittest.mock import patch
+import sys
+import os
+import json
+import socket
+import tempfile
+
+# Append parent directory to path to import speed_servers
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import speed_servers
+
+SERVERS = [
+    {'id': 1, 'name': 'Partner', 'location': 'Tel Aviv', 'host': 'speedtest.partner.co.il:8080'},
+    {'id': 2, 'name': 'Bezeq International', 'location': 'Petah Tikva', 'host': 'bezeqint.net:8080'},
+    {'id': 3, 'name': 'Bezeq', 'location': 'Tel Aviv', 'host': 'speed.bezeq.co.il:8080'},
+]
+
+class TestServerIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = speed_servers.ServerIndex(SERVERS)
+
+    def ids(self, term):
+        return [server['id'] for server in self.index.search(term)]
+
+    def test_exact_token_beats_prefix(self):
+        self.assertEqual(self.ids('bezeq'), [3, 2])
+        self.assertEqual(self.ids('Bezeq Tel Aviv'), [3])
+
+    def test_prefix_and_substring(self):
+        self.assertEqual(self.ids('Petah'), [2])
+        self.assertEqual(self.ids('Pet'), [2])
+        # Plain substring matching of the whole query is kept
+        self.assertEqual(self.ids('eq intern'), [2])
+
+    def test_fuzzy(self):
+        self.assertEqual(self.ids('Parnter'), [1])
+        self.assertEqual(self.ids('Nonexistent'), [])
+
+    def test_best_matches(self):
+        self.assertEqual([s['id'] for s in self.index.best_matches('tel aviv')], [1, 3])
+        self.assertEqual([s['id'] for s in self.index.best_matches('bezeq')], [3])
+        self.assertEqual(self.index.best_matches('Nonexistent'), [])
+
+    def test_round_trip(self):
+        restored = speed_servers.ServerIndex.from_dict(json.loads(json.dumps(self.index.to_dict())))
+        self.assertEqual([s['id'] for s in restored.search('tel aviv')],
+                         [s['id'] for s in self.index.search('tel aviv')])
+
+
+class TestServerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmpdir.name, 'cache', 'servers.json')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    @patch('subprocess.run')
+    def test_warm_cache_spawns_nothing(self, mock_run):
+        mock_run.return_value.returncode = 0
+        mock_run.return_value.stdout = json.dumps({'servers': SERVERS})
+
+        index = speed_servers.load_server_index('speedtest', self.cache_file)
+        self.assertEqual(len(index.servers), 3)
+        index = speed_servers.load_server_index('speedtest', self.cache_file)
+        self.assertEqual([s['id'] for s in index.search('bezeq')], [3, 2])
+        self.assertEqual(mock_run.call_count, 1)
+
+        speed_servers.load_server_index('speedtest', self.cache_file, refresh=True)
+        self.assertEqual(mock_run.call_count, 2)
+
+        speed_servers.load_server_index('speedtest', self.cache_file, ttl=0)
+        self.assertEqual(mock_run.call_count, 3)
+
+    @patch('subprocess.run')
+    def test_failed_listing_is_not_cached(self, mock_run):
+        mock_run.return_value.returncode = 1
+        with patch('sys.stdout'):
+            self.assertIsNone(speed_servers.load_server_index('speedtest', self.cache_file))
+        self.assertFalse(os.path.exists(self.cache_file))
+
+class TestLatencyRanking(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache_file = os.path.join(self.tmpdir.name, 'latency.json')
+        # A listening socket completes TCP handshakes without ever calling accept()
+        self.listeners = []
+        for _ in range(2):
+            listener = socket.socket()
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(16)
+            self.listeners.append(listener)
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        closed_port = closed.getsockname()[1]
+        closed.close()
+        self.servers = [
+            {'id': 10, 'name': 'Down', 'host': f'127.0.0.1:{closed_port}'},
+            {'id': 11, 'name': 'Up A', 'host': f'localhost:{self.listeners[0].getsockname()[1]}'},
+            {'id': 12, 'name': 'Up B', 'host': f'127.0.0.1:{self.listeners[1].getsockname()[1]}'},
+        ]
+
+    def tearDown(self):
+        for listener in self.listeners:
+            listener.close()
+        self.tmpdir.cleanup()
+
+    def test_split_host(self):
+        self.assertEqual(speed_servers.split_host('speed.bezeq.co.il:8080'), ('speed.bezeq.co.il', 8080))
+        self.assertEqual(speed_servers.split_host('[2001:db8::1]:5060'), ('2001:db8::1', 5060))
+        self.assertEqual(speed_servers.split_host('2001:db8::1'), ('2001:db8::1', 8080))
+        self.assertEqual(speed_servers.split_host('example.com'), ('example.com', 8080))
+
+    def test_ranks_responsive_servers(self):
+        latencies = speed_servers.measure_latencies(self.servers, timeout=2, attempts=2)
+        self.assertIsNone(latencies['10'])
+        self.assertGreater(latencies['11'], 0)
+
+        ranked = speed_servers.rank_servers(self.servers, timeout=2)
+        self.assertEqual(sorted(server['id'] for latency, server in ranked), [11, 12])
+        self.assertLessEqual(ranked[0][0], ranked[1][0])
+
+    def test_ranking_is_cached(self):
+        fake = {'10': None, '11': 5.0, '12': 2.0}
+        with patch.object(speed_servers, 'measure_latencies', return_value=fake) as measure:
+            ranked = speed_servers.rank_servers(self.servers, self.cache_file)
+            self.assertEqual([(latency, server['id']) for latency, server in ranked], [(2.0, 12), (5.0, 11)])
+            self.assertEqual(speed_servers.rank_servers(self.servers, self.cache_file), ranked)
+            self.assertEqual(measure.call_count, 1)
+
+            # Another candidate set, an expired entry or a refresh measure again
+            speed_servers.rank_servers(self.servers[1:], self.cache_file)
+            speed_servers.rank_servers(self.servers, self.cache_file, ttl=0)
+            speed_servers.rank_servers(self.servers, self.cache_file, refresh=True)
+            self.assertEqual(measure.call_count, 4)
+
+        with patch.object(speed_servers, 'measure_latencies', return_value=dict.fromkeys(fake)) as measure:
+            self.assertEqual(speed_servers.rank_servers(self.servers[:1], self.cache_file), [])
+            speed_servers.rank_servers(self.servers[:1], self.cache_file)
+            self.assertEqual(measure.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
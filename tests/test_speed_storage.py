@@ -0,0 +1,82 @@
+import unittest
+import sys
+import os
+import datetime
+import tempfile
+
+# Append parent directory to path to import speed_storage
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import speed_storage
+import speed_utils
+
+class TestStorageBackends(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmpdir.name, 'speed_log.txt')
+        self.db = speed_storage.SQLiteBackend(os.path.join(self.tmpdir.name, 'speed_log.db'))
+        self.text = speed_storage.TextLogBackend(self.log_file)
+        self.now = datetime.datetime.now().replace(microsecond=0)
+        with open(self.log_file, 'w') as f:
+            for h in range(48, 0, -1):
+                ts = (self.now - datetime.timedelta(hours=h)).isoformat()
+                f.write(f"{ts},{100.0 + h},{h / 2},{h % 7}.0,{h % 2},S{h % 2}\n")
+                if h == 24:
+                    f.write("garbage line\n")
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def test_import_is_idempotent(self):
+        self.assertEqual(speed_storage.import_text_log(self.log_file, self.db), 48)
+        self.assertEqual(speed_storage.import_text_log(self.log_file, self.db), 0)
+
+    def test_backends_agree(self):
+        speed_storage.import_text_log(self.log_file, self.db)
+        self.assertEqual(self.db.latest(), self.text.latest())
+        self.assertEqual(self.db.recent(5), self.text.recent(5))
+        self.assertEqual(len(self.db.recent(100)), 48)
+        self.assertEqual(self.db.aggregate(), self.text.aggregate())
+        self.assertEqual(self.db.aggregate_by_server(), self.text.aggregate_by_server())
+        self.assertEqual(self.db.plot_data(days=1), self.text.plot_data(days=1))
+
+        start = self.now - datetime.timedelta(hours=10)
+        end = self.now - datetime.timedelta(hours=5)
+        self.assertEqual(list(self.db.range(start, end)), list(self.text.range(start, end)))
+        self.assertEqual(len(list(self.db.range(start, end))), 5)
+        self.assertEqual(self.db.aggregate(start, end), self.text.aggregate(start, end))
+
+    def test_append(self):
+        record = speed_utils.LogRecord(self.now, 10.0, 5.0, 1.0, '9', 'New, Server')
+        for backend in (self.db, self.text):
+            backend.append(record)
+            latest = backend.latest()
+            self.assertEqual(latest['download'], 10.0)
+            self.assertEqual(latest['timestamp'], self.now.isoformat())
+
+    def test_wal_and_indexes(self):
+        mode = self.db.conn.execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode, 'wal')
+        plan = ' '.join(row[-1] for row in self.db.conn.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM results WHERE timestamp >= ? ORDER BY timestamp', (0,)))
+        self.assertIn('idx_results_unique', plan)
+
+    def test_rows_without_server_id_are_not_duplicated(self):
+        ts = self.now.isoformat()
+        with open(self.log_file, 'a') as f:
+            f.write(f"{ts},10.0,5.0,1.0\n{ts},11.0,5.0,1.0,7\n")
+        self.assertEqual(speed_storage.import_text_log(self.log_file, self.db), 50)
+        self.assertEqual(speed_storage.import_text_log(self.log_file, self.db), 0)
+        self.assertEqual(self.db.aggregate()['count'], 50)
+
+    def test_incomplete_backend_cannot_be_created(self):
+        class AppendOnly(speed_storage.StorageBackend):
+            def append(self, record):
+                pass
+
+        with self.assertRaises(TypeError):
+            AppendOnly()
+
+if __name__ == '__main__':
+    unittest.main()
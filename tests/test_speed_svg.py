@@ -0,0 +1,65 @@
+import unittest
+import sys
+import os
+import datetime
+import itertools
+import xml.etree.ElementTree as ET
+
+# Append parent directory to path to import speed_svg
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import speed_svg
+
+SVG_NS = '{http://www.w3.org/2000/svg}'
+
+def plot_data(count):
+    start = datetime.datetime(2025, 1, 1)
+    dates = [start + datetime.timedelta(hours=i) for i in range(count)]
+    downloads = [100.0 + (i % 7) * 10 for i in range(count)]
+    uploads = [20.0 + (i % 3) for i in range(count)]
+    return {
+        'dates': dates,
+        'downloads': downloads,
+        'uploads': uploads,
+        'avg_downloads': [total / (i + 1) for i, total in enumerate(itertools.accumulate(downloads))],
+        'avg_uploads': [total / (i + 1) for i, total in enumerate(itertools.accumulate(uploads))],
+    }
+
+class TestRenderSvg(unittest.TestCase):
+
+    def test_renders_axes_legend_and_series(self):
+        svg = speed_svg.render_svg(plot_data(50), days=7)
+        root = ET.fromstring(svg)
+        self.assertEqual(root.tag, SVG_NS + 'svg')
+        texts = [t.text for t in root.iter(SVG_NS + 'text')]
+        for label in ('Internet Speed History (Last 7 Days)', 'Date and Time', 'Measured Speed (Mbps)',
+                      'Historical Average Speed (Mbps)', 'Measured Download', 'Avg Upload (Cumulative)'):
+            self.assertIn(label, texts)
+        self.assertIn('2025-01-01 00:00', texts)
+
+        lines = list(root.iter(SVG_NS + 'polyline'))
+        self.assertEqual(len(lines), 4)
+        for line in lines:
+            points = [tuple(map(float, p.split(','))) for p in line.get('points').split()]
+            self.assertEqual(len(points), 50)
+            for x, y in points:
+                self.assertTrue(speed_svg.MARGIN_LEFT <= x <= speed_svg.SVG_WIDTH - speed_svg.MARGIN_RIGHT)
+                self.assertTrue(speed_svg.MARGIN_TOP <= y <= speed_svg.SVG_HEIGHT - speed_svg.MARGIN_BOTTOM)
+
+    def test_downsamples_to_plot_width(self):
+        svg = speed_svg.render_svg(plot_data(20000))
+        plot_width = speed_svg.SVG_WIDTH - speed_svg.MARGIN_LEFT - speed_svg.MARGIN_RIGHT
+        for line in ET.fromstring(svg).iter(SVG_NS + 'polyline'):
+            self.assertLessEqual(len(line.get('points').split()), plot_width + 2)
+
+    def test_single_point_and_empty_data(self):
+        self.assertIsNone(speed_svg.render_svg(None))
+        self.assertIsNone(speed_svg.render_svg(plot_data(0)))
+        svg = speed_svg.render_svg(plot_data(1))
+        self.assertEqual(len(list(ET.fromstring(svg).iter(SVG_NS + 'polyline'))), 4)
+
+    def test_nice_ticks(self):
+        self.assertEqual(speed_svg.nice_ticks(170), [0, 50, 100, 150, 200])
+        self.assertEqual(speed_svg.nice_ticks(0), [0, 0.2, 0.4, 0.6, 0.8, 1.0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,504 @@
+import unittest
+import sys
+import os
+import json
+import math
+import datetime
+import importlib.util
+import tempfile
+from unittest.mock import patch
+
+# Append parent directory to path to import speed_utils
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import speed_utils
+
+class TestCalculateStats(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.test_log_file = os.path.join(self.tmpdir.name, 'speed_log.txt')
+        self.sidecar_file = self.test_log_file + speed_utils.STATS_SIDECAR_SUFFIX
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_log(self, lines, mode='w'):
+        with open(self.test_log_file, mode) as f:
+            for line in lines:
+                f.write(line + "\n")
+
+    def test_stats_with_corrupt_data(self):
+        self.write_log([
+            "2025-01-01T12:00:00,100.0,50.0,10.0,1,S1",
+            "garbage line",
+            "2025-01-01T13:00:00,200.0,100.0,20.0,2,S2",
+        ])
+        stats = speed_utils.calculate_stats(self.test_log_file)
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['avg_dl'], 150.0)
+        self.assertEqual(stats['min_ul'], 50.0)
+        self.assertEqual(stats['max_ul'], 100.0)
+
+    def test_sidecar_only_parses_appended_lines(self):
+        self.write_log(["2025-01-01T12:00:00,100.0,50.0,10.0,1,S1"])
+        speed_utils.calculate_stats(self.test_log_file)
+        with open(self.sidecar_file) as f:
+            sidecar = json.load(f)
+        self.assertEqual(sidecar['offset'], os.path.getsize(self.test_log_file))
+
+        # Tamper with the persisted sums: an incremental pass must keep them
+        sidecar['stats']['total_dl'] = 1000.0
+        with open(self.sidecar_file, 'w') as f:
+            json.dump(sidecar, f)
+
+        self.write_log(["2025-01-01T13:00:00,200.0,100.0,20.0,2,S2"], mode='a')
+        stats = speed_utils.calculate_stats(self.test_log_file)
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['avg_dl'], 600.0)
+
+    def test_sidecar_detects_rewritten_log(self):
+        self.write_log(["2025-01-01T12:00:00,100.0,50.0,10.0,1,S1",
+                        "2025-01-01T13:00:00,200.0,100.0,20.0,2,S2"])
+        speed_utils.calculate_stats(self.test_log_file)
+
+        # Truncation
+        self.write_log(["2025-01-02T12:00:00,10.0,5.0,1.0,1,S1"])
+        stats = speed_utils.calculate_stats(self.test_log_file)
+        self.assertEqual(stats['count'], 1)
+        self.assertEqual(stats['avg_dl'], 10.0)
+
+        # Rewritten with a longer, different history
+        self.write_log(["2025-01-03T12:00:00,30.0,5.0,1.0,1,S1",
+                        "2025-01-03T13:00:00,50.0,5.0,1.0,1,S1"])
+        stats = speed_utils.calculate_stats(self.test_log_file)
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['avg_dl'], 40.0)
+
+    def test_partial_last_line_is_not_persisted(self):
+        self.write_log(["2025-01-01T12:00:00,100.0,50.0,10.0,1,S1"])
+        with open(self.test_log_file, 'a') as f:
+            f.write("2025-01-01T13:00:00,200.0,100.0,20.0")
+        stats = speed_utils.calculate_stats(self.test_log_file)
+        self.assertEqual(stats['count'], 2)
+        with open(self.sidecar_file) as f:
+            self.assertEqual(json.load(f)['stats']['count'], 1)
+
+        with open(self.test_log_file, 'a') as f:
+            f.write(",2,S2\n")
+        stats = speed_utils.calculate_stats(self.test_log_file)
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['avg_dl'], 150.0)
+
+    def test_non_finite_values_are_skipped(self):
+        self.write_log([
+            "2025-01-01T12:00:00,100.0,50.0,10.0,1,S1",
+            "2025-01-01T13:00:00,200.0,100.0,inf,2,S2",
+            "2025-01-01T14:00:00,nan,100.0,20.0,2,S2",
+            "2025-01-01T15:00:00,-Infinity,100.0,20.0,2,S2",
+        ])
+        stats = speed_utils.calculate_stats(self.test_log_file)
+        self.assertEqual(stats['count'], 1)
+        self.assertEqual(stats['avg_ping'], 10.0)
+        self.assertIsNone(speed_utils.parse_log_record("2025-01-01T13:00:00,200.0,100.0,inf,2,S2"))
+        self.assertIsNone(speed_utils.parse_plot_line("2025-01-01T14:00:00,nan,100.0,20.0"))
+        self.assertIsNone(speed_utils.parse_plot_line("2025-01-01T13:00:00,200.0,100.0,nan"))
+        # Large finite values are kept even where their sum would overflow
+        self.assertIsNotNone(speed_utils.parse_log_record("2025-01-01T13:00:00,1e308,1e308,1.0"))
+
+    def test_percentiles_survive_sidecar(self):
+        self.write_log([f"2025-01-01T12:00:00,{dl}.0,{dl / 2},{dl % 10}.0,1,S1" for dl in range(1, 101)])
+        stats = speed_utils.calculate_stats(self.test_log_file)
+        self.assertAlmostEqual(stats['p50_dl'], 50.0, delta=1.5)
+        self.assertAlmostEqual(stats['p95_dl'], 95.0, delta=1.5)
+        self.assertAlmostEqual(stats['p99_ul'], 49.5, delta=1.0)
+        self.assertAlmostEqual(stats['ping_stddev'], 2.872, places=2)
+
+        # The persisted sketch yields the same answer
+        self.assertEqual(speed_utils.calculate_stats(self.test_log_file), stats)
+
+    def test_server_stats(self):
+        self.write_log([
+            "2025-01-01T12:00:00,100.0,50.0,10.0,1,S1",
+            "2025-01-01T13:00:00,300.0,70.0,30.0,1,S1 renamed",
+            "2025-01-01T14:00:00,20.0,5.0,50.0,2,S2",
+            "2025-01-01T15:00:00,25.0,5.0,50.0",
+        ])
+        speed_utils.calculate_stats(self.test_log_file)
+        servers = speed_utils.calculate_server_stats(self.test_log_file)
+        self.assertEqual([s['server_id'] for s in servers], ['1', '2'])
+        self.assertEqual(servers[0]['count'], 2)
+        self.assertEqual(servers[0]['avg_dl'], 200.0)
+        self.assertEqual(servers[0]['min_dl'], 100.0)
+        self.assertEqual(servers[0]['server_name'], 'S1 renamed')
+        self.assertEqual(servers[0]['last_seen'], '2025-01-01T13:00:00')
+        self.assertEqual(servers[1]['avg_ping'], 50.0)
+
+    def test_server_stats_merge(self):
+        left = speed_utils.StatsAccumulator()
+        right = speed_utils.StatsAccumulator()
+        left.add(100.0, 50.0, 10.0, '1', 'S1', '2025-01-01T12:00:00')
+        right.add(50.0, 20.0, 30.0, '1', 'S1', '2025-01-02T12:00:00')
+        right.add(10.0, 20.0, 30.0, '2', 'S2', '2025-01-02T13:00:00')
+        left.merge(right)
+        servers = left.server_results()
+        self.assertEqual(servers[0]['count'], 2)
+        self.assertEqual(servers[0]['avg_dl'], 75.0)
+        self.assertEqual(servers[0]['last_seen'], '2025-01-02T12:00:00')
+        self.assertEqual(len(servers), 2)
+
+
+class TestQuantileSketch(unittest.TestCase):
+
+    def test_relative_error_and_merge(self):
+        values = [1.5 ** (i % 40) for i in range(1000)] + [0.0] * 10
+        whole = speed_utils.QuantileSketch()
+        left = speed_utils.QuantileSketch()
+        right = speed_utils.QuantileSketch()
+        for i, value in enumerate(values):
+            whole.add(value)
+            (left if i % 2 else right).add(value)
+        left.merge(right)
+
+        ordered = sorted(values)
+        for q in (0.0, 0.5, 0.95, 0.99, 1.0):
+            expected = ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+            self.assertAlmostEqual(whole.quantile(q), expected,
+                                   delta=expected * speed_utils.SKETCH_ACCURACY + 1e-9)
+            self.assertEqual(left.quantile(q), whole.quantile(q))
+
+        restored = speed_utils.QuantileSketch.from_dict(json.loads(json.dumps(whole.to_dict())))
+        self.assertEqual(restored.quantile(0.95), whole.quantile(0.95))
+
+    def test_empty(self):
+        self.assertIsNone(speed_utils.QuantileSketch().quantile(0.5))
+
+
+class TestLogIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.test_log_file = os.path.join(self.tmpdir.name, 'speed_log.txt')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_history(self, hours, mode='w'):
+        now = datetime.datetime.now()
+        with open(self.test_log_file, mode) as f:
+            for h in hours:
+                ts = (now - datetime.timedelta(hours=h)).isoformat()
+                f.write(f"{ts},{float(h)},{h / 2},1.0,1,S1\n")
+                if h % 7 == 0:
+                    f.write("garbage line\n")
+
+    def plot_data_without_index(self, days):
+        with patch.object(speed_utils, 'load_log_index', return_value={'entries': []}):
+            return speed_utils.get_plot_data(self.test_log_file, days)
+
+    def test_window_query_matches_full_scan(self):
+        self.write_history(range(24 * 60, 0, -1))
+        with patch.object(speed_utils, 'INDEX_STRIDE', 16):
+            for days in (1, 7, 30, 90):
+                self.assertEqual(speed_utils.get_plot_data(self.test_log_file, days),
+                                 self.plot_data_without_index(days))
+
+            # Appended records extend the existing index
+            self.write_history([0.5, 0.25], mode='a')
+            index = speed_utils.load_log_index(self.test_log_file)
+            self.assertEqual(index['count'], 24 * 60 + 2)
+            self.assertEqual(index['offset'], os.path.getsize(self.test_log_file))
+            self.assertEqual(speed_utils.get_plot_data(self.test_log_file, 2),
+                             self.plot_data_without_index(2))
+
+    def test_window_seek_skips_old_records(self):
+        self.write_history(range(24 * 60, 0, -1))
+        with patch.object(speed_utils, 'INDEX_STRIDE', 16):
+            speed_utils.load_log_index(self.test_log_file)
+            with patch.object(speed_utils, 'parse_plot_line',
+                              wraps=speed_utils.parse_plot_line) as parse:
+                speed_utils.get_plot_data(self.test_log_file, 1)
+            self.assertLess(parse.call_count, 24 + 2 * 16 + 10)
+
+    def test_iter_log_records_range(self):
+        self.write_history(range(48, 0, -1))
+        now = datetime.datetime.now()
+        records = list(speed_utils.iter_log_records(
+            self.test_log_file, now - datetime.timedelta(hours=10, minutes=30),
+            now - datetime.timedelta(hours=5, minutes=30)))
+        self.assertEqual([r.download for r in records], [10.0, 9.0, 8.0, 7.0, 6.0])
+
+class TestDownsample(unittest.TestCase):
+
+    def make_data(self, total):
+        start = datetime.datetime(2025, 1, 1)
+        downloads = [100.0 + (i % 5) for i in range(total)]
+        downloads[1234] = 1.0 # a short outage
+        return {
+            'dates': [start + datetime.timedelta(minutes=5 * i) for i in range(total)],
+            'downloads': downloads,
+            'uploads': [50.0] * total,
+            'avg_downloads': [100.0] * total,
+            'avg_uploads': [50.0] * total,
+        }
+
+    def test_small_data_is_untouched(self):
+        data = self.make_data(2000)
+        self.assertIs(speed_utils.downsample_plot_data(data, 5000), data)
+
+    def test_keeps_dips_and_order(self):
+        data = self.make_data(10000)
+        reduced = speed_utils.downsample_plot_data(data, 400)
+        self.assertLessEqual(len(reduced['dates']), 402)
+        self.assertIn(1.0, reduced['downloads'])
+        self.assertEqual(reduced['dates'], sorted(reduced['dates']))
+        self.assertEqual(reduced['dates'][0], data['dates'][0])
+        self.assertEqual(reduced['dates'][-1], data['dates'][-1])
+        self.assertEqual(len(set(len(series) for series in reduced.values())), 1)
+
+class TestRollups(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.test_log_file = os.path.join(self.tmpdir.name, 'speed_log.txt')
+        self.full_log_file = os.path.join(self.tmpdir.name, 'full_log.txt')
+        self.now = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write_history(self, hours):
+        for path in (self.test_log_file, self.full_log_file):
+            with open(path, 'a') as f:
+                for h in hours:
+                    ts = (self.now - datetime.timedelta(hours=h, minutes=-10)).isoformat()
+                    f.write(f"{ts},{100.0 + h},{h / 2},{h % 10}.0,{h % 3},S{h % 3}\n")
+
+    def test_stats_span_rollup_and_live_log(self):
+        self.write_history(range(200, 100, -1))
+        self.assertTrue(speed_utils.rotate_log(self.test_log_file))
+        self.write_history(range(100, 50, -1))
+        self.assertTrue(speed_utils.rotate_log(self.test_log_file))
+        self.assertEqual(len(speed_utils.list_log_segments(self.test_log_file)), 2)
+        self.assertEqual(speed_utils.compact_log_segments(self.test_log_file), 2)
+        self.assertEqual(speed_utils.list_log_segments(self.test_log_file), [])
+
+        # Only compacted history, no live log yet
+        stats = speed_utils.calculate_stats(self.test_log_file)
+        self.assertEqual(stats['count'], 150)
+
+        self.write_history(range(50, 0, -1))
+        stats = speed_utils.calculate_stats(self.test_log_file)
+        expected = speed_utils.calculate_stats(self.full_log_file)
+        for key in ('count', 'min_dl', 'max_dl', 'p50_dl', 'p95_ping'):
+            self.assertEqual(stats[key], expected[key])
+        self.assertAlmostEqual(stats['avg_dl'], expected['avg_dl'])
+        self.assertEqual(speed_utils.calculate_server_stats(self.test_log_file),
+                         speed_utils.calculate_server_stats(self.full_log_file))
+
+    def test_plot_uses_hourly_buckets(self):
+        self.write_history(range(100, 50, -1))
+        speed_utils.rotate_log(self.test_log_file)
+        speed_utils.compact_log_segments(self.test_log_file)
+        self.write_history(range(50, 0, -1))
+
+        # One result per hour, so hourly buckets reproduce the raw points exactly
+        data = speed_utils.get_plot_data(self.test_log_file, days=30)
+        expected = speed_utils.get_plot_data(self.full_log_file, days=30)
+        self.assertEqual(len(data['dates']), 100)
+        self.assertEqual(data['downloads'], expected['downloads'])
+        for got, want in zip(data['avg_downloads'], expected['avg_downloads']):
+            self.assertAlmostEqual(got, want)
+
+    def test_old_days_fall_back_to_daily_buckets(self):
+        self.write_history(range(24 * 5, 0, -1))
+        speed_utils.rotate_log(self.test_log_file)
+        speed_utils.compact_log_segments(self.test_log_file, hourly_days=2)
+
+        rollup = speed_utils.load_rollup(self.test_log_file)
+        self.assertTrue(all(hour[:10] >= rollup['hourly_since'] for hour in rollup['hourly']))
+        buckets = list(speed_utils.iter_rollup_buckets(rollup))
+        self.assertEqual(sum(b[1] for b in buckets), 24 * 5)
+        self.assertEqual([b[0] for b in buckets], sorted(b[0] for b in buckets))
+        self.assertLess(len(buckets), 24 * 5)
+
+class TestMultiLog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.probe_dir = os.path.join(self.tmpdir.name, 'probes')
+        os.mkdir(self.probe_dir)
+        self.combined_log_file = os.path.join(self.tmpdir.name, 'combined.txt')
+
+        # Interleave results from three probes, one per hour
+        now = datetime.datetime.now()
+        lines = {name: [] for name in ('a', 'b', 'c')}
+        combined = []
+        for hours_ago in range(60, 0, -1):
+            name = 'abc'[hours_ago % 3]
+            ts = (now - datetime.timedelta(hours=hours_ago)).isoformat()
+            line = f"{ts},{hours_ago * 2.0},{hours_ago * 1.0},{hours_ago % 7 + 1.0},{name},Server {name}"
+            lines[name].append(line)
+            combined.append(line)
+        lines['c'].append("garbage line")
+        for name, probe_lines in lines.items():
+            with open(os.path.join(self.probe_dir, f'{name}.txt'), 'w') as f:
+                f.write("\n".join(probe_lines) + "\n")
+        with open(self.combined_log_file, 'w') as f:
+            f.write("\n".join(combined) + "\n")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_expand_log_files(self):
+        pattern = os.path.join(self.probe_dir, '*')
+        speed_utils.calculate_stats(pattern)  # leaves sidecars next to each log
+        expected = [os.path.join(self.probe_dir, f'{name}.txt') for name in ('a', 'b', 'c')]
+        self.assertEqual(speed_utils.expand_log_files(pattern), expected)
+        self.assertEqual(speed_utils.expand_log_files([expected[0], pattern]), expected)
+        self.assertEqual(speed_utils.expand_log_files('missing.txt'), ['missing.txt'])
+        self.assertEqual(speed_utils.expand_log_files(os.path.join(self.probe_dir, '*.log')), [])
+
+    def test_merged_stats_match_combined_log(self):
+        pattern = os.path.join(self.probe_dir, '*.txt')
+        stats = speed_utils.calculate_stats(pattern)
+        expected = speed_utils.calculate_stats(self.combined_log_file)
+        self.assertEqual(stats['count'], 60)
+        for key, value in expected.items():
+            self.assertAlmostEqual(stats[key], value, msg=key)
+        self.assertEqual([s['server_id'] for s in speed_utils.calculate_server_stats(pattern)], ['a', 'b', 'c'])
+        self.assertIsNone(speed_utils.calculate_stats(os.path.join(self.probe_dir, '*.log')))
+
+    def test_merged_plot_data_matches_combined_log(self):
+        data = speed_utils.get_plot_data(os.path.join(self.probe_dir, '*.txt'), days=1)
+        expected = speed_utils.get_plot_data(self.combined_log_file, days=1)
+        self.assertEqual(data['dates'], expected['dates'])
+        self.assertEqual(data['downloads'], expected['downloads'])
+        for got, want in zip(data['avg_downloads'] + data['avg_uploads'],
+                             expected['avg_downloads'] + expected['avg_uploads']):
+            self.assertAlmostEqual(got, want)
+
+class TestRecentSpeedtests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmpdir.name, 'speed_log.txt')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, text):
+        with open(self.log_file, 'w') as f:
+            f.write(text)
+
+    def test_reverse_reader_crosses_blocks(self):
+        lines = [f"line {i} " + 'x' * (i % 13) for i in range(200)]
+        self.write("\n".join(lines) + "\n")
+        with open(self.log_file, 'rb') as f:
+            read = list(speed_utils.iter_lines_reverse(f, block_size=7))
+        self.assertEqual(read, [''] + lines[::-1])
+
+    def test_last_n_results_newest_first(self):
+        lines = [f"2025-01-01T{hour:02d}:00:00,{hour}.0,1.0,2.0,{hour},S{hour}" for hour in range(24)]
+        lines.insert(20, "garbage line")
+        self.write("\n".join(lines) + "\n")
+        with patch.object(speed_utils, 'REVERSE_BLOCK_SIZE', 16):
+            recent = speed_utils.get_recent_speedtests(self.log_file, 5)
+        self.assertEqual([r['download'] for r in recent], [23.0, 22.0, 21.0, 20.0, 19.0])
+        self.assertEqual(recent[0]['server_name'], 'S23')
+        self.assertEqual(len(speed_utils.get_recent_speedtests(self.log_file, 100)), 24)
+        self.assertEqual(speed_utils.get_recent_speedtests(self.log_file, 0), [])
+        self.assertEqual(speed_utils.get_recent_speedtests(self.log_file + '.missing', 3), [])
+
+    def test_latest_tolerates_short_and_partial_lines(self):
+        self.write("2025-01-01T12:00:00,10.0,1.0,2.0,1,S1")
+        self.assertEqual(speed_utils.get_latest_speedtest(self.log_file)['server_name'], 'S1')
+
+        self.write("2025-01-01T12:00:00,10.0,1.0,2.0,1,S1\n2025-01-01T13:00:00,20.0,2.0,3.0\n")
+        latest = speed_utils.get_latest_speedtest(self.log_file)
+        self.assertEqual(latest['download'], 20.0)
+        self.assertIsNone(latest['server_name'])
+
+        self.write("2025-01-01T12:00:00,10.0,1.0,2.0,1,S1\n2025-01-01T13:0")
+        self.assertEqual(speed_utils.get_latest_speedtest(self.log_file)['download'], 10.0)
+
+        self.write("")
+        self.assertIsNone(speed_utils.get_latest_speedtest(self.log_file))
+
+class TestVectorEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.log_file = os.path.join(self.tmpdir.name, 'speed_log.txt')
+        now = datetime.datetime.now().replace(microsecond=0)
+        lines = []
+        for hours_ago in range(200, 0, -1):
+            ts = (now - datetime.timedelta(hours=hours_ago, microseconds=hours_ago * 1001)).isoformat()
+            lines.append(f"{ts},{100 + hours_ago * 0.37:.2f},{hours_ago / 8},{hours_ago % 9 + 0.5},"
+                         f"{hours_ago % 3},Server {hours_ago % 3}")
+        ts = (now - datetime.timedelta(hours=1, minutes=30)).isoformat()
+        # Lines the array parser must hand to the line-by-line parsers, or skip like they do
+        lines[100:100] = [
+            "",
+            "garbage line",
+            f"{ts},fast,1.0,2.0,1,S1",
+            f"{ts},1e2,-.5,+3.,7,Exponent",
+            f"  {ts},10.0,5.0,1.0,8,Padded  ",
+            f"{ts},10.0,5.0,,9,No ping",
+            f"{ts},12.5,6.5",
+            "2025-02-30T10:00:00,10.0,5.0,1.0,1,Not a day",
+            f"{ts[:10]} {ts[11:]},20.0,4.0,2.0,2",
+            f"{ts},40.0,2.0,1.0,,",
+            f"{ts},inf,2.0,1.0,3,Infinite",
+            f"{ts},40.0,2.0,nan,3,NaN ping",
+        ]
+        with open(self.log_file, 'w') as f:
+            f.write("\n".join(lines) + "\n" + f"{ts},50.0,1.0")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def clear_sidecars(self):
+        for suffix in (speed_utils.STATS_SIDECAR_SUFFIX, speed_utils.INDEX_SIDECAR_SUFFIX):
+            if os.path.exists(self.log_file + suffix):
+                os.remove(self.log_file + suffix)
+
+    def results(self, vectorize):
+        self.clear_sidecars()
+        with patch.object(speed_utils, 'VECTOR_MIN_BYTES', 0 if vectorize else float('inf')):
+            stats = speed_utils.calculate_stats(self.log_file)
+            servers = speed_utils.calculate_server_stats(self.log_file)
+            index = speed_utils.load_log_index(self.log_file)
+            plot = speed_utils.get_plot_data(self.log_file, days=5)
+        return stats, servers, index, plot
+
+    @unittest.skipUnless(importlib.util.find_spec('numpy'), 'NumPy is not installed')
+    def test_matches_line_by_line_parsing(self):
+        stats, servers, index, plot = self.results(vectorize=True)
+        expected_stats, expected_servers, expected_index, expected_plot = self.results(vectorize=False)
+
+        self.assertEqual(stats.keys(), expected_stats.keys())
+        for key, value in expected_stats.items():
+            self.assertAlmostEqual(stats[key], value, msg=key)
+        self.assertEqual([s['server_id'] for s in servers], [s['server_id'] for s in expected_servers])
+        for server, expected in zip(servers, expected_servers):
+            for key, value in expected.items():
+                if isinstance(value, float):
+                    self.assertAlmostEqual(server[key], value, msg=key)
+                else:
+                    self.assertEqual(server[key], value, msg=key)
+        self.assertEqual(index['count'], expected_index['count'])
+        self.assertEqual(index['offset'], expected_index['offset'])
+        self.assertEqual(plot['dates'], expected_plot['dates'])
+        self.assertEqual(plot['downloads'], expected_plot['downloads'])
+        for key in ('avg_downloads', 'avg_uploads'):
+            for got, want in zip(plot[key], expected_plot[key]):
+                self.assertAlmostEqual(got, want)
+
+    def test_falls_back_without_numpy(self):
+        import speed_arrays
+        expected = self.results(vectorize=False)
+        with patch.object(speed_arrays, 'np', None):
+            self.assertEqual(self.results(vectorize=True), expected)
+
+if __name__ == '__main__':
+    unittest.main()